@@ -3,12 +3,14 @@
 
 # Other options...
 # python3 -m <input.py> -o <output.s> <-p print> <-c comments>
+# python3 -m <input.py> -O2 --passes=-unroll,+linear-scan --time-passes --core rocket
 
 import argparse as ap
 import pifive_module as pifive
 
 def run_pifive(args):
-  pifive.run_pifive(args.input, args.print, args.comments, args.output)
+  pifive.run_pifive(args.input, args.print, args.comments, args.output, args.level, args.passes, args.time_passes,
+                    args.core)
 
 # Add arguments to argument parser 
 parser = ap.ArgumentParser()
@@ -16,6 +18,10 @@ parser.add_argument("input", help="input python file")
 parser.add_argument("-p", "--print", help="prints the output to the console", action="store_true")
 parser.add_argument("-c", "--comments", help="turn on assembly comments", action="store_true")
 parser.add_argument("-o", "--output", help="write the output to the file", type=str, default="output.s")
+parser.add_argument("-O", dest="level", help="optimization level, 0 (default), 1, 2 or s for size", choices=["0", "1", "2", "s"], default="0")
+parser.add_argument("--passes", help="passes to turn on or off on top of the level, like +linear-scan,-unroll", type=str, default=None)
+parser.add_argument("--time-passes", help="prints the time spent in each pass", action="store_true")
+parser.add_argument("--core", help="core whose latencies the scheduler uses, u74 (default) or rocket", choices=["u74", "rocket"], default="u74")
 parser.set_defaults(func=run_pifive)
 args = parser.parse_args()
 
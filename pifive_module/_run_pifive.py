@@ -1,17 +1,23 @@
-from .transpiler import RISCV_Transpiler 
+from .transpiler import RISCV_Transpiler, select_passes, transpiler_options
 from ast import parse
+import sys
 
-def run_pifive(file_name, print, comments, output_file):
+def run_pifive(file_name, print, comments, output_file, level='0', passes=None, time_passes=False, core='u74'):
   with open(file_name) as file:
     source = file.read()
     node = parse(source, filename=file_name)
-    rv_transpiler = RISCV_Transpiler(comments)
+    rv_transpiler = RISCV_Transpiler(comments, **transpiler_options(select_passes(level, passes), core))
     rv_transpiler.transpile(node)
 
     # prints to console if print is true
     if print:
       rv_transpiler.instr.print()
 
+    # reports the time spent in each pass, apart from the assembly output
+    if time_passes:
+      for line in rv_transpiler.pass_manager.report():
+        sys.stderr.write(line + '\n')
+
     with open(output_file, 'w') as output:
       for line in rv_transpiler.instr.instr_buffer:
         output.write(line + '\n')
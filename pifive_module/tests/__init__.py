@@ -1,2 +1,27 @@
 from .testTranspiler import TestTranspiler
-# from .testOther import other
\ No newline at end of file
+from .testPeephole import TestPeephole
+from .testRegisterMode import TestRegisterMode
+from .testConstantFolder import TestConstantFolder
+from .testLinearScan import TestLinearScan
+from .testFusedBranches import TestFusedBranches
+from .testImmediates import TestImmediates
+from .testStrengthReducer import TestStrengthReducer
+from .testDivision import TestDivision
+from .testTailCalls import TestTailCalls
+from .testLeafFunctions import TestLeafFunctions
+from .testInliner import TestInliner
+from .testLoopInvariant import TestLoopInvariant
+from .testLoopRotation import TestLoopRotation
+from .testLoopUnroller import TestLoopUnroller
+from .testDeadCode import TestDeadCode
+from .testCalleeSaved import TestCalleeSaved
+from .testIR import TestIR
+from .testIROptimizer import TestIROptimizer
+from .testCallEvaluator import TestCallEvaluator
+from .testPassManager import TestPassManager
+from .testBranchless import TestBranchless
+from .testScheduler import TestScheduler
+from .testShortCircuit import TestShortCircuit
+from .testGlobals import TestGlobals
+from .testArrays import TestArrays
+# from .testOther import other
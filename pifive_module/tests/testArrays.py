@@ -0,0 +1,306 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.arrays import ArrayLengths, BoundsChecks
+from ..transpiler.call_evaluator import CallEvaluator
+from ..transpiler.dead_code import DeadCodeEliminator
+from ..transpiler.loop_unroller import LoopUnroller
+from ..transpiler.pass_manager import select_passes, transpiler_options
+from ast import parse, unparse, walk, Subscript
+
+class TestArrays(unittest.TestCase):
+  def transpiles(self, src_in, src_out, **options):
+    rv = RISCV_Transpiler(stack_mode=False, **options)
+    rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, rv.instr.instr_buffer)
+
+  def test_lengths(self):
+    # The function's own a hides the module's
+    src_in = "a = [1, 2]\ndef f():\n  a = [0] * 8\n  return len(a)\ndef g():\n  return len(a)"
+    src_out = "a = [1, 2]\n\ndef f():\n    a = [0] * 8\n    return 8\n\ndef g():\n    return 2"
+    self.assertEqual(src_out, unparse(ArrayLengths().visit(parse(src_in))))
+
+  def test_bounds_checks(self):
+    src_in = [
+      "def f(n):",
+      "  a = [0] * 4",
+      "  i = 0",
+      "  while i < 3:",
+      "    a[i + 1] = a[i] + a[n]",
+      "    i = i + 1",
+      "  j = 0",
+      "  while j < 4:",
+      "    a[j + 1] = 0",
+      "    j = j + 1",
+      "  return a[i]"
+    ]
+    node = parse("\n".join(src_in))
+    safe = BoundsChecks().run(node)
+    self.assertEqual(sorted(unparse(child) for child in walk(node) if child in safe), ["a[i + 1]", "a[i]"])
+
+  def test_evaluate(self):
+    src_in = [
+      "def f(n):",
+      "  a = [1, 2, 3]",
+      "  a[0] = n",
+      "  return a[0] + a[2]",
+      "def g(n):",
+      "  a = [1, 2, 3]",
+      "  return a[n]",
+      "x = f(4) + g(1) + g(3) + g(0 - 1)"
+    ]
+    node = CallEvaluator().visit(parse("\n".join(src_in)))
+    self.assertEqual(unparse(node.body[-1]), "x = 7 + 2 + g(3) + 3")
+
+  def test_dead_stores(self):
+    src_in = "def f(n):\n  a = [0] * 4\n  b = [0] * 4\n  a[1] = n\n  b[1] = n\n  return a[1]"
+    src_out = "def f(n):\n    a = [0] * 4\n    a[1] = n\n    return a[1]"
+    self.assertEqual(src_out, unparse(DeadCodeEliminator().visit(parse(src_in))))
+
+  def test_dead_loads(self):
+    # Only the load that can't fail its bounds check goes, the others may still abort
+    src_in = "def f(n, k):\n  b = [1, 2]\n  x = b[1]\n  y = b[k]\n  b[2]\n  b[n] = 0\n  return n"
+    src_out = "def f(n, k):\n    b = [1, 2]\n    y = b[k]\n    b[2]\n    b[n] = 0\n    return n"
+    self.assertEqual(src_out, unparse(DeadCodeEliminator().visit(parse(src_in))))
+
+  def test_registers(self):
+    # Filled by a loop, then a checked store and load, a constant index needs no check
+    src_in = [
+      "def f(i):",
+      "  a = [0] * 16",
+      "  a[i] = 5",
+      "  return a[i + 1] + a[-1]"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -152",
+      "\tsd ra, 144(sp)",
+      "\tsd fp, 136(sp)",
+      "\taddi fp, sp, 152",
+      "\tmv t0, sp",
+      "\taddi t1, t0, 128",
+      "fill_f_1:",
+      "\tsd zero, 0(t0)",
+      "\taddi t0, t0, 8",
+      "\tbne t0, t1, fill_f_1",
+      "\tli t0, 5",
+      "\tli t1, 16",
+      "\tsrai t2, a1, 63",
+      "\tand t2, t2, t1",
+      "\tadd t3, a1, t2",
+      "\tbgeu t3, t1, index_error",
+      "\tslli t3, t3, 3",
+      "\tadd t3, t3, sp",
+      "\tsd t0, 0(t3)",
+      "\taddi t0, a1, 1",
+      "\tli t1, 16",
+      "\tsrai t2, t0, 63",
+      "\tand t2, t2, t1",
+      "\tadd t0, t0, t2",
+      "\tbgeu t0, t1, index_error",
+      "\tslli t0, t0, 3",
+      "\tadd t0, t0, sp",
+      "\tld t0, 0(t0)",
+      "\tld t1, 120(sp)",
+      "\tadd a0, t0, t1",
+      "\tld ra, 144(sp)",
+      "\tld fp, 136(sp)",
+      "\taddi sp, sp, 152",
+      "\tret",
+      "index_error:",
+      "\tcall abort"
+    ]
+    self.transpiles(src_in, src_out, leaf_functions=True, immediates=True, fold_constants=True)
+
+  def test_elided_check(self):
+    # i stays in 0..1, so a[i + 1] needs no check and the 1 goes into the displacement
+    src_in = [
+      "def f():",
+      "  a = [1, 2, 3]",
+      "  s = 0",
+      "  i = 0",
+      "  while i < 2:",
+      "    s = s + a[i + 1]",
+      "    i = i + 1",
+      "  return s"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -40",
+      "\tsd ra, 32(sp)",
+      "\tsd fp, 24(sp)",
+      "\taddi fp, sp, 40",
+      "\tli t0, 1",
+      "\tsd t0, 0(sp)",
+      "\tli t0, 2",
+      "\tsd t0, 8(sp)",
+      "\tli t0, 3",
+      "\tsd t0, 16(sp)",
+      "\tmv t0, zero",
+      "\tmv t1, zero",
+      "while_f_1:",
+      "\tli t2, 2",
+      "\tbge t1, t2, break_f_2",
+      "\tslli t2, t1, 3",
+      "\tadd t2, t2, sp",
+      "\tld t2, 8(t2)",
+      "\tadd t0, t0, t2",
+      "\taddi t1, t1, 1",
+      "\tj while_f_1",
+      "break_f_2:",
+      "\tmv a0, t0",
+      "\tld ra, 32(sp)",
+      "\tld fp, 24(sp)",
+      "\taddi sp, sp, 40",
+      "\tret"
+    ]
+    self.transpiles(src_in, src_out, linear_scan=True, immediates=True, fuse_branches=True, elide_bounds_checks=True)
+
+  def test_global_arrays(self):
+    src_in = [
+      "t = [5, 6]",
+      "z = [0] * 3",
+      "def f(i):",
+      "  z[i] = t[1]",
+      "  return z[0]"
+    ]
+    src_out = [
+      "f:",
+      "\tlla t0, t_global",
+      "\tld t0, 8(t0)",
+      "\tli t1, 3",
+      "\tsrai t2, a1, 63",
+      "\tand t2, t2, t1",
+      "\tadd t3, a1, t2",
+      "\tbgeu t3, t1, index_error",
+      "\tslli t3, t3, 3",
+      "\tlla t1, z_global",
+      "\tadd t3, t3, t1",
+      "\tsd t0, 0(t3)",
+      "\tlla t0, z_global",
+      "\tld a0, 0(t0)",
+      "\tret",
+      "index_error:",
+      "\tcall abort",
+      "\t.data",
+      "\t.p2align 3",
+      "t_global:",
+      "\t.dword 5, 6",
+      "\t.bss",
+      "\t.p2align 3",
+      "z_global:",
+      "\t.zero 24"
+    ]
+    self.transpiles(src_in, src_out, global_data=True, leaf_functions=True)
+
+  def test_guarded_index(self):
+    # The bounds check of an operand that may be skipped must not run, so these branch rather than use masks
+    src_in = [
+      "def f(i):",
+      "  b = [1, 2, 3]",
+      "  return (i < 3 and b[i] > 2) + (i >= 3 or b[i])"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -48",
+      "\tsd ra, 40(sp)",
+      "\tsd fp, 32(sp)",
+      "\taddi fp, sp, 48",
+      "\tli t0, 1",
+      "\tsd t0, 0(sp)",
+      "\tli t0, 2",
+      "\tsd t0, 8(sp)",
+      "\tli t0, 3",
+      "\tsd t0, 16(sp)",
+      "\tslti t0, a1, 3",
+      "\tbeqz t0, decided_f_1",
+      "\tli t1, 3",
+      "\tsrai t2, a1, 63",
+      "\tand t2, t2, t1",
+      "\tadd t3, a1, t2",
+      "\tbgeu t3, t1, index_error",
+      "\tslli t3, t3, 3",
+      "\tadd t3, t3, sp",
+      "\tld t3, 0(t3)",
+      "\tli t1, 2",
+      "\tslt t0, t1, t3",
+      "decided_f_1:",
+      "\tli t2, 3",
+      "\tslt t1, a1, t2",
+      "\txori t1, t1, 1",
+      "\tbnez t1, decided_f_2",
+      "\tli t2, 3",
+      "\tsrai t3, a1, 63",
+      "\tand t3, t3, t2",
+      "\tadd t4, a1, t3",
+      "\tbgeu t4, t2, index_error",
+      "\tslli t4, t4, 3",
+      "\tadd t4, t4, sp",
+      "\tld t1, 0(t4)",
+      "decided_f_2:",
+      "\tadd a0, t0, t1",
+      "\tld ra, 40(sp)",
+      "\tld fp, 32(sp)",
+      "\taddi sp, sp, 48",
+      "\tret",
+      "index_error:",
+      "\tcall abort"
+    ]
+    self.transpiles(src_in, src_out, leaf_functions=True, immediates=True, branchless_compares=True)
+
+  def test_constant_out_of_range(self):
+    # The loop runs off the end of the array, unrolled or not the error comes when it runs
+    src_in = [
+      "def f():",
+      "  a = [1, 2]",
+      "  s = 0",
+      "  i = 0",
+      "  while i < 3:",
+      "    s = s + a[i]",
+      "    i = i + 1",
+      "  return s"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -48",
+      "\tsd ra, 40(sp)",
+      "\tsd fp, 32(sp)",
+      "\taddi fp, sp, 48",
+      "\tli t0, 1",
+      "\tsd t0, 0(sp)",
+      "\tli t0, 2",
+      "\tsd t0, 8(sp)",
+      "\tmv t0, zero",
+      "\tmv t1, zero",
+      "\tld t2, 0(sp)",
+      "\tadd t0, t0, t2",
+      "\tld t2, 8(sp)",
+      "\tadd t0, t0, t2",
+      "\tj index_error",
+      "\tld t2, 0(sp)",
+      "\tadd t0, t0, t2",
+      "\tli t1, 3",
+      "\tmv a0, t0",
+      "\tld ra, 40(sp)",
+      "\tld fp, 32(sp)",
+      "\taddi sp, sp, 48",
+      "\tret",
+      "index_error:",
+      "\tcall abort"
+    ]
+    self.transpiles(src_in, src_out, leaf_functions=True, immediates=True, fold_constants=True, unroller=LoopUnroller())
+
+  def test_ir_fallback(self):
+    # The IR has no arrays, so +ir and +ssa leave the program to the ast code generator
+    src_in = "def f(n):\n  a = [1, 2, 3]\n  a[n] = n\n  return a[0] + a[n - 1]\nprint(f(2))"
+    expected = RISCV_Transpiler(**transpiler_options(select_passes('1', '-linear-scan')))
+    expected.transpile(parse(src_in))
+    for passes in ['+ir', '+ssa']:
+      rv = RISCV_Transpiler(**transpiler_options(select_passes('1', passes)))
+      rv.transpile(parse(src_in))
+      self.assertEqual(expected.instr.instr_buffer, rv.instr.instr_buffer)
+
+  def test_errors(self):
+    with self.assertRaises(RuntimeError):
+      RISCV_Transpiler().transpile(parse("def f():\n  a = [1]\n  return a[0]"))
+    with self.assertRaises(RuntimeError):
+      RISCV_Transpiler(stack_mode=False).transpile(parse("def f():\n  a = [1, 2]\n  return a"))
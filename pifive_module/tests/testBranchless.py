@@ -0,0 +1,51 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.instruction_maker import InstructionMaker, BranchOp
+from ..transpiler.registers import Reg
+from ast import parse
+
+class TestBranchless(unittest.TestCase):
+  def test_set_compare(self):
+    expected = {
+      BranchOp.BEQ : ["\txor t0, a1, a2", "\tseqz t0, t0"],
+      BranchOp.BNE : ["\txor t0, a1, a2", "\tsnez t0, t0"],
+      BranchOp.BLT : ["\tslt t0, a1, a2"],
+      BranchOp.BLE : ["\tslt t0, a2, a1", "\txori t0, t0, 1"],
+      BranchOp.BGT : ["\tslt t0, a2, a1"],
+      BranchOp.BGE : ["\tslt t0, a1, a2", "\txori t0, t0, 1"]
+    }
+    for branchop, lines in expected.items():
+      instr = InstructionMaker()
+      instr.set_compare(branchop, Reg.t0, Reg.a1, Reg.a2)
+      self.assertEqual(instr.instr_buffer, lines)
+
+  def test_values(self):
+    src_in = [
+      "def f(a, b):",
+      "  x = a <= b",
+      "  y = a == 5",
+      "  z = b != 0",
+      "  return x + y + z"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -56",
+      "\tsd ra, 48(sp)",
+      "\tsd fp, 40(sp)",
+      "\taddi fp, sp, 56",
+      "\tslt t0, a2, a1",
+      "\txori t0, t0, 1",
+      "\txori t1, a1, 5",
+      "\tseqz t1, t1",
+      "\tsnez t2, a2",
+      "\tadd t3, t0, t1",
+      "\tadd a0, t3, t2",
+      "\tld ra, 48(sp)",
+      "\tld fp, 40(sp)",
+      "\taddi sp, sp, 56",
+      "\tret"
+    ]
+    rv = RISCV_Transpiler(stack_mode=False, branchless_compares=True, immediates=True)
+    rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(rv.instr.instr_buffer, src_out)
+    self.assertFalse(any(line.endswith(":") for line in rv.instr.instr_buffer[1:]))
@@ -0,0 +1,75 @@
+import unittest
+from ..transpiler.call_evaluator import CallEvaluator
+from ast import parse, unparse
+
+class TestCallEvaluator(unittest.TestCase):
+  def evaluates(self, src_in, src_out, max_steps=10000):
+    node = CallEvaluator(max_steps).visit(parse("\n".join(src_in)))
+    self.assertEqual("\n".join(src_out), unparse(node))
+
+  def test_recursive_call(self):
+    src_in = [
+      "def factorial(n):",
+      "  if n == 0:",
+      "    return 1",
+      "  return n * factorial(n - 1)",
+      "def main():",
+      "  a = factorial(3 + 4) * 123",
+      "  print(a + factorial(a))"
+    ]
+    src_out = [
+      "def factorial(n):",
+      "    if n == 0:",
+      "        return 1",
+      "    return n * factorial(n - 1)",
+      "",
+      "def main():",
+      "    a = 5040 * 123",
+      "    print(a + factorial(a))"
+    ]
+    self.evaluates(src_in, src_out)
+
+  def test_impure_left_alone(self):
+    src_in = [
+      "def noisy(n):",
+      "  print(n)",
+      "  return n",
+      "def outer(n):",
+      "  return noisy(n) + 1",
+      "def main():",
+      "  return outer(2) + noisy(3)"
+    ]
+    src_out = [
+      "def noisy(n):",
+      "    print(n)",
+      "    return n",
+      "",
+      "def outer(n):",
+      "    return noisy(n) + 1",
+      "",
+      "def main():",
+      "    return outer(2) + noisy(3)"
+    ]
+    self.evaluates(src_in, src_out)
+
+  def test_step_budget(self):
+    src_in = [
+      "def count(n):",
+      "  i = 0",
+      "  while i < n:",
+      "    i = i + 1",
+      "  return i",
+      "def main():",
+      "  return count(10) + count(1000)"
+    ]
+    src_out = [
+      "def count(n):",
+      "    i = 0",
+      "    while i < n:",
+      "        i = i + 1",
+      "    return i",
+      "",
+      "def main():",
+      "    return 10 + count(1000)"
+    ]
+    self.evaluates(src_in, src_out, max_steps=100)
@@ -0,0 +1,69 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.call_crossing import CallCrossing
+from ast import parse
+
+class TestCalleeSaved(unittest.TestCase):
+  rv = RISCV_Transpiler(stack_mode=False, callee_saved=True)
+
+  def test_crossing(self):
+    src = [
+      "def f(a, b, c):",
+      "  x = a + 1",
+      "  y = g(b) + c",
+      "  return f(x, y)"
+    ]
+    names = CallCrossing(parse("\n".join(src)).body[0]).names
+    self.assertIn("x", names)
+    self.assertIn("c", names)
+    self.assertNotIn("a", names)
+    self.assertNotIn("b", names)
+    self.assertNotIn("y", names)
+
+  def test_loop_around_print(self):
+    src_in = [
+      "def main(n):",
+      "  i = 0",
+      "  while i < n:",
+      "    print(i)",
+      "    i = i + 1",
+      "  return 0"
+    ]
+    src_out = [
+      "\t.globl main",
+      "main:",
+      "\taddi sp, sp, -48",
+      "\tsd ra, 40(sp)",
+      "\tsd fp, 32(sp)",
+      "\taddi fp, sp, 48",
+      "\tsd s1, -40(fp)",
+      "\tsd s2, -48(fp)",
+      "\tmv s1, a1",
+      "\tli s2, 0",
+      "while_main_1:",
+      "\tli t0, 1",
+      "\tblt s2, s1, BLT_main_3",
+      "\tli t0, 0",
+      "BLT_main_3:",
+      "\tbeqz t0, break_main_2",
+      "\tmv a1, s2",
+      "\tlla a0, print_int",
+      "\tcall printf",
+      "\tmv t0, a0",
+      "\tli t0, 1",
+      "\tadd s2, s2, t0",
+      "\tj while_main_1",
+      "break_main_2:",
+      "\tli a0, 0",
+      "\tld s1, -40(fp)",
+      "\tld s2, -48(fp)",
+      "\tld ra, 40(sp)",
+      "\tld fp, 32(sp)",
+      "\taddi sp, sp, 48",
+      "\tret",
+      "print_int:",
+      "\t.string \"%d\\n\""
+    ]
+    self.rv.reset()
+    self.rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, self.rv.instr.instr_buffer)
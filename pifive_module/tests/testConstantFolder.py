@@ -0,0 +1,85 @@
+import unittest
+from ..transpiler.constant_folder import ConstantFolder
+from ..transpiler.transpiler import RISCV_Transpiler
+from ast import parse, unparse
+
+class TestConstantFolder(unittest.TestCase):
+  def folds(self, src_in, src_out):
+    node = ConstantFolder().visit(parse("\n".join(src_in)))
+    self.assertEqual("\n".join(src_out), unparse(node))
+
+  def test_binop(self):
+    self.folds(["a = (3 + 4) * 123 - -2"], ["a = 863"])
+
+  def test_compare_and_unaryop(self):
+    self.folds(["a = (1 < 2) + (3 == 4) + ~0 + (not 5)"], ["a = 0"])
+
+  def test_wraparound(self):
+    self.folds(
+      ["a = 9223372036854775807 + 1", "b = 1 << 64", "c = -7 // 2"],
+      ["a = -9223372036854775808", "b = 1 << 64", "c = -4"]
+    )
+
+  def test_division_by_zero_left_alone(self):
+    self.folds(["a = 1 / 0"], ["a = 1 / 0"])
+
+  def test_propagation(self):
+    src_in = [
+      "SCALE = 3",
+      "def f(n):",
+      "  k = 4 * SCALE",
+      "  return n * k + SCALE",
+      "x = f(SCALE)"
+    ]
+    src_out = [
+      "SCALE = 3",
+      "",
+      "def f(n):",
+      "    k = 12",
+      "    return n * 12 + 3",
+      "x = f(3)"
+    ]
+    self.folds(src_in, src_out)
+
+  def test_no_propagation_of_reassigned_or_shadowed(self):
+    src_in = [
+      "i = 0",
+      "n = 5",
+      "def f(n):",
+      "  return n + i",
+      "while i < n:",
+      "  i = i + 1"
+    ]
+    src_out = [
+      "i = 0",
+      "n = 5",
+      "",
+      "def f(n):",
+      "    return n + i",
+      "while i < 5:",
+      "    i = i + 1"
+    ]
+    self.folds(src_in, src_out)
+
+  def test_no_propagation_of_reassigned_parameter(self):
+    # When c is false x still holds the argument
+    src_in = [
+      "def f(x, c):",
+      "  y = x + 4",
+      "  if c:",
+      "    x = 9",
+      "  return y + x"
+    ]
+    src_out = [
+      "def f(x, c):",
+      "    y = x + 4",
+      "    if c:",
+      "        x = 9",
+      "    return y + x"
+    ]
+    self.folds(src_in, src_out)
+
+  def test_transpiler_option(self):
+    rv = RISCV_Transpiler(stack_mode=False, fold_constants=True)
+    rv.transpile(parse("a = 3 + 4\nb = a * 2"))
+    self.assertEqual(["\tli t0, 7", "\tli t1, 14"], rv.instr.instr_buffer)
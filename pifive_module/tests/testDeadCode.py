@@ -0,0 +1,144 @@
+import unittest
+from ..transpiler.dead_code import DeadCodeEliminator
+from ..transpiler.transpiler import RISCV_Transpiler
+from ast import parse, unparse
+
+class TestDeadCode(unittest.TestCase):
+  rv = RISCV_Transpiler(stack_mode=False, eliminate_dead_code=True)
+
+  def eliminates(self, src_in, src_out):
+    node = DeadCodeEliminator().visit(parse("\n".join(src_in)))
+    self.assertEqual("\n".join(src_out), unparse(node))
+
+  def test_dead_stores_and_expressions(self):
+    src_in = [
+      "def sq(x):",
+      "  return x * x",
+      "def main(a, b):",
+      "  t = a * 2",
+      "  u = sq(a)",
+      "  a + b",
+      "  v = a + b",
+      "  print(v)",
+      "  t = 3",
+      "  return t"
+    ]
+    src_out = [
+      "def sq(x):",
+      "    return x * x",
+      "",
+      "def main(a, b):",
+      "    v = a + b",
+      "    print(v)",
+      "    t = 3",
+      "    return t"
+    ]
+    self.eliminates(src_in, src_out)
+
+  def test_unreachable(self):
+    src_in = [
+      "def main(a):",
+      "  if 0:",
+      "    print(1)",
+      "  while 0:",
+      "    print(2)",
+      "  if a < 3:",
+      "    return 1",
+      "  else:",
+      "    return 2",
+      "  print(a)"
+    ]
+    src_out = [
+      "def main(a):",
+      "    if a < 3:",
+      "        return 1",
+      "    else:",
+      "        return 2"
+    ]
+    self.eliminates(src_in, src_out)
+
+  def test_loop_carried(self):
+    src_in = [
+      "def main(n):",
+      "  i = 0",
+      "  total = 0",
+      "  unused = 0",
+      "  while i < n:",
+      "    total = total + i",
+      "    unused = total * 2",
+      "    i = i + 1",
+      "  return total"
+    ]
+    src_out = [
+      "def main(n):",
+      "    i = 0",
+      "    total = 0",
+      "    while i < n:",
+      "        total = total + i",
+      "        i = i + 1",
+      "    return total"
+    ]
+    self.eliminates(src_in, src_out)
+
+  def test_no_void_return(self):
+    src_in = [
+      "def f(a, b):",
+      "  t = a * 2",
+      "  if a < b:",
+      "    return t",
+      "  return b",
+      "  print(a)"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -40",
+      "\tsd ra, 32(sp)",
+      "\tsd fp, 24(sp)",
+      "\taddi fp, sp, 40",
+      "\tli t0, 2",
+      "\tmul t0, a1, t0",
+      "\tli t1, 1",
+      "\tblt a1, a2, BLT_f_2",
+      "\tli t1, 0",
+      "BLT_f_2:",
+      "\tbeqz t1, else_f_1",
+      "\tmv a0, t0",
+      "\tld ra, 32(sp)",
+      "\tld fp, 24(sp)",
+      "\taddi sp, sp, 40",
+      "\tret",
+      "else_f_1:",
+      "\tmv a0, a2",
+      "\tld ra, 32(sp)",
+      "\tld fp, 24(sp)",
+      "\taddi sp, sp, 40",
+      "\tret"
+    ]
+    self.rv.reset()
+    self.rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, self.rv.instr.instr_buffer)
+
+  def test_initializer_scopes_branches(self):
+    # Variables are scoped to the block they're first assigned in, so r = 0 keeps r alive after the if
+    src_in = [
+      "def f(n):",
+      "  r = 0",
+      "  if n > 0:",
+      "    r = n",
+      "  else:",
+      "    r = 2",
+      "  return r"
+    ]
+    src_out = [
+      "def f(n):",
+      "    r = 0",
+      "    if n > 0:",
+      "        r = n",
+      "    else:",
+      "        r = 2",
+      "    return r"
+    ]
+    self.eliminates(src_in, src_out)
+    for stack_mode in [True, False]:
+      rv = RISCV_Transpiler(stack_mode=stack_mode, eliminate_dead_code=True)
+      rv.transpile(parse("\n".join(src_in)))
@@ -0,0 +1,70 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.division import magic_unsigned, is_power_of_two
+from ast import parse
+
+class TestDivision(unittest.TestCase):
+  rv = RISCV_Transpiler(stack_mode=False)
+
+  def transforms(self, src_in, src_out):
+    self.rv.reset()
+    self.rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, self.rv.instr.instr_buffer)
+
+  def test_magic_unsigned(self):
+    for divisor in [3, 7, 10, 641, 1000000007, (1 << 63) - 1]:
+      multiplier, shift = magic_unsigned(divisor)
+      self.assertLess(multiplier, 1 << 64)
+      for n in [0, 1, divisor - 1, divisor, divisor + 1, 123456789, (1 << 63) - 1]:
+        self.assertEqual(n // divisor, (n * multiplier >> 64) >> shift)
+    self.assertTrue(is_power_of_two(64))
+    with self.assertRaises(RuntimeError):
+      magic_unsigned(64)
+
+  def test_power_of_two(self):
+    src_in = [
+      "a = 5",
+      "b = a // 8",
+      "c = a % 8"
+    ]
+    src_out = [
+      "\tli t0, 5",
+      "\tsrai t1, t0, 3",
+      "\tandi t2, t0, 7"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_magic_number(self):
+    src_in = [
+      "a = 5",
+      "b = a // 7"
+    ]
+    src_out = [
+      "\tli t0, 5",
+      "\tsrai t2, t0, 63",
+      "\txor t3, t0, t2",
+      "\tli t2, -7905747460161236406",
+      "\tmulhu t3, t3, t2",
+      "\tsrli t3, t3, 2",
+      "\tsrai t2, t0, 63",
+      "\txor t1, t3, t2"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_register_divisor(self):
+    src_in = [
+      "a = 5",
+      "b = 3",
+      "c = a % b"
+    ]
+    src_out = [
+      "\tli t0, 5",
+      "\tli t1, 3",
+      "\trem t2, t0, t1",
+      "\tbeqz t2, floor_global_1",
+      "\txor t3, t2, t1",
+      "\tbgez t3, floor_global_1",
+      "\tadd t2, t2, t1",
+      "floor_global_1:"
+    ]
+    self.transforms(src_in, src_out)
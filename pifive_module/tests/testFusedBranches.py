@@ -0,0 +1,89 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.instruction_maker import BranchOp
+from ast import parse
+
+class TestFusedBranches(unittest.TestCase):
+  rv = RISCV_Transpiler(fuse_branches=True)
+  rv_reg = RISCV_Transpiler(stack_mode=False, fuse_branches=True)
+
+  def transforms(self, rv, src_in, src_out):
+    rv.reset()
+    rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, rv.instr.instr_buffer)
+
+  def test_invert(self):
+    for branchop in BranchOp:
+      self.assertNotEqual(branchop, branchop.invert())
+      self.assertEqual(branchop, branchop.invert().invert())
+
+  def test_while_stack_mode(self):
+    src_in = [
+      "i = 0",
+      "while i < 10:",
+      "  i = 1"
+    ]
+    src_out = [
+      "\taddi sp, sp, -8",
+      "\tli t0, 0",
+      "\tsd t0, 0(sp)",
+      "\tld t0, 0(sp)",
+      "\taddi sp, sp, 8",
+      "while_global_sc_1_lab_0:",
+      "\taddi sp, sp, -8",
+      "\tsd t0, 0(sp)",
+      "\taddi sp, sp, -8",
+      "\tli t1, 10",
+      "\tsd t1, 0(sp)",
+      "\tld t1, 0(sp)",
+      "\taddi sp, sp, 8",
+      "\tld t2, 0(sp)",
+      "\taddi sp, sp, 8",
+      "\tbge t2, t1, break_global_sc_1_lab_1",
+      "\taddi sp, sp, -8",
+      "\tli t1, 1",
+      "\tsd t1, 0(sp)",
+      "\tld t0, 0(sp)",
+      "\taddi sp, sp, 8",
+      "\tj while_global_sc_1_lab_0",
+      "break_global_sc_1_lab_1:"
+    ]
+    self.transforms(self.rv, src_in, src_out)
+
+  def test_while(self):
+    src_in = [
+      "i = 0",
+      "while i < 10:",
+      "  i = i + 1"
+    ]
+    src_out = [
+      "\tli t0, 0",
+      "while_global_1:",
+      "\tli t1, 10",
+      "\tbge t0, t1, break_global_2",
+      "\tli t1, 1",
+      "\tadd t0, t0, t1",
+      "\tj while_global_1",
+      "break_global_2:"
+    ]
+    self.transforms(self.rv_reg, src_in, src_out)
+
+  def test_if_else(self):
+    src_in = [
+      "a = 1",
+      "if a == 2:",
+      "  a = 3",
+      "else:",
+      "  a = 4"
+    ]
+    src_out = [
+      "\tli t0, 1",
+      "\tli t1, 2",
+      "\tbne t0, t1, else_global_1",
+      "\tli t0, 3",
+      "\tj end_global_2",
+      "else_global_1:",
+      "\tli t0, 4",
+      "end_global_2:"
+    ]
+    self.transforms(self.rv_reg, src_in, src_out)
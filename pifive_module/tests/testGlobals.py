@@ -0,0 +1,102 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.global_data import ModuleGlobals
+from ..transpiler.ir_lowering import Lowering
+from ast import parse, unparse
+
+class TestGlobals(unittest.TestCase):
+  src_in = [
+    "count = 3",
+    "total = 0",
+    "def add(n):",
+    "  global total",
+    "  total = total + n + count",
+    "  return total",
+    "def f(n):",
+    "  return total + add(n)"
+  ]
+
+  def test_module_globals(self):
+    src_in = [
+      "a = 2",
+      "b = a + 1",
+      "def f():",
+      "  global c",
+      "  c = b",
+      "def g():",
+      "  f()",
+      "def h():",
+      "  return a"
+    ]
+    globals = ModuleGlobals(parse("\n".join(src_in)))
+    self.assertEqual(globals.values, {"a" : 2, "b" : None, "c" : None})
+    self.assertEqual([unparse(statement) for statement in globals.initializers], ["a = 2"])
+    self.assertEqual(globals.assigned, {"c"})
+    self.assertEqual(globals.writers, {"f", "g"})
+
+  def test_registers(self):
+    # total is read before the call assigns it, so f keeps that value apart
+    src_out = [
+      "add:",
+      "\tlla t0, total_global",
+      "\tld t0, 0(t0)",
+      "\tadd t1, t0, a1",
+      "\tlla t2, count_global",
+      "\tld t2, 0(t2)",
+      "\tadd t1, t1, t2",
+      "\tlla t3, total_global",
+      "\tsd t1, 0(t3)",
+      "\tmv a0, t1",
+      "\tret",
+      "f:",
+      "\taddi sp, sp, -24",
+      "\tsd ra, 16(sp)",
+      "\tsd fp, 8(sp)",
+      "\taddi fp, sp, 24",
+      "\tlla t1, total_global",
+      "\tld t1, 0(t1)",
+      "\tmv t2, t1",
+      "\tmv t3, a1",
+      "\tsd a1, -24(fp)",
+      "\taddi sp, sp, -8",
+      "\tsd t2, 0(sp)",
+      "\tmv a1, t3",
+      "\tcall add",
+      "\tld t2, 0(sp)",
+      "\taddi sp, sp, 8",
+      "\tlla t1, total_global",
+      "\tld t1, 0(t1)",
+      "\tld a1, -24(fp)",
+      "\tmv t3, a0",
+      "\tadd a0, t2, t3",
+      "\tld ra, 16(sp)",
+      "\tld fp, 8(sp)",
+      "\taddi sp, sp, 24",
+      "\tret",
+      "\t.data",
+      "\t.p2align 3",
+      "count_global:",
+      "\t.dword 3",
+      "\t.bss",
+      "\t.p2align 3",
+      "total_global:",
+      "\t.zero 8"
+    ]
+    rv = RISCV_Transpiler(stack_mode=False, leaf_functions=True, global_data=True)
+    rv.transpile(parse("\n".join(self.src_in)))
+    self.assertEqual(src_out, rv.instr.instr_buffer)
+
+  def test_ir_lowering(self):
+    src_out = [
+      "function f(n)",
+      "entry:",
+      "  total = load @total",
+      "  %1 = total",
+      "  %2 = call add(n)",
+      "  total = load @total",
+      "  %3 = add %1, %2",
+      "  return %3"
+    ]
+    node = parse("\n".join(self.src_in))
+    module = Lowering(ModuleGlobals(node)).lower(node)
+    self.assertEqual(str(module.functions[1]), "\n".join(src_out))
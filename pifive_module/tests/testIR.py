@@ -0,0 +1,95 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.ir_lowering import Lowering
+from ast import parse
+
+class TestIR(unittest.TestCase):
+  src = [
+    "def count(n):",
+    "  i = 0",
+    "  total = 0",
+    "  while i < n:",
+    "    if i % 2 == 0:",
+    "      total = total + i",
+    "    i = i + 1",
+    "  return total"
+  ]
+
+  def test_lowering(self):
+    src_out = [
+      "function count(n)",
+      "entry:",
+      "  i = 0",
+      "  total = 0",
+      "  jump while1",
+      "while1:",
+      "  %1 = lt i, n",
+      "  branch %1, body2, break3",
+      "body2:",
+      "  %2 = mod i, 2",
+      "  %3 = eq %2, 0",
+      "  branch %3, then4, end5",
+      "then4:",
+      "  total = add total, i",
+      "  jump end5",
+      "end5:",
+      "  i = add i, 1",
+      "  jump while1",
+      "break3:",
+      "  return total"
+    ]
+    module = Lowering().lower(parse("\n".join(self.src)))
+    self.assertEqual(str(module.functions[0]), "\n".join(src_out))
+
+  def test_cfg(self):
+    function = Lowering().lower(parse("\n".join(self.src))).functions[0]
+    preds = function.predecessors()
+    self.assertEqual(preds["while1"], ["entry", "end5"])
+    self.assertEqual(preds["end5"], ["body2", "then4"])
+    self.assertEqual(function.block("body2").successors(), ["then4", "end5"])
+
+  def test_unreachable(self):
+    src_in = [
+      "def f(a):",
+      "  return a",
+      "  a = a + 1"
+    ]
+    function = Lowering().lower(parse("\n".join(src_in))).functions[0]
+    self.assertEqual([block.label for block in function.blocks], ["entry"])
+
+  def test_backend(self):
+    src_in = [
+      "def f(a, b):",
+      "  if a < b:",
+      "    return b - a",
+      "  return a - b"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -16",
+      "\tsd ra, 8(sp)",
+      "\tsd fp, 0(sp)",
+      "\taddi fp, sp, 16",
+      "\tmv t0, a1",
+      "\tmv t1, a2",
+      "\tbge t0, t1, f_end2",
+      "f_then1:",
+      "\tsub t2, t1, t0",
+      "\tmv a0, t2",
+      "\tld ra, 8(sp)",
+      "\tld fp, 0(sp)",
+      "\taddi sp, sp, 16",
+      "\tret",
+      "f_end2:",
+      "\tsub t0, t0, t1",
+      "\tmv a0, t0",
+      "\tld ra, 8(sp)",
+      "\tld fp, 0(sp)",
+      "\taddi sp, sp, 16",
+      "\tret",
+      "\tli a0, 0",
+      "\tret"
+    ]
+    rv = RISCV_Transpiler(stack_mode=False, ir=True)
+    rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(rv.instr.instr_buffer, src_out)
@@ -0,0 +1,132 @@
+import unittest
+from ..transpiler.ir_lowering import Lowering
+from ..transpiler.ir_optimizer import IROptimizer
+from ..transpiler.ssa import to_ssa
+from ast import parse
+
+class TestIROptimizer(unittest.TestCase):
+  def optimize(self, src : list) -> str:
+    module = IROptimizer().run(Lowering().lower(parse("\n".join(src))))
+    return str(module.functions[0])
+
+  def test_ssa(self):
+    src_in = [
+      "def g(n):",
+      "  x = 0",
+      "  while x < n:",
+      "    x = x + 1",
+      "  return x"
+    ]
+    src_out = [
+      "function g(n)",
+      "entry:",
+      "  x.1 = 0",
+      "  jump while1",
+      "while1:",
+      "  x.2 = phi [entry: x.1], [body2: x.3]",
+      "  %1 = lt x.2, n",
+      "  branch %1, body2, break3",
+      "body2:",
+      "  x.3 = add x.2, 1",
+      "  jump while1",
+      "break3:",
+      "  return x.2"
+    ]
+    function = Lowering().lower(parse("\n".join(src_in))).functions[0]
+    to_ssa(function)
+    self.assertEqual(str(function), "\n".join(src_out))
+
+  def test_common_subexpression(self):
+    src_in = [
+      "def f(n):",
+      "  a = (n - 1) * 2",
+      "  b = (n - 1) * 3",
+      "  return a + b"
+    ]
+    src_out = [
+      "function f(n)",
+      "entry:",
+      "  %1 = sub n, 1",
+      "  a = mult %1, 2",
+      "  b = mult %1, 3",
+      "  %5 = add a, b",
+      "  return %5"
+    ]
+    self.assertEqual(self.optimize(src_in), "\n".join(src_out))
+
+  def test_hoist_from_branches(self):
+    src_in = [
+      "def f(n, a, b):",
+      "  if n > 2:",
+      "    z = a * b + 1",
+      "  else:",
+      "    z = a * b - 1",
+      "  return z"
+    ]
+    src_out = [
+      "function f(n, a, b)",
+      "entry:",
+      "  %2 = mult a, b",
+      "  %1 = gt n, 2",
+      "  branch %1, then1, else2",
+      "then1:",
+      "  z = add %2, 1",
+      "  jump end3",
+      "else2:",
+      "  z = sub %2, 1",
+      "  jump end3",
+      "end3:",
+      "  return z"
+    ]
+    self.assertEqual(self.optimize(src_in), "\n".join(src_out))
+
+  def test_constant_branch(self):
+    src_in = [
+      "def f(n):",
+      "  c = 4",
+      "  if c > 3:",
+      "    d = c * 2",
+      "  else:",
+      "    d = n",
+      "  return d + n"
+    ]
+    src_out = [
+      "function f(n)",
+      "entry:",
+      "  jump then1",
+      "then1:",
+      "  jump end3",
+      "end3:",
+      "  %3 = add 8, n",
+      "  return %3"
+    ]
+    self.assertEqual(self.optimize(src_in), "\n".join(src_out))
+
+  def test_swap(self):
+    src_in = [
+      "def f(a, b, n):",
+      "  while n > 0:",
+      "    t = a",
+      "    a = b",
+      "    b = t",
+      "    n = n - 1",
+      "  return a - b"
+    ]
+    src_out = [
+      "function f(a, b, n)",
+      "entry:",
+      "  jump while1",
+      "while1:",
+      "  %1 = gt n, 0",
+      "  branch %1, body2, break3",
+      "body2:",
+      "  n = sub n, 1",
+      "  %4 = b",
+      "  b = a",
+      "  a = %4",
+      "  jump while1",
+      "break3:",
+      "  %3 = sub a, b",
+      "  return %3"
+    ]
+    self.assertEqual(self.optimize(src_in), "\n".join(src_out))
@@ -0,0 +1,73 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.instruction_maker import ImmOp
+from ast import parse
+
+class TestImmediates(unittest.TestCase):
+  rv = RISCV_Transpiler(immediates=True)
+  rv_reg = RISCV_Transpiler(stack_mode=False, immediates=True)
+
+  def transforms(self, rv, src_in, src_out):
+    rv.reset()
+    rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, rv.instr.instr_buffer)
+
+  def test_fits(self):
+    self.assertTrue(ImmOp.ADDI.fits(-2048))
+    self.assertFalse(ImmOp.ADDI.fits(2048))
+    self.assertTrue(ImmOp.SRAI.fits(63))
+    self.assertFalse(ImmOp.SLLI.fits(64))
+
+  def test_stack_mode(self):
+    src_in = [
+      "a = 1",
+      "b = a + 1"
+    ]
+    src_out = [
+      "\taddi sp, sp, -8",
+      "\tli t0, 1",
+      "\tsd t0, 0(sp)",
+      "\tld t0, 0(sp)",
+      "\taddi sp, sp, 8",
+      "\taddi sp, sp, -8",
+      "\tsd t0, 0(sp)",
+      "\tld t1, 0(sp)",
+      "\taddi sp, sp, 8",
+      "\taddi t1, t1, 1",
+      "\taddi sp, sp, -8",
+      "\tsd t1, 0(sp)",
+      "\tld t1, 0(sp)",
+      "\taddi sp, sp, 8"
+    ]
+    self.transforms(self.rv, src_in, src_out)
+
+  def test_binops(self):
+    src_in = [
+      "a = 1",
+      "b = a - 1",
+      "c = 4 & a",
+      "d = a + 5000",
+      "e = a >> 2"
+    ]
+    src_out = [
+      "\tli t0, 1",
+      "\taddi t1, t0, -1",
+      "\tandi t2, t0, 4",
+      "\tli t3, 5000",
+      "\tadd t3, t0, t3",
+      "\tsrai t4, t0, 2"
+    ]
+    self.transforms(self.rv_reg, src_in, src_out)
+
+  def test_slti(self):
+    src_in = [
+      "a = 1",
+      "b = a <= 9",
+      "c = a < 0"
+    ]
+    src_out = [
+      "\tli t0, 1",
+      "\tslti t1, t0, 10",
+      "\tslti t2, t0, 0"
+    ]
+    self.transforms(self.rv_reg, src_in, src_out)
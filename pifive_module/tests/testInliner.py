@@ -0,0 +1,82 @@
+import unittest
+from ..transpiler.inliner import Inliner
+from ast import parse, unparse
+
+class TestInliner(unittest.TestCase):
+  def inlines(self, src_in, src_out, max_size=40):
+    node = Inliner(max_size).visit(parse("\n".join(src_in)))
+    self.assertEqual("\n".join(src_out), unparse(node))
+
+  def test_assign_and_expr(self):
+    src_in = [
+      "def sq(x):",
+      "  return x * x",
+      "def show(v):",
+      "  print(v)",
+      "def main():",
+      "  a = sq(3)",
+      "  show(a)"
+    ]
+    src_out = [
+      "def sq(x):",
+      "    return x * x",
+      "",
+      "def show(v):",
+      "    print(v)",
+      "",
+      "def main():",
+      "    _sq1_x = 3",
+      "    a = _sq1_x * _sq1_x",
+      "    _show2_v = a",
+      "    print(_show2_v)"
+    ]
+    self.inlines(src_in, src_out)
+
+  def test_recursive_and_early_return_left_alone(self):
+    src_in = [
+      "def fact(n):",
+      "  if n == 0:",
+      "    return 1",
+      "  return n * fact(n - 1)",
+      "def main():",
+      "  return fact(5)"
+    ]
+    src_out = [
+      "def fact(n):",
+      "    if n == 0:",
+      "        return 1",
+      "    return n * fact(n - 1)",
+      "",
+      "def main():",
+      "    return fact(5)"
+    ]
+    self.inlines(src_in, src_out)
+
+  def test_size_limit(self):
+    src_in = [
+      "def sq(x):",
+      "  return x * x",
+      "a = sq(2)"
+    ]
+    src_out = [
+      "def sq(x):",
+      "    return x * x",
+      "a = sq(2)"
+    ]
+    self.inlines(src_in, src_out, max_size=3)
+
+  def test_free_variable_left_alone(self):
+    src_in = [
+      "K = 3",
+      "def scale(x):",
+      "  return x * K",
+      "a = scale(2)"
+    ]
+    src_out = [
+      "K = 3",
+      "",
+      "def scale(x):",
+      "    return x * K",
+      "a = scale(2)"
+    ]
+    self.inlines(src_in, src_out)
@@ -0,0 +1,64 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.assembly import needs_frame
+from ast import parse
+
+class TestLeafFunctions(unittest.TestCase):
+  rv = RISCV_Transpiler(leaf_functions=True)
+  rv_reg = RISCV_Transpiler(stack_mode=False, leaf_functions=True)
+
+  def transforms(self, rv, src_in, src_out):
+    rv.reset()
+    rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, rv.instr.instr_buffer)
+
+  def test_needs_frame(self):
+    self.assertFalse(needs_frame(["\tadd a0, a1, a2", "\tret"]))
+    self.assertTrue(needs_frame(["\tcall f", "\tret"]))
+    self.assertTrue(needs_frame(["\tld t0, -24(fp)", "\tret"]))
+
+  def test_stack_mode(self):
+    src_in = [
+      "def f(a):",
+      "  return a"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -8",
+      "\tsd a1, 0(sp)",
+      "\tld a0, 0(sp)",
+      "\taddi sp, sp, 8",
+      "\tret"
+    ]
+    self.transforms(self.rv, src_in, src_out)
+
+  def test_only_leaves_elided(self):
+    src_in = [
+      "def f(a, b):",
+      "  return a + b",
+      "def g(a):",
+      "  return f(a, a)"
+    ]
+    src_out = [
+      "f:",
+      "\tadd a0, a1, a2",
+      "\tret",
+      "g:",
+      "\taddi sp, sp, -24",
+      "\tsd ra, 16(sp)",
+      "\tsd fp, 8(sp)",
+      "\taddi fp, sp, 24",
+      "\tmv t0, a1",
+      "\tmv t1, a1",
+      "\tsd a1, -24(fp)",
+      "\tmv a1, t0",
+      "\tmv a2, t1",
+      "\tcall f",
+      "\tld a1, -24(fp)",
+      "\tmv a0, a0",
+      "\tld ra, 16(sp)",
+      "\tld fp, 8(sp)",
+      "\taddi sp, sp, 24",
+      "\tret"
+    ]
+    self.transforms(self.rv_reg, src_in, src_out)
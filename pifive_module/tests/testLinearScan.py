@@ -0,0 +1,90 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.linear_scan import LinearScan
+from ..transpiler.registers import Reg
+from ast import parse
+
+class TestLinearScan(unittest.TestCase):
+  rv = RISCV_Transpiler(stack_mode=False, linear_scan=True)
+
+  def transforms(self, src_in, src_out):
+    self.rv.reset()
+    self.rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, self.rv.instr.instr_buffer)
+
+  def test_reuse_after_last_use(self):
+    lines = [
+      "\tli v1, 1",
+      "\tli v2, 2",
+      "\tadd v3, v1, v2",
+      "\tmv a0, v3"
+    ]
+    allocated = [
+      "\tli t0, 1",
+      "\tli t1, 2",
+      "\tadd t0, t0, t1",
+      "\tmv a0, t0"
+    ]
+    self.assertEqual(allocated, LinearScan(lines).run())
+
+  def test_spill_furthest_end(self):
+    lines = [
+      "\tli v1, 1",
+      "\tli v2, 2",
+      "\tli v3, 3",
+      "\tadd v4, v1, v2",
+      "\tadd v4, v4, v3",
+      "\tmv a0, v4"
+    ]
+    allocated = [
+      "\tli t0, 1",
+      "\tli t1, 2",
+      "\tli t5, 3",
+      "\tsd t5, -24(fp)",
+      "\tadd t0, t0, t1",
+      "\tld t5, -24(fp)",
+      "\tadd t0, t0, t5",
+      "\tmv a0, t0"
+    ]
+    allocator = LinearScan(lines, pool=[Reg.t0, Reg.t1])
+    self.assertEqual(allocated, allocator.run())
+    self.assertEqual(1, allocator.spill_count)
+
+  def test_live_across_call(self):
+    # Caller-saved registers are clobbered by the call, so v1 gets a saved register
+    lines = [
+      "\tli v1, 1",
+      "\tcall f",
+      "\tmv a0, v1"
+    ]
+    allocator = LinearScan(lines, {"f" : []})
+    self.assertEqual("\tli s1, 1", allocator.run()[0])
+    self.assertEqual([Reg.s1], allocator.saved_regs)
+
+  def test_function(self):
+    src_in = [
+      "def f(a, b):",
+      "  c = a + b",
+      "  return c * 2"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -16",
+      "\tsd ra, 8(sp)",
+      "\tsd fp, 0(sp)",
+      "\taddi fp, sp, 16",
+      "\tmv t0, a1",
+      "\tmv t1, a2",
+      "\tadd t0, t0, t1",
+      "\tli t1, 2",
+      "\tmul a0, t0, t1",
+      "\tld ra, 8(sp)",
+      "\tld fp, 0(sp)",
+      "\taddi sp, sp, 16",
+      "\tret"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_requires_register_mode(self):
+    with self.assertRaises(RuntimeError):
+      RISCV_Transpiler(linear_scan=True)
@@ -0,0 +1,144 @@
+import unittest
+from ..transpiler.loop_invariant import LoopInvariantMotion
+from ..transpiler.purity import pure_functions
+from ast import parse, unparse
+
+class TestLoopInvariant(unittest.TestCase):
+  def hoists(self, src_in, src_out):
+    node = LoopInvariantMotion().visit(parse("\n".join(src_in)))
+    self.assertEqual("\n".join(src_out), unparse(node))
+
+  def test_invariant_expressions(self):
+    src_in = [
+      "def main(n, k):",
+      "  i = 0",
+      "  while i < n * 2:",
+      "    t = i + k * 3",
+      "    i = i + 1"
+    ]
+    src_out = [
+      "def main(n, k):",
+      "    i = 0",
+      "    _licm1 = n * 2",
+      "    _licm2 = k * 3",
+      "    while i < _licm1:",
+      "        t = i + _licm2",
+      "        i = i + 1"
+    ]
+    self.hoists(src_in, src_out)
+
+  def test_nested_loops(self):
+    src_in = [
+      "def main(n):",
+      "  i = 0",
+      "  while i < n:",
+      "    j = 0",
+      "    while j < n - 1:",
+      "      j = j + i * 2",
+      "    i = i + 1"
+    ]
+    src_out = [
+      "def main(n):",
+      "    i = 0",
+      "    _licm1 = n - 1",
+      "    while i < n:",
+      "        j = 0",
+      "        _licm2 = i * 2",
+      "        while j < _licm1:",
+      "            j = j + _licm2",
+      "        i = i + 1"
+    ]
+    self.hoists(src_in, src_out)
+
+  def test_pure_call_guarded(self):
+    src_in = [
+      "def sq(x):",
+      "  return x * x",
+      "def main(n):",
+      "  i = 0",
+      "  while i < n:",
+      "    i = i + sq(n)"
+    ]
+    src_out = [
+      "def sq(x):",
+      "    return x * x",
+      "",
+      "def main(n):",
+      "    i = 0",
+      "    if i < n:",
+      "        _licm1 = sq(n)",
+      "        while i < n:",
+      "            i = i + _licm1"
+    ]
+    self.hoists(src_in, src_out)
+
+  def test_impure_test_not_repeated(self):
+    # Guarding the call would run side(i) twice on entry
+    src_in = [
+      "def sq(x):",
+      "  return x * x",
+      "def side(x):",
+      "  print(x)",
+      "  return x",
+      "def main(n):",
+      "  i = 0",
+      "  while side(i) < 2:",
+      "    i = i + sq(5)"
+    ]
+    src_out = [
+      "def sq(x):",
+      "    return x * x",
+      "",
+      "def side(x):",
+      "    print(x)",
+      "    return x",
+      "",
+      "def main(n):",
+      "    i = 0",
+      "    while side(i) < 2:",
+      "        i = i + sq(5)"
+    ]
+    self.hoists(src_in, src_out)
+
+  def test_conditional_and_impure_left_alone(self):
+    src_in = [
+      "def noisy(x):",
+      "  print(x)",
+      "  return x",
+      "def main(n):",
+      "  i = 0",
+      "  while i < n:",
+      "    i = i + noisy(n)",
+      "    if i == 3:",
+      "      return n * 2"
+    ]
+    src_out = [
+      "def noisy(x):",
+      "    print(x)",
+      "    return x",
+      "",
+      "def main(n):",
+      "    i = 0",
+      "    while i < n:",
+      "        i = i + noisy(n)",
+      "        if i == 3:",
+      "            return n * 2"
+    ]
+    self.hoists(src_in, src_out)
+
+  def test_pure_functions(self):
+    src = [
+      "g = 1",
+      "def sq(x):",
+      "  return x * x",
+      "def quad(x):",
+      "  return sq(sq(x))",
+      "def shout(x):",
+      "  print(x)",
+      "  return x",
+      "def uses_global(x):",
+      "  return x + g",
+      "def calls_impure(x):",
+      "  return shout(x)"
+    ]
+    self.assertEqual({"sq", "quad"}, pure_functions(parse("\n".join(src))))
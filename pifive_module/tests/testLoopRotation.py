@@ -0,0 +1,59 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ast import parse
+
+class TestLoopRotation(unittest.TestCase):
+  rv_fused = RISCV_Transpiler(stack_mode=False, fuse_branches=True, rotate_loops=True)
+  rv_aligned = RISCV_Transpiler(stack_mode=False, rotate_loops=True, align_loops=4)
+
+  def transforms(self, rv, src_in, src_out):
+    rv.reset()
+    rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, rv.instr.instr_buffer)
+
+  def test_fused(self):
+    src_in = [
+      "i = 0",
+      "while i < 10:",
+      "  i = i + 1"
+    ]
+    src_out = [
+      "\tli t0, 0",
+      "\tli t1, 10",
+      "\tbge t0, t1, break_global_2",
+      "while_global_1:",
+      "\tli t1, 1",
+      "\tadd t0, t0, t1",
+      "\tli t1, 10",
+      "\tblt t0, t1, while_global_1",
+      "break_global_2:"
+    ]
+    self.transforms(self.rv_fused, src_in, src_out)
+
+  def test_aligned(self):
+    src_in = [
+      "i = 0",
+      "while i < 10:",
+      "  i = i + 1"
+    ]
+    src_out = [
+      "\tli t0, 0",
+      "\tli t1, 10",
+      "\tli t2, 1",
+      "\tblt t0, t1, BLT_global_3",
+      "\tli t2, 0",
+      "BLT_global_3:",
+      "\tbeqz t2, break_global_2",
+      "\t.p2align 4",
+      "while_global_1:",
+      "\tli t1, 1",
+      "\tadd t0, t0, t1",
+      "\tli t1, 10",
+      "\tli t2, 1",
+      "\tblt t0, t1, BLT_global_4",
+      "\tli t2, 0",
+      "BLT_global_4:",
+      "\tbnez t2, while_global_1",
+      "break_global_2:"
+    ]
+    self.transforms(self.rv_aligned, src_in, src_out)
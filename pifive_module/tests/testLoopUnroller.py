@@ -0,0 +1,90 @@
+import unittest
+from ..transpiler.loop_unroller import LoopUnroller
+from ast import parse, unparse
+
+class TestLoopUnroller(unittest.TestCase):
+  def unrolls(self, src_in, src_out, unroller=None):
+    node = (unroller or LoopUnroller()).visit(parse("\n".join(src_in)))
+    self.assertEqual("\n".join(src_out), unparse(node))
+
+  def test_full(self):
+    src_in = [
+      "i = 0",
+      "total = 0",
+      "while i < 3:",
+      "  total = total + i * 2",
+      "  i = i + 1"
+    ]
+    src_out = [
+      "i = 0",
+      "total = 0",
+      "total = total + 0 * 2",
+      "total = total + 1 * 2",
+      "total = total + 2 * 2",
+      "i = 3"
+    ]
+    self.unrolls(src_in, src_out)
+
+  def test_partial_with_remainder(self):
+    src_in = [
+      "j = 10",
+      "while j > 0:",
+      "  print(j)",
+      "  j = j - 1"
+    ]
+    src_out = [
+      "j = 10",
+      "while j > 2:",
+      "    print(j)",
+      "    j = j - 1",
+      "    print(j)",
+      "    j = j - 1",
+      "    print(j)",
+      "    j = j - 1",
+      "    print(j)",
+      "    j = j - 1",
+      "print(2)",
+      "print(1)",
+      "j = 0"
+    ]
+    self.unrolls(src_in, src_out)
+
+  def test_never_entered(self):
+    src_in = [
+      "i = 5",
+      "while i < 5:",
+      "  print(i)",
+      "  i = i + 1"
+    ]
+    src_out = [
+      "i = 5",
+      "i = 5"
+    ]
+    self.unrolls(src_in, src_out)
+
+  def test_unknown_trip_count_left_alone(self):
+    src_in = [
+      "def main(n):",
+      "  i = 0",
+      "  while i < n:",
+      "    i = i + 1",
+      "  k = 0",
+      "  while k < 10:",
+      "    if k == 3:",
+      "      k = 7",
+      "    k = k + 1",
+      "  return i"
+    ]
+    src_out = [
+      "def main(n):",
+      "    i = 0",
+      "    while i < n:",
+      "        i = i + 1",
+      "    k = 0",
+      "    while k < 10:",
+      "        if k == 3:",
+      "            k = 7",
+      "        k = k + 1",
+      "    return i"
+    ]
+    self.unrolls(src_in, src_out)
@@ -0,0 +1,52 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.pass_manager import PassManager, select_passes, transpiler_options, LEVELS
+from ast import parse
+
+class TestPassManager(unittest.TestCase):
+  src = [
+    "def main():",
+    "  x = 2 * 3",
+    "  print(x)",
+    "  return 0"
+  ]
+
+  def test_select_passes(self):
+    self.assertEqual(select_passes('0'), [])
+    self.assertEqual(select_passes('1'), [name for name in select_passes('2') if name in LEVELS['1']])
+    passes = select_passes('2', "-unroll, +linear-scan")
+    self.assertNotIn("unroll", passes)
+    self.assertIn("linear-scan", passes)
+    self.assertRaises(RuntimeError, select_passes, '3')
+    self.assertRaises(RuntimeError, select_passes, '1', "+bogus")
+
+  def test_options(self):
+    options = transpiler_options(select_passes('1', "+ssa"))
+    self.assertTrue(options['ir'])
+    self.assertFalse(options['stack_mode'])
+    self.assertFalse(options['callee_saved'])
+    self.assertTrue(transpiler_options([])['stack_mode'])
+    self.assertEqual(transpiler_options(['schedule'], 'rocket')['scheduler'].cost_model.core, 'rocket')
+
+  def test_level_0_is_default(self):
+    rv_default = RISCV_Transpiler()
+    rv_default.transpile(parse("\n".join(self.src)))
+    rv_level = RISCV_Transpiler(**transpiler_options(select_passes('0')))
+    rv_level.transpile(parse("\n".join(self.src)))
+    self.assertEqual(rv_default.instr.instr_buffer, rv_level.instr.instr_buffer)
+
+  def test_timings(self):
+    for level in LEVELS:
+      rv = RISCV_Transpiler(**transpiler_options(select_passes(level)))
+      rv.transpile(parse("\n".join(self.src)))
+      self.assertIn("codegen", rv.pass_manager.timings)
+    self.assertEqual(list(rv.pass_manager.timings), ["fold", "evaluate", "dce", "licm", "globals", "bounds", "codegen", "peephole", "schedule"])
+    self.assertTrue(rv.pass_manager.report()[-1].startswith("total"))
+
+  def test_run_passes(self):
+    # Steps run in the order of PASSES whatever order they were registered in, and fold runs again after evaluate
+    manager = PassManager()
+    for name in ["schedule", "evaluate", "fold", "dce", "inline"]:
+      manager.register(name, lambda names, name=name: names + [name])
+    self.assertEqual(manager.run_passes({"schedule", "fold", "dce", "evaluate"}, []), ["fold", "evaluate", "fold", "dce", "schedule"])
+    self.assertRaises(RuntimeError, manager.register, "bogus", None)
@@ -0,0 +1,82 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.peephole import Peephole
+from ast import parse
+
+class TestPeephole(unittest.TestCase):
+  def optimizes(self, src_in, src_out, rules=None):
+    self.assertEqual(src_out, Peephole(rules).optimize(src_in))
+
+  def test_single_assign(self):
+    rv = RISCV_Transpiler(peephole=Peephole())
+    rv.transpile(parse("x = 42"))
+    self.assertEqual(["\tli t0, 42"], rv.instr.instr_buffer)
+
+  def test_simple_binop(self):
+    rv = RISCV_Transpiler(peephole=Peephole())
+    rv.transpile(parse("a = 1 + 41"))
+    src_out = [
+      "\tli t0, 1",
+      "\tmv t1, t0",
+      "\tli t0, 41",
+      "\tadd t1, t1, t0",
+      "\tmv t0, t1"
+    ]
+    self.assertEqual(src_out, rv.instr.instr_buffer)
+
+  def test_push_pop_clobbered(self):
+    # Both registers are written between the push and the pop
+    src_in = [
+      "\taddi sp, sp, -8",
+      "\tsd t0, 0(sp)",
+      "\tli t0, 1",
+      "\tli t1, 2",
+      "\tld t1, 0(sp)",
+      "\taddi sp, sp, 8"
+    ]
+    self.optimizes(src_in, src_in, ["push_pop"])
+
+  def test_push_pop_across_label(self):
+    src_in = [
+      "\taddi sp, sp, -8",
+      "\tsd t0, 0(sp)",
+      "loop:",
+      "\tld t1, 0(sp)",
+      "\taddi sp, sp, 8"
+    ]
+    self.optimizes(src_in, src_in)
+
+  def test_merge_sp(self):
+    src_in = [
+      "\taddi sp, sp, -8",
+      "\t# comment",
+      "\taddi sp, sp, -16",
+      "\taddi sp, sp, 24",
+      "\taddi sp, sp, 8"
+    ]
+    src_out = [
+      "\t# comment",
+      "\taddi sp, sp, 8"
+    ]
+    self.optimizes(src_in, src_out, ["merge_sp"])
+
+  def test_self_move(self):
+    self.optimizes(["\tmv t0, t0", "\tmv t1, t0"], ["\tmv t1, t0"], ["self_move"])
+
+  def test_jump_next(self):
+    src_in = [
+      "\tj end",
+      "else:",
+      "end:",
+      "\tj else"
+    ]
+    src_out = [
+      "else:",
+      "end:",
+      "\tj else"
+    ]
+    self.optimizes(src_in, src_out, ["jump_next"])
+
+  def test_unknown_rule(self):
+    with self.assertRaises(RuntimeError):
+      Peephole(["not_a_rule"])
@@ -0,0 +1,145 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ast import parse
+
+class TestRegisterMode(unittest.TestCase):
+  rv = RISCV_Transpiler(stack_mode=False)
+
+  def transforms(self, src_in, src_out):
+    self.rv.reset()
+    self.rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, self.rv.instr.instr_buffer)
+
+  def test_binop_into_target(self):
+    src_in = [
+      "b = 2",
+      "c = 3",
+      "a = b * c + 4"
+    ]
+    src_out = [
+      "\tli t0, 2",
+      "\tli t1, 3",
+      "\tmul t2, t0, t1",
+      "\tli t3, 4",
+      "\tadd t2, t2, t3"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_reassign(self):
+    src_in = [
+      "a = 1",
+      "b = 2",
+      "a = b"
+    ]
+    src_out = [
+      "\tli t0, 1",
+      "\tli t1, 2",
+      "\tmv t0, t1"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_sethi_ullman_order(self):
+    # The right operand needs more registers, so it is evaluated first
+    src_in = [
+      "a = 1",
+      "b = a - (a + 2) * (a + 3)"
+    ]
+    src_out = [
+      "\tli t0, 1",
+      "\tli t1, 2",
+      "\tadd t1, t0, t1",
+      "\tli t2, 3",
+      "\tadd t2, t0, t2",
+      "\tmul t1, t1, t2",
+      "\tsub t1, t0, t1"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_function(self):
+    src_in = [
+      "def function(a, b):",
+      "  c = a + b",
+      "  return c"
+    ]
+    src_out = [
+      "function:",
+      "\taddi sp, sp, -40",
+      "\tsd ra, 32(sp)",
+      "\tsd fp, 24(sp)",
+      "\taddi fp, sp, 40",
+      "\tadd t0, a1, a2",
+      "\tmv a0, t0",
+      "\tld ra, 32(sp)",
+      "\tld fp, 24(sp)",
+      "\taddi sp, sp, 40",
+      "\tret"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_argument_survives_call(self):
+    src_in = [
+      "def f(n):",
+      "  return n * f(n - 1)"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -24",
+      "\tsd ra, 16(sp)",
+      "\tsd fp, 8(sp)",
+      "\taddi fp, sp, 24",
+      "\tli t0, 1",
+      "\tsub t0, a1, t0",
+      "\tsd a1, -24(fp)",
+      "\tmv a1, t0",
+      "\tcall f",
+      "\tld a1, -24(fp)",
+      "\tmv t0, a0",
+      "\tmul a0, a1, t0",
+      "\tld ra, 16(sp)",
+      "\tld fp, 8(sp)",
+      "\taddi sp, sp, 24",
+      "\tret"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_while(self):
+    src_in = [
+      "i = 0",
+      "while i < 10:",
+      "  i = i + 1"
+    ]
+    src_out = [
+      "\tli t0, 0",
+      "while_global_1:",
+      "\tli t1, 10",
+      "\tli t2, 1",
+      "\tblt t0, t1, BLT_global_3",
+      "\tli t2, 0",
+      "BLT_global_3:",
+      "\tbeqz t2, break_global_2",
+      "\tli t1, 1",
+      "\tadd t0, t0, t1",
+      "\tj while_global_1",
+      "break_global_2:"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_spill_pending_operands(self):
+    # Nine results pending at once, more than there are temporaries, also inside an "and" and around an array
+    src_in = [
+      "def g(x):",
+      "  return x",
+      "def f(n):",
+      "  a = [3, 4, 5]",
+      "  x = g(1) + (g(2) * (g(3) + (g(4) * (g(5) + (g(6) * (g(7) + (g(8) * (a[n] + a[2]))))))))",
+      "  return x + (g(1) + (g(2) + (g(3) + (g(4) + (g(5) + (g(6) + (g(7) + (n and g(8) + (g(9) + g(10))))))))))"
+    ]
+    rv = RISCV_Transpiler(stack_mode=False, comments_on=True)
+    rv.transpile(parse("\n".join(src_in)))
+    spills = [line for line in rv.instr.instr_buffer if line.startswith("\t# Spill pending")]
+    reloads = [line for line in rv.instr.instr_buffer if line.startswith("\t# Reload spilled")]
+    self.assertTrue(spills)
+    self.assertEqual(len(spills), len(reloads))
+    # Short of temporaries, a[2] is addressed from sp before more spills can move it, past the four operands on it
+    index = rv.instr.instr_buffer.index("\tld t1, 16(t1)")
+    self.assertEqual(rv.instr.instr_buffer[index - 1], "\taddi t1, sp, 32")
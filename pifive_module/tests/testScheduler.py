@@ -0,0 +1,118 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.scheduler import Scheduler
+from ..transpiler.cost_model import CostModel
+from ast import parse
+
+class TestScheduler(unittest.TestCase):
+  def schedules(self, src_in, src_out, core='u74'):
+    self.assertEqual(src_out, Scheduler(CostModel(core)).schedule(src_in))
+
+  def test_load_latency(self):
+    src_in = [
+      "\tld t0, 0(a1)",
+      "\tadd t1, t0, t0",
+      "\tli t2, 5",
+      "\tli t3, 6"
+    ]
+    src_out = [
+      "\tld t0, 0(a1)",
+      "\tli t2, 5",
+      "\tli t3, 6",
+      "\tadd t1, t0, t0"
+    ]
+    self.schedules(src_in, src_out)
+
+  def test_core_latencies(self):
+    # A load takes one cycle less on rocket, one instruction is enough to cover it
+    src_in = [
+      "\tld t0, 0(a1)",
+      "\tadd t1, t0, t0",
+      "\tli t2, 5",
+      "\tli t3, 6"
+    ]
+    src_out = [
+      "\tld t0, 0(a1)",
+      "\tli t2, 5",
+      "\tadd t1, t0, t0",
+      "\tli t3, 6"
+    ]
+    self.schedules(src_in, src_out, 'rocket')
+
+  def test_independent_load(self):
+    # The load of another slot passes the store
+    src_in = [
+      "\tsd t0, 0(sp)",
+      "\tld t1, 8(sp)",
+      "\tadd t3, t1, t1"
+    ]
+    src_out = [
+      "\tld t1, 8(sp)",
+      "\tsd t0, 0(sp)",
+      "\tadd t3, t1, t1"
+    ]
+    self.schedules(src_in, src_out)
+
+  def test_dependent_load(self):
+    src_in = [
+      "\tsd t0, 0(sp)",
+      "\tld t1, 0(sp)",
+      "\tadd t3, t1, t1"
+    ]
+    self.schedules(src_in, src_in)
+
+  def test_base_register_written(self):
+    src_in = [
+      "\tsd t0, 0(sp)",
+      "\taddi sp, sp, 8",
+      "\tld t1, 8(sp)"
+    ]
+    self.schedules(src_in, src_in)
+
+  def test_block_boundaries(self):
+    # Labels, calls and jumps stay in place, comments move with the next instruction
+    src_in = [
+      "\tld t0, 0(a1)",
+      "\t# Add",
+      "\tadd t1, t0, t0",
+      "\tli t2, 5",
+      ".L1:",
+      "\tmul a0, t1, t2",
+      "\taddi a0, a0, 1",
+      "\tli t3, 2",
+      "\tcall printf",
+      "\tli t4, 1",
+      "\tj .L1"
+    ]
+    src_out = [
+      "\tld t0, 0(a1)",
+      "\tli t2, 5",
+      "\t# Add",
+      "\tadd t1, t0, t0",
+      ".L1:",
+      "\tmul a0, t1, t2",
+      "\tli t3, 2",
+      "\taddi a0, a0, 1",
+      "\tcall printf",
+      "\tli t4, 1",
+      "\tj .L1"
+    ]
+    self.schedules(src_in, src_out)
+
+  def test_transpile(self):
+    src_in = [
+      "def f(a, b, c):",
+      "  x = a * b",
+      "  y = c + 1",
+      "  return x + y"
+    ]
+    src_out = [
+      "f:",
+      "\tmul t0, a1, a2",
+      "\taddi t1, a3, 1",
+      "\tadd a0, t0, t1",
+      "\tret"
+    ]
+    rv = RISCV_Transpiler(stack_mode=False, immediates=True, leaf_functions=True, scheduler=Scheduler())
+    rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, rv.instr.instr_buffer)
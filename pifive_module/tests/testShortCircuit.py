@@ -0,0 +1,272 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ..transpiler.constant_folder import ConstantFolder
+from ..transpiler.call_evaluator import CallEvaluator
+from ..transpiler.ir_lowering import Lowering
+from ..transpiler.ir_optimizer import IROptimizer
+from ast import parse, unparse
+
+class TestShortCircuit(unittest.TestCase):
+  callee = [
+    "def g(x):",
+    "  return x"
+  ]
+
+  def transpiles(self, src_in, src_out, **options):
+    rv = RISCV_Transpiler(stack_mode=False, leaf_functions=True, **options)
+    rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, rv.instr.instr_buffer)
+
+  def test_fold(self):
+    src_in = "a = 1 and x\nb = 0 and g(x)\nc = x or 1 or g(x)\nd = 0 or 0"
+    src_out = "a = x\nb = 0\nc = x or 1\nd = 0"
+    self.assertEqual(src_out, unparse(ConstantFolder().visit(parse(src_in))))
+
+  def test_evaluate(self):
+    # The division by zero is never reached
+    src_in = [
+      "def f(n):",
+      "  return n != 0 and 100 // n",
+      "x = f(0) + f(4)"
+    ]
+    node = CallEvaluator().visit(parse("\n".join(src_in)))
+    self.assertEqual(unparse(node.body[-1]), "x = 0 + 25")
+
+  def test_condition(self):
+    src_in = [
+      "def f(a, b, c):",
+      "  if a < b and not b < c:",
+      "    return 1",
+      "  return 0"
+    ]
+    src_out = [
+      "f:",
+      "\tbge a1, a2, else_f_1",
+      "\tblt a2, a3, else_f_1",
+      "\tli a0, 1",
+      "\tret",
+      "else_f_1:",
+      "\tli a0, 0",
+      "\tret"
+    ]
+    self.transpiles(src_in, src_out, fuse_branches=True)
+
+  def test_condition_skips_call(self):
+    src_in = self.callee + [
+      "def f(a, b, c):",
+      "  if a < b or g(c):",
+      "    return 1",
+      "  return 0"
+    ]
+    src_out = [
+      "g:",
+      "\tmv a0, a1",
+      "\tret",
+      "f:",
+      "\taddi sp, sp, -40",
+      "\tsd ra, 32(sp)",
+      "\tsd fp, 24(sp)",
+      "\taddi fp, sp, 40",
+      "\tblt a1, a2, decided_f_2",
+      "\tmv t0, a3",
+      "\tsd a1, -24(fp)",
+      "\tsd a2, -32(fp)",
+      "\tsd a3, -40(fp)",
+      "\tmv a1, t0",
+      "\tcall g",
+      "\tld a1, -24(fp)",
+      "\tld a2, -32(fp)",
+      "\tld a3, -40(fp)",
+      "\tmv t0, a0",
+      "\tbeqz t0, else_f_1",
+      "decided_f_2:",
+      "\tli a0, 1",
+      "\tld ra, 32(sp)",
+      "\tld fp, 24(sp)",
+      "\taddi sp, sp, 40",
+      "\tret",
+      "else_f_1:",
+      "\tli a0, 0",
+      "\tld ra, 32(sp)",
+      "\tld fp, 24(sp)",
+      "\taddi sp, sp, 40",
+      "\tret"
+    ]
+    self.transpiles(src_in, src_out, fuse_branches=True)
+
+  def test_values(self):
+    src_in = [
+      "def f(a, b, c):",
+      "  x = a < b and b < c",
+      "  y = a or b",
+      "  z = a and c",
+      "  return x + y + z"
+    ]
+    src_out = [
+      "f:",
+      "\tslt t0, a1, a2",
+      "\tslt t1, a2, a3",
+      "\tand t0, t0, t1",
+      "\tseqz t1, a1",
+      "\tsub t1, zero, t1",
+      "\tand t1, t1, a2",
+      "\tor t1, a1, t1",
+      "\tsnez t2, a1",
+      "\tsub t2, zero, t2",
+      "\tand t2, t2, a3",
+      "\tadd t3, t0, t1",
+      "\tadd a0, t3, t2",
+      "\tret"
+    ]
+    self.transpiles(src_in, src_out, branchless_compares=True, immediates=True)
+
+  def test_value_skips_call(self):
+    src_in = self.callee + [
+      "def f(a, b):",
+      "  x = a > 0 and g(b)",
+      "  return x"
+    ]
+    src_out = [
+      "g:",
+      "\tmv a0, a1",
+      "\tret",
+      "f:",
+      "\taddi sp, sp, -40",
+      "\tsd ra, 32(sp)",
+      "\tsd fp, 24(sp)",
+      "\taddi fp, sp, 40",
+      "\tslt t0, zero, a1",
+      "\tbeqz t0, decided_f_1",
+      "\tmv t1, a2",
+      "\tsd a1, -24(fp)",
+      "\tsd a2, -32(fp)",
+      "\tmv a1, t1",
+      "\tcall g",
+      "\tld a1, -24(fp)",
+      "\tld a2, -32(fp)",
+      "\tmv t0, a0",
+      "decided_f_1:",
+      "\tmv a0, t0",
+      "\tld ra, 32(sp)",
+      "\tld fp, 24(sp)",
+      "\taddi sp, sp, 40",
+      "\tret"
+    ]
+    self.transpiles(src_in, src_out, branchless_compares=True, immediates=True)
+
+  def test_ir_lowering(self):
+    src_in = self.callee + [
+      "def f(a, b, c):",
+      "  if a < b and not (b < c or c):",
+      "    a = 1",
+      "  x = a or g(b)",
+      "  return x + a"
+    ]
+    src_out = [
+      "function f(a, b, c)",
+      "entry:",
+      "  %1 = lt a, b",
+      "  branch %1, next3, end2",
+      "next3:",
+      "  %2 = lt b, c",
+      "  branch %2, end2, next4",
+      "next4:",
+      "  branch c, end2, then1",
+      "then1:",
+      "  a = 1",
+      "  jump end2",
+      "end2:",
+      "  _bool5 = a",
+      "  branch _bool5, decided6, next7",
+      "next7:",
+      "  %3 = call g(b)",
+      "  _bool5 = %3",
+      "  jump decided6",
+      "decided6:",
+      "  x = _bool5",
+      "  %4 = add x, a",
+      "  return %4"
+    ]
+    module = Lowering().lower(parse("\n".join(src_in)))
+    self.assertEqual(str(module.functions[1]), "\n".join(src_out))
+
+  def test_ir_nested_values(self):
+    # Operands that start blocks of their own, the branch and copies go in the block they end in
+    src_in = self.callee + [
+      "def f(a, b, c):",
+      "  if (a or g(b)) + 1:",
+      "    c = 1",
+      "  while a and (b or g(c)) + 1:",
+      "    a = a - 1",
+      "  return c"
+    ]
+    src_out = [
+      "function f(a, b, c)",
+      "entry:",
+      "  _bool3 = a",
+      "  branch _bool3, decided4, next5",
+      "next5:",
+      "  %1 = call g(b)",
+      "  _bool3 = %1",
+      "  jump decided4",
+      "decided4:",
+      "  %2 = add _bool3, 1",
+      "  branch %2, then1, end2",
+      "then1:",
+      "  c = 1",
+      "  jump end2",
+      "end2:",
+      "  jump while6",
+      "while6:",
+      "  branch a, next9, break8",
+      "next9:",
+      "  _bool10 = b",
+      "  branch _bool10, decided11, next12",
+      "next12:",
+      "  %3 = call g(c)",
+      "  _bool10 = %3",
+      "  jump decided11",
+      "decided11:",
+      "  %4 = add _bool10, 1",
+      "  branch %4, body7, break8",
+      "body7:",
+      "  a = sub a, 1",
+      "  jump while6",
+      "break8:",
+      "  return c"
+    ]
+    module = Lowering().lower(parse("\n".join(src_in)))
+    self.assertEqual(str(module.functions[1]), "\n".join(src_out))
+    for options in [{}, {"ir_optimizer": IROptimizer()}]:
+      RISCV_Transpiler(stack_mode=False, ir=True, **options).transpile(parse("\n".join(src_in)))
+
+  def test_ir_nested_bool_op(self):
+    src_in = self.callee + [
+      "def f(a, b, c):",
+      "  x = a and (b or g(c)) + 1",
+      "  return x"
+    ]
+    src_out = [
+      "function f(a, b, c)",
+      "entry:",
+      "  _bool1 = a",
+      "  branch _bool1, next3, decided2",
+      "next3:",
+      "  _bool4 = b",
+      "  branch _bool4, decided5, next6",
+      "next6:",
+      "  %1 = call g(c)",
+      "  _bool4 = %1",
+      "  jump decided5",
+      "decided5:",
+      "  %2 = add _bool4, 1",
+      "  _bool1 = %2",
+      "  jump decided2",
+      "decided2:",
+      "  x = _bool1",
+      "  return x"
+    ]
+    module = Lowering().lower(parse("\n".join(src_in)))
+    self.assertEqual(str(module.functions[1]), "\n".join(src_out))
+    for options in [{}, {"ir_optimizer": IROptimizer()}]:
+      RISCV_Transpiler(stack_mode=False, ir=True, **options).transpile(parse("\n".join(src_in)))
@@ -0,0 +1,40 @@
+import unittest
+from ..transpiler.strength_reducer import StrengthReducer, signed_digits
+from ..transpiler.cost_model import CostModel
+from ast import parse, unparse
+
+class TestStrengthReducer(unittest.TestCase):
+  def reduces(self, src_in, src_out, cost_model=None):
+    node = StrengthReducer(cost_model).visit(parse("\n".join(src_in)))
+    self.assertEqual("\n".join(src_out), unparse(node))
+
+  def test_signed_digits(self):
+    self.assertEqual([(1, 3)], signed_digits(8))
+    self.assertEqual([(1, 7), (-1, 2), (-1, 0)], signed_digits(123))
+    self.assertEqual([(1, 8), (-1, 0)], signed_digits(255))
+
+  def test_identities(self):
+    self.reduces(["a = x * 0", "b = 1 * x"], ["a = 0", "b = x"])
+
+  def test_power_of_two(self):
+    self.reduces(["a = x * 8"], ["a = x << 3"])
+
+  def test_shift_add_chain(self):
+    self.reduces(["a = 7 * x", "b = x * 6"], ["a = (x << 3) - x", "b = (x << 3) - (x << 1)"])
+
+  def test_cost_model(self):
+    # Four instructions do not beat li and a three-cycle mul on the U74, but do beat an eight-cycle mul
+    self.reduces(["a = x * 123"], ["a = x * 123"])
+    self.reduces(["a = x * 123"], ["a = (x << 7) - (x << 2) - x"], CostModel('rocket'))
+
+  def test_expression_operand_left_alone(self):
+    self.reduces(["a = (x + 1) * 8"], ["a = (x + 1) * 8"])
+
+  def test_unknown_core(self):
+    with self.assertRaises(RuntimeError):
+      CostModel('pentium')
+
+  def test_negative_constant(self):
+    node = parse("a = x * 1")
+    node.body[0].value.right.value = -4
+    self.assertEqual("a = 0 - (x << 2)", unparse(StrengthReducer().visit(node)))
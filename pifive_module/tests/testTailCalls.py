@@ -0,0 +1,59 @@
+import unittest
+from ..transpiler.transpiler import RISCV_Transpiler
+from ast import parse
+
+class TestTailCalls(unittest.TestCase):
+  rv = RISCV_Transpiler(stack_mode=False, tail_calls=True)
+
+  def transforms(self, src_in, src_out):
+    self.rv.reset()
+    self.rv.transpile(parse("\n".join(src_in)))
+    self.assertEqual(src_out, self.rv.instr.instr_buffer)
+
+  def test_self_tail_call(self):
+    # Both arguments are computed before a1 and a2 are overwritten
+    src_in = [
+      "def f(n, t):",
+      "  if n == 0:",
+      "    return t",
+      "  return f(n - 1, t + n)"
+    ]
+    src_out = [
+      "f:",
+      "\taddi sp, sp, -32",
+      "\tsd ra, 24(sp)",
+      "\tsd fp, 16(sp)",
+      "\taddi fp, sp, 32",
+      "f_tail:",
+      "\tli t0, 0",
+      "\tli t1, 1",
+      "\tbeq a1, t0, BEQ_f_2",
+      "\tli t1, 0",
+      "BEQ_f_2:",
+      "\tbeqz t1, else_f_1",
+      "\tmv a0, a2",
+      "\tld ra, 24(sp)",
+      "\tld fp, 16(sp)",
+      "\taddi sp, sp, 32",
+      "\tret",
+      "else_f_1:",
+      "\tli t0, 1",
+      "\tsub t0, a1, t0",
+      "\tadd t1, a2, a1",
+      "\tmv a1, t0",
+      "\tmv a2, t1",
+      "\tj f_tail"
+    ]
+    self.transforms(src_in, src_out)
+
+  def test_other_call_untouched(self):
+    src_in = [
+      "def g(n):",
+      "  return n",
+      "def f(n):",
+      "  return g(n)"
+    ]
+    self.rv.reset()
+    self.rv.transpile(parse("\n".join(src_in)))
+    self.assertIn("\tcall g", self.rv.instr.instr_buffer)
+    self.assertNotIn("f_tail:", self.rv.instr.instr_buffer)
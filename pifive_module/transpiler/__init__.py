@@ -1 +1,16 @@
-from .transpiler import RISCV_Transpiler
\ No newline at end of file
+from .transpiler import RISCV_Transpiler
+from .peephole import Peephole
+from .constant_folder import ConstantFolder
+from .linear_scan import LinearScan
+from .cost_model import CostModel
+from .strength_reducer import StrengthReducer
+from .inliner import Inliner
+from .loop_invariant import LoopInvariantMotion
+from .loop_unroller import LoopUnroller
+from .dead_code import DeadCodeEliminator
+from .ir_lowering import Lowering
+from .ir_backend import IRBackend
+from .ir_optimizer import IROptimizer
+from .call_evaluator import CallEvaluator
+from .scheduler import Scheduler
+from .pass_manager import PassManager, select_passes, transpiler_options
@@ -0,0 +1,140 @@
+import ast
+from .constant_folder import int_value
+from .loop_unroller import LoopUnroller
+from .purity import declared_globals, local_names
+
+# Arrays longer than this are filled by a loop rather than a store per element
+MAX_UNROLLED_FILL = 8
+
+def is_array(node) -> bool:
+  '''Checks if an expression makes a list, a literal or "[value] * count"'''
+  return isinstance(node, ast.List) or (isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult)
+                                        and isinstance(node.left, ast.List))
+
+def uses_arrays(node) -> bool:
+  '''Checks if the code makes or indexes a list anywhere'''
+  return any(isinstance(child, (ast.List, ast.Subscript)) for child in ast.walk(node))
+
+def array_size(node) -> int:
+  '''Number of elements of a fixed-size list, or None if it isn't one'''
+  if isinstance(node, ast.List) and node.elts:
+    return len(node.elts)
+  if is_array(node) and isinstance(node, ast.BinOp) and len(node.left.elts) == 1:
+    count = int_value(node.right)
+    if count is not None and count > 0:
+      return count
+  return None
+
+def array_elements(node) -> list:
+  '''Expressions of the elements, the one of "[value] * count" only once'''
+  return node.elts if isinstance(node, ast.List) else node.left.elts
+
+def array_values(node) -> list:
+  '''Initial value of every element, or None if some element isn't a constant'''
+  values = [int_value(element) for element in array_elements(node)]
+  if None in values:
+    return None
+  return values if isinstance(node, ast.List) else values * array_size(node)
+
+def array_sizes(statements : list) -> dict:
+  '''Size of each array the statements assign, leaving out the bodies of functions'''
+  sizes = {}
+  work = list(statements)
+  while work:
+    statement = work.pop(0)
+    if isinstance(statement, ast.FunctionDef):
+      continue
+    if isinstance(statement, ast.Assign) and isinstance(statement.targets[0], ast.Name):
+      size = array_size(statement.value)
+      if size is not None:
+        sizes.setdefault(statement.targets[0].id, size)
+    work += getattr(statement, 'body', []) + getattr(statement, 'orelse', [])
+  return sizes
+
+def offset_form(node):
+  '''(index, offset) with the subscript node equal to index + offset, offset being a constant'''
+  if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+    if int_value(node.right) is not None:
+      return node.left, int_value(node.right)
+    if int_value(node.left) is not None:
+      return node.right, int_value(node.left)
+  elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Sub) and int_value(node.right) is not None:
+    return node.left, -int_value(node.right)
+  return node, 0
+
+def scoped_sizes(module : ast.Module) -> dict:
+  '''Arrays each function sees, its own and the ones of the module it doesn't hide, by function name
+  (None for the module-level code)'''
+  module_sizes = array_sizes(module.body)
+  scoped = {None : module_sizes}
+  for statement in module.body:
+    if isinstance(statement, ast.FunctionDef):
+      names = local_names(statement)
+      sizes = {name : size for name, size in module_sizes.items() if name not in names}
+      sizes.update(array_sizes(statement.body))
+      scoped[statement.name] = sizes
+  return scoped
+
+class ArrayLengths(ast.NodeTransformer):
+  '''Replaces "len" of an array with its size, which is known at compile time'''
+  def __init__(self):
+    self.sizes = {}
+
+  def visit_Module(self, node : ast.Module):
+    scoped = scoped_sizes(node)
+    for statement in node.body:
+      self.sizes = scoped[statement.name if isinstance(statement, ast.FunctionDef) else None]
+      self.visit(statement)
+    return node
+
+  def visit_Call(self, node : ast.Call):
+    self.generic_visit(node)
+    if (isinstance(node.func, ast.Name) and node.func.id == "len" and len(node.args) == 1
+        and isinstance(node.args[0], ast.Name) and node.args[0].id in self.sizes):
+      return ast.copy_location(ast.Constant(value=self.sizes[node.args[0].id]), node)
+    return node
+
+class BoundsChecks:
+  '''Finds the subscripts inside counted loops whose index provably stays in range, so they need no check'''
+  def __init__(self):
+    self.unroller = LoopUnroller()
+    self.safe = set()
+
+  def run(self, node : ast.Module) -> set:
+    self.safe = set()
+    scoped = scoped_sizes(node)
+    for statement in node.body:
+      if isinstance(statement, ast.FunctionDef):
+        self.visit_statements(statement.body, scoped[statement.name], {}, declared_globals(statement))
+    return self.safe
+
+  def visit_statements(self, statements : list, sizes : dict, ranges : dict, globals : set):
+    '''ranges has the lowest and highest value of the induction variables of the enclosing loops'''
+    for i, statement in enumerate(statements):
+      if isinstance(statement, ast.If):
+        self.mark(statement.test, sizes, ranges)
+        self.visit_statements(statement.body, sizes, ranges, globals)
+        self.visit_statements(statement.orelse, sizes, ranges, globals)
+      elif isinstance(statement, ast.While):
+        self.mark(statement.test, sizes, ranges)
+        induction = self.unroller.induction(statements[:i], statement)
+        if induction is None or induction.name in globals:
+          self.visit_statements(statement.body, sizes, ranges, globals)
+        elif induction.trip_count > 0:
+          # Everything before the increment sees the values the loop test let through
+          last = induction.value(induction.trip_count - 1)
+          inner = dict(ranges)
+          inner[induction.name] = (min(induction.start, last), max(induction.start, last))
+          self.visit_statements(statement.body[:-1], sizes, inner, globals)
+      else:
+        self.mark(statement, sizes, ranges)
+
+  def mark(self, node, sizes : dict, ranges : dict):
+    for child in ast.walk(node):
+      if not isinstance(child, ast.Subscript) or not isinstance(child.value, ast.Name) or child.value.id not in sizes:
+        continue
+      index, offset = offset_form(child.slice)
+      if isinstance(index, ast.Name) and index.id in ranges:
+        low, high = ranges[index.id]
+        if 0 <= low + offset and high + offset < sizes[child.value.id]:
+          self.safe.add(child)
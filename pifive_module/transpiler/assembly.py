@@ -0,0 +1,140 @@
+from enum import Enum
+from .registers import Reg
+
+STORES = ['sd', 'sw', 'sh', 'sb']
+LOADS = ['ld', 'lw', 'lh', 'lb', 'lwu', 'lhu', 'lbu']
+BRANCHES = ['beq', 'bne', 'blt', 'ble', 'bgt', 'bge', 'bltu', 'bgeu']
+ZERO_BRANCHES = ['beqz', 'bnez', 'bltz', 'bgez', 'blez', 'bgtz']
+JUMPS = ['j', 'jr', 'ret', 'tail']
+CALLS = ['call']
+
+CALL_USES = ['a0', 'a1', 'a2', 'a3', 'a4', 'a5', 'a6', 'a7']
+CALL_CLOBBERS = ['ra', 't0', 't1', 't2', 't3', 't4', 't5', 't6',
+                 'a0', 'a1', 'a2', 'a3', 'a4', 'a5', 'a6', 'a7']
+
+class LineKind(Enum):
+  instruction = 'instruction'
+  label = 'label'
+  directive = 'directive'
+  comment = 'comment'
+  blank = 'blank'
+
+def is_virtual(token : str) -> bool:
+  '''Checks if an operand names a virtual register like "v12"'''
+  return token[:1] == 'v' and token[1:].isdigit()
+
+def is_register(token : str) -> bool:
+  '''Checks if an operand names a register'''
+  return token in Reg.__members__ or token == 's0' or is_virtual(token)
+
+def split_memory(token : str):
+  '''Splits a memory operand like "-8(fp)" into its offset and base register'''
+  offset, base = token[:-1].split('(')
+  return int(offset), base
+
+class AsmLine:
+  '''A single parsed line of the instruction buffer'''
+  def __init__(self, text : str):
+    self.text = text
+    self.op = None
+    self.operands = []
+    self.label = None
+
+    stripped = text.strip()
+    if not stripped:
+      self.kind = LineKind.blank
+    elif stripped.startswith('#'):
+      self.kind = LineKind.comment
+    elif stripped.endswith(':'):
+      self.kind = LineKind.label
+      self.label = stripped[:-1]
+    elif stripped.startswith('.'):
+      self.kind = LineKind.directive
+      self.op = stripped.split()[0]
+    else:
+      self.kind = LineKind.instruction
+      op, _, rest = stripped.partition(' ')
+      self.op = op
+      self.operands = [operand.strip() for operand in rest.split(',')] if rest else []
+
+  def is_instruction(self) -> bool:
+    return self.kind == LineKind.instruction
+
+  def is_code(self) -> bool:
+    '''Comments and blank lines have no effect on the program'''
+    return self.kind not in (LineKind.comment, LineKind.blank)
+
+  def is_memory(self) -> bool:
+    return self.op in STORES or self.op in LOADS
+
+  def is_control(self) -> bool:
+    '''Checks if the instruction may transfer control elsewhere'''
+    return self.op in BRANCHES or self.op in ZERO_BRANCHES or self.op in JUMPS or self.op in CALLS
+
+  def target(self) -> str:
+    '''Returns the label a branch or jump goes to, if any'''
+    if self.op in BRANCHES or self.op in ZERO_BRANCHES or self.op == 'j':
+      return self.operands[-1]
+    return None
+
+  def defs(self) -> list:
+    '''Registers written by the instruction'''
+    if not self.is_instruction():
+      return []
+    if self.op in CALLS:
+      return list(CALL_CLOBBERS)
+    if self.op in STORES or self.is_control():
+      return []
+    if self.operands and is_register(self.operands[0]):
+      return [self.operands[0]]
+    return []
+
+  def uses(self) -> list:
+    '''Registers read by the instruction'''
+    if not self.is_instruction():
+      return []
+    if self.op in CALLS:
+      return list(CALL_USES)
+    if self.op == 'ret':
+      return ['ra', 'a0']
+    if self.op in STORES:
+      return [self.operands[0], split_memory(self.operands[1])[1]]
+    if self.op in LOADS:
+      return [split_memory(self.operands[1])[1]]
+    if self.op in BRANCHES or self.op in ZERO_BRANCHES or self.op == 'jr':
+      sources = self.operands
+    else:
+      sources = self.operands[1:]
+    return [operand for operand in sources if is_register(operand)]
+
+  def touches(self, reg : str) -> bool:
+    return reg in self.defs() or reg in self.uses()
+
+def parse(lines : list) -> list:
+  return [AsmLine(line) for line in lines]
+
+def falls_through(line : AsmLine) -> bool:
+  '''Checks if execution can continue with the next line'''
+  return line.op not in JUMPS
+
+def split_blocks(lines : list) -> list:
+  '''Split parsed code lines (no comments) into basic blocks of [start, end) indices'''
+  blocks = []
+  start = 0
+  for i, line in enumerate(lines):
+    if line.kind == LineKind.label and i > start:
+      blocks.append((start, i))
+      start = i
+    if line.is_instruction() and line.is_control() and line.op not in CALLS:
+      blocks.append((start, i + 1))
+      start = i + 1
+  if start < len(lines):
+    blocks.append((start, len(lines)))
+  return blocks
+
+def needs_frame(lines : list) -> bool:
+  '''Checks if code makes calls or uses the frame pointer, so it cannot run without a frame'''
+  for line in parse(lines):
+    if line.op in CALLS or line.touches('fp') or line.touches('s0'):
+      return True
+  return False
@@ -0,0 +1,56 @@
+import ast
+from .dead_code import loaded_names
+from .loop_invariant import has_call, stored_names
+
+def loaded_outside_calls(node) -> set:
+  '''Names read outside of call arguments, which may be read once a call has returned'''
+  names = set()
+  stack = [node]
+  while stack:
+    child = stack.pop()
+    if isinstance(child, ast.Call):
+      continue
+    if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load):
+      names.add(child.id)
+    stack.extend(ast.iter_child_nodes(child))
+  return names
+
+class CallCrossing:
+  '''Finds the variables of a function whose values have to survive a call'''
+  def __init__(self, node : ast.FunctionDef):
+    self.names = set()
+    self.live(node.body, set())
+
+  def crossing(self, live : set, node):
+    '''Record the names in use around the calls of a statement or test'''
+    if node is not None and has_call(node):
+      self.names |= live | loaded_outside_calls(node)
+
+  def live(self, statements : list, live : set) -> set:
+    '''Walk backwards from the names live after the statements, returning the names live before'''
+    for statement in reversed(statements):
+      if isinstance(statement, ast.Return):
+        live = set()
+        self.crossing(live, statement.value)
+        live = loaded_names(statement.value)
+      elif isinstance(statement, ast.If):
+        live_body = self.live(statement.body, live)
+        live_orelse = self.live(statement.orelse, live)
+        live = live_body | live_orelse
+        self.crossing(live, statement.test)
+        live = live | loaded_names(statement.test)
+      elif isinstance(statement, ast.While):
+        # Names read by a later iteration are live at the end of the body too
+        entry = live | loaded_names(statement.test)
+        while True:
+          self.crossing(entry, statement.test)
+          live_body = self.live(statement.body, entry)
+          if live_body <= entry:
+            break
+          entry = entry | live_body
+        live = entry
+      else:
+        live = live - stored_names(statement)
+        self.crossing(live, statement)
+        live = live | loaded_names(statement)
+    return live
@@ -0,0 +1,151 @@
+import ast
+from .scope import Scope
+from .symbols import Variable, Function
+from .constant_folder import fold_binop, fold_cmpop, fold_unaryop
+from .arrays import array_elements, array_size, is_array
+from .purity import pure_functions
+
+class EvaluationError(RuntimeError):
+  '''A call that can't be evaluated at compile time, which is left to run as usual'''
+
+class Interpreter:
+  '''Runs pure functions on integer arguments, giving up after a number of steps'''
+  def __init__(self, scope : Scope, max_steps : int, max_depth : int):
+    self.scope = scope
+    self.max_steps = max_steps
+    self.max_depth = max_depth
+    self.steps = 0
+    self.depth = 0
+
+  def call(self, name : str, args : list) -> int:
+    func : Function = self.scope.lookup_func(name)
+    if len(args) != len(func.args):
+      raise EvaluationError(f'Incorrect number of arguments for "{name}".')
+    self.depth += 1
+    if self.depth > self.max_depth:
+      raise EvaluationError(f'Calls to "{name}" nest too deep.')
+    env = {arg.name : value for arg, value in zip(func.args, args)}
+    returned, value = self.execute(func.node.body, env)
+    self.depth -= 1
+    # Same as the automatic void-return
+    return value if returned else 0
+
+  def step(self):
+    self.steps += 1
+    if self.steps > self.max_steps:
+      raise EvaluationError("Step budget exhausted.")
+
+  #### Statements ####
+  def execute(self, statements : list, env : dict):
+    '''Run the statements, returning (True, value) once one of them returns, else (False, None)'''
+    for statement in statements:
+      self.step()
+      if isinstance(statement, ast.Return):
+        return True, self.expr(statement.value, env) if statement.value is not None else 0
+      elif isinstance(statement, ast.Assign) and isinstance(statement.targets[0], ast.Subscript):
+        value = self.expr(statement.value, env)
+        array, index = self.element(statement.targets[0], env)
+        array[index] = value
+      elif isinstance(statement, ast.Assign):
+        if len(statement.targets) != 1 or not isinstance(statement.targets[0], ast.Name):
+          raise EvaluationError("Only single assignment allowed.")
+        value = statement.value
+        env[statement.targets[0].id] = self.array(value, env) if is_array(value) else self.expr(value, env)
+      elif isinstance(statement, ast.Expr):
+        self.expr(statement.value, env)
+      elif isinstance(statement, ast.If):
+        body = statement.body if self.expr(statement.test, env) else statement.orelse
+        returned, value = self.execute(body, env)
+        if returned:
+          return returned, value
+      elif isinstance(statement, ast.While):
+        while self.expr(statement.test, env):
+          self.step()
+          returned, value = self.execute(statement.body, env)
+          if returned:
+            return returned, value
+      else:
+        raise EvaluationError(f"{statement.__class__.__name__} can't be evaluated.")
+    return False, None
+
+  #### Arrays ####
+  def array(self, node, env : dict) -> list:
+    if array_size(node) is None:
+      raise EvaluationError("Array sizes must be known at compile time.")
+    values = [self.expr(element, env) for element in array_elements(node)]
+    return values if isinstance(node, ast.List) else values * array_size(node)
+
+  def element(self, node : ast.Subscript, env : dict):
+    '''The array and the index of the element a subscript refers to'''
+    if not isinstance(node.value, ast.Name) or not isinstance(env.get(node.value.id), list):
+      raise EvaluationError("Only arrays can be indexed.")
+    array = env[node.value.id]
+    index = self.expr(node.slice, env)
+    # Negative indices count from the end, like in the compiled code
+    if not -len(array) <= index < len(array):
+      raise EvaluationError(f'Index {index} out of range for array "{node.value.id}".')
+    return array, index
+
+  #### Expressions ####
+  def expr(self, node, env : dict) -> int:
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+      return int(node.value)
+    elif isinstance(node, ast.Name):
+      if node.id not in env:
+        raise EvaluationError(f'Variable "{node.id}" has no value.')
+      if isinstance(env[node.id], list):
+        raise EvaluationError(f'Array "{node.id}" can only be indexed.')
+      return env[node.id]
+    elif isinstance(node, ast.Subscript):
+      array, index = self.element(node, env)
+      value = array[index]
+    elif isinstance(node, ast.BinOp):
+      value = fold_binop(node.op, self.expr(node.left, env), self.expr(node.right, env))
+    elif isinstance(node, ast.UnaryOp):
+      value = fold_unaryop(node.op, self.expr(node.operand, env))
+    elif isinstance(node, ast.BoolOp):
+      # Stop at the first operand that decides, like Python does
+      for operand in node.values:
+        value = self.expr(operand, env)
+        if bool(value) == isinstance(node.op, ast.Or):
+          break
+    elif isinstance(node, ast.Compare) and len(node.comparators) == 1:
+      value = fold_cmpop(node.ops[0], self.expr(node.left, env), self.expr(node.comparators[0], env))
+    elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+      value = self.call(node.func.id, [self.expr(arg, env) for arg in node.args])
+    else:
+      value = None
+    if value is None:
+      raise EvaluationError(f"{node.__class__.__name__} can't be evaluated. Node dump: {ast.dump(node)}")
+    return value
+
+class CallEvaluator(ast.NodeTransformer):
+  '''Replaces calls of pure functions on constant arguments by their result'''
+  def __init__(self, max_steps : int = 10000, max_depth : int = 50):
+    self.max_steps = max_steps
+    self.max_depth = max_depth
+    self.scope = Scope()
+    self.pure = set()
+
+  def visit_Module(self, node : ast.Module) -> ast.Module:
+    self.scope = Scope()
+    for statement in node.body:
+      if isinstance(statement, ast.FunctionDef):
+        self.scope.add_func(statement.name, [Variable(arg.arg) for arg in statement.args.args])
+        self.scope.lookup_func(statement.name).node = statement
+    self.pure = pure_functions(node)
+    self.generic_visit(node)
+    return ast.fix_missing_locations(node)
+
+  def visit_Call(self, node : ast.Call):
+    self.generic_visit(node)
+    if not isinstance(node.func, ast.Name) or node.func.id not in self.pure:
+      return node
+
+    # The arguments may only be constant expressions, every call gets its own budget
+    interpreter = Interpreter(self.scope, self.max_steps, self.max_depth)
+    try:
+      value = interpreter.call(node.func.id, [interpreter.expr(arg, {}) for arg in node.args])
+    except EvaluationError:
+      return node
+    return ast.copy_location(ast.Constant(value=value), node)
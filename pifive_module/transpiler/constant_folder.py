@@ -0,0 +1,202 @@
+import ast
+from .scope import Scope
+from .symbols import Variable
+from .purity import declared_globals
+
+def wrap(value : int) -> int:
+  '''Wrap to a signed 64-bit integer the way RV64 registers do'''
+  return ((value + (1 << 63)) % (1 << 64)) - (1 << 63)
+
+def trunc_div(left : int, right : int) -> int:
+  '''Quotient rounded toward zero, as computed by the div instruction'''
+  quotient = abs(left) // abs(right)
+  return quotient if (left < 0) == (right < 0) else -quotient
+
+def fold_binop(op, left : int, right : int):
+  '''Result of a binary operator on constants, or None if it can't be folded'''
+  if isinstance(op, ast.Add):
+    return wrap(left + right)
+  elif isinstance(op, ast.Sub):
+    return wrap(left - right)
+  elif isinstance(op, ast.Mult):
+    return wrap(left * right)
+  elif isinstance(op, ast.Div):
+    return wrap(trunc_div(left, right)) if right != 0 else None
+  elif isinstance(op, ast.FloorDiv):
+    return wrap(left // right) if right != 0 else None
+  elif isinstance(op, ast.Mod):
+    return wrap(left % right) if right != 0 else None
+  elif isinstance(op, ast.Pow):
+    return wrap(pow(left, right, 1 << 64)) if right >= 0 else None
+  elif isinstance(op, ast.LShift):
+    return wrap(left << right) if 0 <= right < 64 else None
+  elif isinstance(op, ast.RShift):
+    return left >> right if 0 <= right < 64 else None
+  elif isinstance(op, ast.BitAnd):
+    return left & right
+  elif isinstance(op, ast.BitOr):
+    return left | right
+  elif isinstance(op, ast.BitXor):
+    return left ^ right
+  return None
+
+def fold_cmpop(op, left : int, right : int):
+  '''Result of a comparison on constants as 1 or 0'''
+  if isinstance(op, ast.Eq):
+    return int(left == right)
+  elif isinstance(op, ast.NotEq):
+    return int(left != right)
+  elif isinstance(op, ast.Lt):
+    return int(left < right)
+  elif isinstance(op, ast.LtE):
+    return int(left <= right)
+  elif isinstance(op, ast.Gt):
+    return int(left > right)
+  elif isinstance(op, ast.GtE):
+    return int(left >= right)
+  return None
+
+def fold_unaryop(op, operand : int):
+  if isinstance(op, ast.USub):
+    return wrap(-operand)
+  elif isinstance(op, ast.UAdd):
+    return operand
+  elif isinstance(op, ast.Invert):
+    return ~operand
+  elif isinstance(op, ast.Not):
+    return int(not operand)
+  return None
+
+def int_value(node):
+  '''Integer value of a constant node, or None'''
+  if isinstance(node, ast.Constant) and isinstance(node.value, int):
+    return int(node.value)
+  return None
+
+def assignment_counts(body : list) -> dict:
+  '''Number of assignments to each name in a list of statements, not entering functions'''
+  counts = {}
+  stack = list(body)
+  while stack:
+    node = stack.pop()
+    if isinstance(node, ast.FunctionDef):
+      continue
+    if isinstance(node, ast.Assign):
+      for target in node.targets:
+        if isinstance(target, ast.Name):
+          counts[target.id] = counts.get(target.id, 0) + 1
+    stack.extend(ast.iter_child_nodes(node))
+  return counts
+
+class ConstantFolder(ast.NodeTransformer):
+  '''Folds constant expressions and propagates variables assigned a constant exactly once'''
+  def __init__(self):
+    self.globals = Scope()
+    self.scope = self.globals
+    self.counts = {}
+
+  def constant(self, value : int, node) -> ast.Constant:
+    return ast.copy_location(ast.Constant(value=value), node)
+
+  def lookup(self, name : str) -> Variable:
+    '''Names assigned in a function are local to all of it, everything else is global'''
+    for scope in (self.scope, self.globals):
+      if scope.in_scope(name):
+        return scope.lookup_var(name)
+    return None
+
+  def visit_Module(self, node : ast.Module):
+    self.globals = Scope()
+    self.scope = self.globals
+    self.counts = assignment_counts(node.body)
+    # Functions may assign the names they declare global, so those have more than one value
+    for name in declared_globals(node):
+      self.counts[name] = self.counts.get(name, 0) + 1
+    self.scope.add_vars([Variable(name) for name in self.counts])
+    self.generic_visit(node)
+    return node
+
+  def visit_FunctionDef(self, node : ast.FunctionDef):
+    module_counts = self.counts
+    self.scope = Scope(name=node.name)
+    declared = declared_globals(node)
+    self.counts = {name : count for name, count in assignment_counts(node.body).items() if name not in declared}
+    # Parameters already have a value, the call's, before any assignment in the body
+    for arg in node.args.args:
+      self.counts[arg.arg] = self.counts.get(arg.arg, 0) + 1
+    self.scope.add_vars([Variable(arg.arg) for arg in node.args.args])
+    self.scope.add_vars([Variable(name) for name in self.counts])
+    self.generic_visit(node)
+    self.scope = self.globals
+    self.counts = module_counts
+    return node
+
+  def visit_Assign(self, node : ast.Assign):
+    node.value = self.visit(node.value)
+
+    # Remember the value of names that are only ever assigned this constant
+    value = int_value(node.value)
+    if len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+      target = node.targets[0]
+      if value is not None and self.counts.get(target.id) == 1:
+        self.lookup(target.id).value = value
+    return node
+
+  def visit_Name(self, node : ast.Name):
+    if isinstance(node.ctx, ast.Load):
+      var : Variable = self.lookup(node.id)
+      if var is not None and var.value is not None:
+        return self.constant(var.value, node)
+    return node
+
+  def visit_Call(self, node : ast.Call):
+    # The function name is not a variable
+    node.args = [self.visit(arg) for arg in node.args]
+    return node
+
+  def visit_BinOp(self, node : ast.BinOp):
+    self.generic_visit(node)
+    left, right = int_value(node.left), int_value(node.right)
+    if left is not None and right is not None:
+      value = fold_binop(node.op, left, right)
+      if value is not None:
+        return self.constant(value, node)
+    return node
+
+  def visit_UnaryOp(self, node : ast.UnaryOp):
+    self.generic_visit(node)
+    operand = int_value(node.operand)
+    if operand is not None:
+      value = fold_unaryop(node.op, operand)
+      if value is not None:
+        return self.constant(value, node)
+    return node
+
+  def visit_BoolOp(self, node : ast.BoolOp):
+    self.generic_visit(node)
+    # The first operand that decides is the value, "and" is decided by a false one and "or" by a true one
+    decider = isinstance(node.op, ast.Or)
+    values = []
+    for value in node.values:
+      constant = int_value(value)
+      if constant is not None and bool(constant) != decider and value is not node.values[-1]:
+        # Never the value, and there is nothing to evaluate
+        continue
+      values.append(value)
+      if constant is not None and bool(constant) == decider:
+        # The operands after it are never evaluated
+        break
+    if len(values) == 1:
+      return values[0]
+    node.values = values
+    return node
+
+  def visit_Compare(self, node : ast.Compare):
+    self.generic_visit(node)
+    values = [int_value(node.left)] + [int_value(comparator) for comparator in node.comparators]
+    if any(value is None for value in values):
+      return node
+    for op, left, right in zip(node.ops, values, values[1:]):
+      if not fold_cmpop(op, left, right):
+        return self.constant(0, node)
+    return self.constant(1, node)
@@ -0,0 +1,59 @@
+from .assembly import LOADS, STORES, BRANCHES, ZERO_BRANCHES, JUMPS, CALLS
+
+# Approximate result latencies in cycles for each instruction class
+CORES = {
+  # SiFive U74 (HiFive Unmatched): pipelined multiplier, iterative divider
+  'u74' : {
+    'alu' : 1,
+    'mul' : 3,
+    'div' : 34,
+    'load' : 3,
+    'store' : 1,
+    'branch' : 1,
+    'call' : 1
+  },
+  # Rocket with the default iterative multiplier
+  'rocket' : {
+    'alu' : 1,
+    'mul' : 8,
+    'div' : 64,
+    'load' : 2,
+    'store' : 1,
+    'branch' : 1,
+    'call' : 1
+  }
+}
+
+MULS = ['mul', 'mulh', 'mulhu', 'mulhsu', 'mulw']
+DIVS = ['div', 'divu', 'rem', 'remu', 'divw', 'remw']
+
+def op_class(op : str) -> str:
+  '''Instruction class of a mnemonic, as used by the cost tables'''
+  if op in MULS:
+    return 'mul'
+  elif op in DIVS:
+    return 'div'
+  elif op in LOADS:
+    return 'load'
+  elif op in STORES:
+    return 'store'
+  elif op in BRANCHES or op in ZERO_BRANCHES or op in JUMPS:
+    return 'branch'
+  elif op in CALLS:
+    return 'call'
+  return 'alu'
+
+class CostModel:
+  '''Instruction costs of one target core'''
+  def __init__(self, core : str = 'u74', overrides : dict = None):
+    if core not in CORES:
+      raise RuntimeError(f'Unknown core "{core}", expected one of {list(CORES)}.')
+    self.core = core
+    self.latency = dict(CORES[core])
+    self.latency.update(overrides or {})
+
+  def cost(self, op : str) -> int:
+    return self.latency[op_class(op)]
+
+  def sequence_cost(self, ops : list) -> int:
+    return sum(self.cost(op) for op in ops)
@@ -0,0 +1,128 @@
+import ast
+from .arrays import scoped_sizes
+from .constant_folder import assignment_counts, int_value
+from .loop_invariant import stored_names
+from .purity import declared_globals, pure_functions
+
+def loaded_names(node) -> set:
+  if node is None:
+    return set()
+  return set(child.id for child in ast.walk(node) if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load))
+
+def always_returns(statements : list) -> bool:
+  '''Checks if every path through the statements ends in a return'''
+  for statement in statements:
+    if isinstance(statement, ast.Return):
+      return True
+    if isinstance(statement, ast.If) and always_returns(statement.body) and always_returns(statement.orelse):
+      return True
+  return False
+
+class DeadCodeEliminator:
+  '''Removes unreachable statements, stores that are never read and unused expressions without side effects'''
+  def __init__(self):
+    self.pure = set()
+    self.globals = set()
+    # Sizes of the arrays the function being walked sees
+    self.sizes = {}
+
+  def visit(self, node : ast.Module) -> ast.Module:
+    self.pure = pure_functions(node)
+    # Module variables may be read by any function, so stores to them always stay
+    self.globals = set(assignment_counts(node.body)) | declared_globals(node)
+    node.body = self.reachable(node.body)
+    sizes = scoped_sizes(node)
+    for statement in node.body:
+      if isinstance(statement, ast.FunctionDef):
+        self.sizes = sizes[statement.name]
+        statement.body, _ = self.live(statement.body, set(), True)
+    return ast.fix_missing_locations(node)
+
+  def removable(self, node) -> bool:
+    '''Checks if evaluating the expression has no effect besides its value'''
+    return all(self.harmless(child) for child in ast.walk(node))
+
+  def harmless(self, node) -> bool:
+    '''Checks if a call is to a pure function and a subscript can't fail its bounds check'''
+    if isinstance(node, ast.Call):
+      return isinstance(node.func, ast.Name) and node.func.id in self.pure
+    if isinstance(node, ast.Subscript):
+      size = self.sizes.get(node.value.id) if isinstance(node.value, ast.Name) else None
+      index = int_value(node.slice)
+      return size is not None and index is not None and -size <= index < size
+    return True
+
+  #### Unreachable code ####
+  def reachable(self, statements : list) -> list:
+    '''Statements without branches that can't be taken and without anything after a return'''
+    kept = []
+    for statement in statements:
+      if isinstance(statement, ast.FunctionDef):
+        statement.body = self.reachable(statement.body)
+      elif isinstance(statement, (ast.If, ast.While)):
+        test = int_value(statement.test)
+        if test is not None and isinstance(statement, ast.If):
+          # Only one branch can run, so it takes the place of the if
+          kept += self.reachable(statement.body if test else statement.orelse)
+          if always_returns(kept):
+            break
+          continue
+        if test == 0:
+          continue
+        statement.body = self.reachable(statement.body)
+        statement.orelse = self.reachable(statement.orelse)
+      kept.append(statement)
+      if always_returns([statement]):
+        break
+    return kept
+
+  #### Dead stores ####
+  def live(self, statements : list, live : set, remove : bool):
+    '''Walk backwards from the names live after the statements, returning the kept ones and the names live before'''
+    # Without remove the nested bodies are only analysed, not changed
+    kept = []
+    # Names a later if or while assigns, which only outlive it if they already exist in this block
+    nested = set()
+    for statement in reversed(statements):
+      if isinstance(statement, ast.Return):
+        live = loaded_names(statement.value)
+      elif isinstance(statement, ast.Assign) and isinstance(statement.targets[0], ast.Subscript):
+        # Storing one element leaves the rest of the array as it was
+        name = statement.targets[0].value.id
+        if name not in live and name not in self.globals and self.removable(statement):
+          continue
+        live = live | loaded_names(statement)
+      elif isinstance(statement, ast.Assign):
+        name = statement.targets[0].id
+        if name not in live and name not in self.globals and name not in nested and self.removable(statement.value):
+          continue
+        live = (live - {name}) | loaded_names(statement.value)
+      elif isinstance(statement, ast.Expr):
+        if self.removable(statement.value):
+          continue
+        live = live | loaded_names(statement.value)
+      elif isinstance(statement, ast.If):
+        body, live_body = self.live(statement.body, live, remove)
+        orelse, live_orelse = self.live(statement.orelse, live, remove)
+        if remove:
+          statement.body, statement.orelse = body, orelse
+        if not body and not orelse and self.removable(statement.test):
+          continue
+        live = live_body | live_orelse | loaded_names(statement.test)
+        nested |= stored_names(statement)
+      elif isinstance(statement, ast.While):
+        # Names read by a later iteration are live at the end of the body too
+        entry = live | loaded_names(statement.test)
+        while True:
+          _, live_body = self.live(statement.body, entry, False)
+          if live_body <= entry:
+            break
+          entry = entry | live_body
+        if remove:
+          statement.body, _ = self.live(statement.body, entry, True)
+        live = entry
+        nested |= stored_names(statement)
+      else:
+        live = live | loaded_names(statement)
+      kept.append(statement)
+    return list(reversed(kept)), live
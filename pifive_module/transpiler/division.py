@@ -0,0 +1,11 @@
+def is_power_of_two(value : int) -> bool:
+  return value > 0 and value & (value - 1) == 0
+
+def magic_unsigned(divisor : int):
+  '''Multiplier and shift such that (n * multiplier >> 64) >> shift == n // divisor for 0 <= n < 2**63'''
+  if divisor < 2 or is_power_of_two(divisor):
+    raise RuntimeError(f"No magic number needed for divisor {divisor}.")
+  # With 2**shift < divisor the multiplier fits in 64 bits and its rounding error stays below 2**(shift + 1)
+  shift = divisor.bit_length() - 1
+  multiplier = -(-(1 << (64 + shift)) // divisor)
+  return multiplier, shift
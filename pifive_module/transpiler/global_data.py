@@ -0,0 +1,84 @@
+import ast
+from .arrays import array_size, array_sizes, array_values
+from .constant_folder import int_value
+from .dead_code import loaded_names
+from .inliner import called_names
+from .loop_invariant import stored_names
+from .purity import declared_globals, local_names
+
+def data_label(name : str) -> str:
+  return f"{name}_global"
+
+class ModuleGlobals:
+  '''Variables of the module, which live in the data sections rather than in registers'''
+  def __init__(self, node : ast.Module):
+    # Initial value of each global, a list for an array, None if only code gives it one
+    self.values = {}
+    # Module-level assignments of a constant which are the initial value, so they emit no code
+    self.initializers = []
+    functions = [statement for statement in node.body if isinstance(statement, ast.FunctionDef)]
+    for statement in node.body:
+      if isinstance(statement, ast.FunctionDef):
+        continue
+      if self.is_initializer(statement):
+        self.values[statement.targets[0].id] = self.initial_value(statement.value)
+        self.initializers.append(statement)
+        continue
+      for child in ast.walk(statement):
+        if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+          self.values.setdefault(child.id, None)
+    for function in functions:
+      for name in sorted(declared_globals(function)):
+        self.values.setdefault(name, None)
+
+    # Number of elements of the globals which are arrays
+    self.sizes = array_sizes(node.body)
+    for function in functions:
+      for name, size in array_sizes(function.body).items():
+        if name in declared_globals(function):
+          self.sizes.setdefault(name, size)
+    for name, value in self.values.items():
+      if value is not None and isinstance(value, list) != (name in self.sizes):
+        raise RuntimeError(f'Global "{name}" is assigned both an array and a number.')
+    # Globals some function assigns, the only ones a call can change
+    self.assigned = set()
+    for function in functions:
+      self.assigned |= declared_globals(function) & stored_names(function)
+    self.writers = self.find_writers(functions)
+
+  def is_initializer(self, statement) -> bool:
+    '''Checks if a statement is the first assignment of a name and assigns it a constant'''
+    return (isinstance(statement, ast.Assign) and len(statement.targets) == 1
+            and isinstance(statement.targets[0], ast.Name) and statement.targets[0].id not in self.values
+            and self.initial_value(statement.value) is not None)
+
+  def initial_value(self, node):
+    if array_size(node) is not None:
+      return array_values(node)
+    return int_value(node)
+
+  def find_writers(self, functions : list) -> set:
+    '''Names of the functions which may assign a global, themselves or through the functions they call'''
+    writers = set(function.name for function in functions if declared_globals(function) & stored_names(function))
+    changed = True
+    while changed:
+      changed = False
+      for function in functions:
+        if function.name not in writers and any(name in writers for name in called_names(function)):
+          writers.add(function.name)
+          changed = True
+    return writers
+
+  def used(self, node : ast.FunctionDef) -> list:
+    '''Globals the function reads or assigns, in the order they first appear'''
+    names = local_names(node)
+    used = []
+    for child in ast.walk(node):
+      if isinstance(child, ast.Name) and child.id in self.values and child.id not in names and child.id not in used:
+        used.append(child.id)
+    return used
+
+  def read(self, node : ast.FunctionDef) -> list:
+    '''Globals the function reads, leaving out arrays, whose elements are always read from memory'''
+    loaded = loaded_names(node)
+    return [name for name in self.used(node) if name in loaded and name not in self.sizes]
@@ -0,0 +1,119 @@
+import ast
+import copy
+from .scope import Scope
+from .symbols import Variable, Function
+from .purity import declared_globals
+
+def assigned_names(node : ast.FunctionDef) -> list:
+  '''Parameters and every name the function assigns'''
+  names = [arg.arg for arg in node.args.args]
+  for child in ast.walk(node):
+    if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store) and child.id not in names:
+      names.append(child.id)
+  return names
+
+def called_names(node) -> list:
+  return [child.func.id for child in ast.walk(node)
+          if isinstance(child, ast.Call) and isinstance(child.func, ast.Name)]
+
+def size(node) -> int:
+  return sum(1 for _ in ast.walk(node))
+
+class Renamer(ast.NodeTransformer):
+  '''Renames variables, leaving the names of called functions alone'''
+  def __init__(self, mapping : dict):
+    self.mapping = mapping
+
+  def visit_Name(self, node : ast.Name):
+    if node.id in self.mapping:
+      node.id = self.mapping[node.id]
+    return node
+
+  def visit_Call(self, node : ast.Call):
+    node.args = [self.visit(arg) for arg in node.args]
+    return node
+
+class Inliner:
+  '''Substitutes the bodies of small non-recursive functions at their call sites'''
+  def __init__(self, max_size : int = 40):
+    self.max_size = max_size
+    self.scope = Scope()
+    self.count = 0
+
+  def visit(self, node : ast.Module) -> ast.Module:
+    # Every function is known up front, so callers may come before callees
+    self.scope = Scope()
+    for statement in node.body:
+      if isinstance(statement, ast.FunctionDef):
+        self.scope.add_func(statement.name, [Variable(arg.arg) for arg in statement.args.args])
+        self.scope.lookup_func(statement.name).node = statement
+    node.body = self.inline_statements(node.body)
+    return ast.fix_missing_locations(node)
+
+  def is_candidate(self, func : Function) -> bool:
+    node : ast.FunctionDef = func.node
+    if node is None or node.name == "main" or size(node) > self.max_size:
+      return False
+
+    # The result has to come from a single return at the very end
+    returns = [child for child in ast.walk(node) if isinstance(child, ast.Return)]
+    if len(returns) > 1 or (returns and node.body[-1] is not returns[0]):
+      return False
+
+    # Recursion would never stop, and names from outside could be shadowed by the caller
+    if node.name in called_names(node) or declared_globals(node):
+      return False
+    names = assigned_names(node)
+    callees = [child.func for child in ast.walk(node) if isinstance(child, ast.Call)]
+    return all(child.id in names for child in ast.walk(node)
+               if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load) and child not in callees)
+
+  def inlinable_call(self, statement) -> ast.Call:
+    '''Call making up the whole value of a statement, if it can be inlined'''
+    if isinstance(statement, (ast.Assign, ast.Expr, ast.Return)):
+      call = statement.value
+      if isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and self.scope.in_scope_func(call.func.id):
+        func : Function = self.scope.lookup_func(call.func.id)
+        if len(call.args) == len(func.args) and self.is_candidate(func):
+          return call
+    return None
+
+  def inline_statements(self, body : list) -> list:
+    inlined = []
+    for statement in body:
+      if isinstance(statement, (ast.FunctionDef, ast.If, ast.While)):
+        statement.body = self.inline_statements(statement.body)
+        statement.orelse = self.inline_statements(getattr(statement, 'orelse', []))
+      call = self.inlinable_call(statement)
+      if call is None:
+        inlined.append(statement)
+      else:
+        inlined += [ast.copy_location(new, statement) for new in self.expand(call, statement)]
+    return inlined
+
+  def expand(self, call : ast.Call, statement) -> list:
+    '''Statements doing the work of the call, followed by the statement using its result'''
+    node : ast.FunctionDef = self.scope.lookup_func(call.func.id).node
+    self.count += 1
+    prefix = f"_{node.name}{self.count}_"
+    mapping = {name : prefix + name for name in assigned_names(node)}
+
+    # Parameters become locals of the caller, assigned in argument order
+    expanded = [ast.Assign(targets=[ast.Name(id=mapping[arg.arg], ctx=ast.Store())], value=value)
+                for arg, value in zip(node.args.args, call.args)]
+    body = [Renamer(mapping).visit(copy.deepcopy(child)) for child in node.body]
+    if body and isinstance(body[-1], ast.Return):
+      value = body.pop().value
+    else:
+      # Same as the automatic void-return
+      value = ast.Constant(value=0)
+    expanded += body
+
+    if isinstance(statement, ast.Assign):
+      expanded.append(ast.Assign(targets=statement.targets, value=value))
+    elif isinstance(statement, ast.Return):
+      expanded.append(ast.Return(value=value))
+    elif called_names(value):
+      # The result is unused, but calls in it still have to happen
+      expanded.append(ast.Expr(value=value))
+    return expanded
@@ -10,6 +10,12 @@ class BinOp(Enum):
   XOR = 'xor'
   MUL = 'mul'
   DIV = 'div'
+  SLL = 'sll'
+  SRA = 'sra'
+  REM = 'rem'
+  MULHU = 'mulhu'
+  SLT = 'slt'
+  SLTU = 'sltu'
 
   def to_english(self):
     if self.name == BinOp.ADD.name:
@@ -26,9 +32,57 @@ class BinOp(Enum):
       return "Multiply"
     elif self.name == BinOp.DIV.name:
       return "Divide"
+    elif self.name == BinOp.SLL.name:
+      return "Shift Left"
+    elif self.name == BinOp.SRA.name:
+      return "Shift Right"
+    elif self.name == BinOp.REM.name:
+      return "Remainder"
+    elif self.name == BinOp.MULHU.name:
+      return "Multiply High Unsigned"
+    elif self.name == BinOp.SLT.name:
+      return "Set Less Than"
+    elif self.name == BinOp.SLTU.name:
+      return "Set Less Than Unsigned"
     else:
       raise RuntimeError(f'binop {self.name} has no english equivalent.')
 
+class ImmOp(Enum):
+  ADDI = 'addi'
+  ANDI = 'andi'
+  ORI  = 'ori'
+  XORI = 'xori'
+  SLLI = 'slli'
+  SRLI = 'srli'
+  SRAI = 'srai'
+  SLTI = 'slti'
+
+  def to_english(self):
+    if self.name == ImmOp.ADDI.name:
+      return "Add"
+    elif self.name == ImmOp.ANDI.name:
+      return "AND"
+    elif self.name == ImmOp.ORI.name:
+      return "OR"
+    elif self.name == ImmOp.XORI.name:
+      return "XOR"
+    elif self.name == ImmOp.SLLI.name:
+      return "Shift Left"
+    elif self.name == ImmOp.SRLI.name:
+      return "Shift Right Logical"
+    elif self.name == ImmOp.SRAI.name:
+      return "Shift Right"
+    elif self.name == ImmOp.SLTI.name:
+      return "Set Less Than"
+    else:
+      raise RuntimeError(f'immop {self.name} has no english equivalent.')
+
+  def fits(self, value : int) -> bool:
+    '''Checks if the value can be encoded as this instruction's immediate'''
+    if self in (ImmOp.SLLI, ImmOp.SRLI, ImmOp.SRAI):
+      return 0 <= value < 64
+    return -2048 <= value <= 2047
+
 class BranchOp(Enum):
   BEQ = 'beq'
   BNE = 'bne'
@@ -36,6 +90,8 @@ class BranchOp(Enum):
   BLE = 'ble'
   BGT = 'bgt'
   BGE = 'bge'
+  BLTU = 'bltu'
+  BGEU = 'bgeu'
 
   def to_english(self):
     if self.name == BranchOp.BEQ.name:
@@ -50,9 +106,28 @@ class BranchOp(Enum):
       return "Greater Than"
     elif self.name == BranchOp.BGE.name:
       return "Greater Than or Equal"
+    elif self.name == BranchOp.BLTU.name:
+      return "Less Than Unsigned"
+    elif self.name == BranchOp.BGEU.name:
+      return "Greater Than or Equal Unsigned"
     else:
       raise RuntimeError(f'branchop {self.name} has no english equivalent.')
 
+  def invert(self):
+    '''Branch taken exactly when this one is not'''
+    return INVERTED_BRANCHOPS[self]
+
+INVERTED_BRANCHOPS = {
+  BranchOp.BEQ : BranchOp.BNE,
+  BranchOp.BNE : BranchOp.BEQ,
+  BranchOp.BLT : BranchOp.BGE,
+  BranchOp.BGE : BranchOp.BLT,
+  BranchOp.BLE : BranchOp.BGT,
+  BranchOp.BGT : BranchOp.BLE,
+  BranchOp.BLTU : BranchOp.BGEU,
+  BranchOp.BGEU : BranchOp.BLTU
+}
+
 class InstructionMaker:
   def __init__(self, comments_on=False):
     self.comments_on = comments_on
@@ -95,6 +170,10 @@ class InstructionMaker:
       self.instr_buffer.append(f"\t.globl main")
     self.instr_buffer.append(f"{label}:")
 
+  def align(self, power : int):
+    '''Align the next line to 2**power bytes'''
+    self.instr_buffer.append(f"\t.p2align {power}")
+
   def print_int_label(self):
     self.label("print_int")
     self.comment("String to print our integer")
@@ -103,6 +182,38 @@ class InstructionMaker:
   def load_label(self, reg : Reg, label : str):
     self.instr_buffer.append(f"\tlla {reg.name}, {label}")
 
+  def load_global(self, reg : Reg, label : str):
+    '''Load the doubleword at label, using reg for the address too'''
+    self.load_label(reg, label)
+    self.instr_buffer.append(f"\tld {reg.name}, 0({reg.name})")
+
+  def store_global(self, reg : Reg, label : str, address : Reg):
+    self.load_label(address, label)
+    self.instr_buffer.append(f"\tsd {reg.name}, 0({address.name})")
+
+  def section(self, name : str):
+    self.instr_buffer.append(f"\t{name}")
+
+  def dwords(self, label : str, values : list):
+    self.label(label)
+    self.instr_buffer.append(f"\t.dword {', '.join(str(value) for value in values)}")
+
+  def zero_dwords(self, label : str, count : int = 1):
+    self.label(label)
+    self.instr_buffer.append(f"\t.zero {8 * count}")
+
+  def load_offset(self, reg : Reg, base : Reg, offset : int):
+    self.instr_buffer.append(f"\tld {reg.name}, {offset}({base.name})")
+
+  def store_offset(self, reg : Reg, base : Reg, offset : int):
+    self.instr_buffer.append(f"\tsd {reg.name}, {offset}({base.name})")
+
+  def index_error_routine(self):
+    '''Where failed bounds checks go, ending the program like an uncaught IndexError'''
+    self.label("index_error")
+    self.comment("Array index out of range")
+    self.instr_buffer.append("\tcall abort")
+
   def pop(self, reg : Reg):
     self.instr_buffer.append(f"\tld {reg.name}, 0(sp)")
     self.instr_buffer.append(f"\taddi sp, sp, 8")
@@ -110,12 +221,50 @@ class InstructionMaker:
   def binop(self, binop : BinOp, dst : Reg, src_1 : Reg, src_2 : Reg):
     self.instr_buffer.append(f"\t{binop.value} {dst.name}, {src_1.name}, {src_2.name}")
 
+  def immop(self, immop : ImmOp, dst : Reg, src : Reg, imm : int):
+    self.instr_buffer.append(f"\t{immop.value} {dst.name}, {src.name}, {imm}")
+
+  def set_compare(self, branchop : BranchOp, dst : Reg, left : Reg, right : Reg):
+    '''Set dst to 1 if the branch would be taken and to 0 otherwise, without branching'''
+    if branchop in (BranchOp.BEQ, BranchOp.BNE):
+      # Equal values xor to zero
+      if right == Reg.zero or left == Reg.zero:
+        src = left if right == Reg.zero else right
+      else:
+        self.binop(BinOp.XOR, dst, left, right)
+        src = dst
+      if branchop == BranchOp.BEQ:
+        self.set_zero(dst, src)
+      else:
+        self.set_not_zero(dst, src)
+      return
+    # a > b is b < a, and a <= b is the negation of b < a
+    if branchop in (BranchOp.BGT, BranchOp.BLE):
+      left, right = right, left
+    self.binop(BinOp.SLT, dst, left, right)
+    if branchop in (BranchOp.BLE, BranchOp.BGE):
+      self.immop(ImmOp.XORI, dst, dst, 1)
+
+  def set_zero(self, dst : Reg, src : Reg):
+    '''dst = 1 if src is zero, else 0 (sltiu dst, src, 1)'''
+    self.instr_buffer.append(f"\tseqz {dst.name}, {src.name}")
+
+  def set_not_zero(self, dst : Reg, src : Reg):
+    '''dst = 1 if src is not zero, else 0 (sltu dst, zero, src)'''
+    self.instr_buffer.append(f"\tsnez {dst.name}, {src.name}")
+
   def branchop(self, branchop : BranchOp, left : Reg, right : Reg, label : str):
     self.instr_buffer.append(f"\t{branchop.value} {left.name}, {right.name}, {label}")
 
   def branch_zero(self, reg : Reg, label : str):
     self.instr_buffer.append(f"\tbeqz {reg.name}, {label}")
 
+  def branch_not_zero(self, reg : Reg, label : str):
+    self.instr_buffer.append(f"\tbnez {reg.name}, {label}")
+
+  def branch_not_negative(self, reg : Reg, label : str):
+    self.instr_buffer.append(f"\tbgez {reg.name}, {label}")
+
   def jump_label(self, label : str):
     self.instr_buffer.append(f"\tj {label}")
 
@@ -123,12 +272,22 @@ class InstructionMaker:
     self.instr_buffer.append(f"\tcall {label}")
 
   def prologue(self, extra_stack_space : int = 0):
+    if 16 + extra_stack_space * 8 > 2047:
+      # Too far for the immediates, so set up ra and fp first and move sp the rest of the way
+      self.prologue()
+      self.load_imm(Reg.t0, extra_stack_space * 8)
+      self.instr_buffer.append("\tsub sp, sp, t0")
+      return
     self.instr_buffer.append(f"\taddi sp, sp, -{16 + extra_stack_space * 8}")
     self.instr_buffer.append(f"\tsd ra, {8 + extra_stack_space * 8}(sp)")
     self.instr_buffer.append(f"\tsd fp, {0 + extra_stack_space * 8}(sp)")
     self.instr_buffer.append(f"\taddi fp, sp, {16 + extra_stack_space * 8}")
 
   def epilogue(self, extra_stack_space : int = 0):
+    if 16 + extra_stack_space * 8 > 2047:
+      self.instr_buffer.append("\taddi sp, fp, -16")
+      self.epilogue()
+      return
     self.instr_buffer.append(f"\tld ra, {8 + extra_stack_space * 8}(sp)")
     self.instr_buffer.append(f"\tld fp, {0 + extra_stack_space * 8}(sp)")
     self.instr_buffer.append(f"\taddi sp, sp, {16 + extra_stack_space * 8}")
@@ -160,6 +319,9 @@ class InstructionMaker:
   def comment_binop(self, binop : BinOp, reg : Reg):
     self.comment(f'{binop.to_english()} result and store into "{reg.name}"')
 
+  def comment_immop(self, immop : ImmOp, reg : Reg, imm : int):
+    self.comment(f'{immop.to_english()} immediate {imm} and store into "{reg.name}"')
+
   def comment_branchop(self, branchop : BranchOp, left : Reg, right : Reg):
     self.comment(f'Test if "{left.name}" is {branchop.to_english()} "{right.name}"')
 
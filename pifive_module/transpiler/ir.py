@@ -0,0 +1,295 @@
+class Temp:
+  '''A variable of the program or a temporary named like "%3"'''
+  def __init__(self, name : str):
+    self.name = name
+
+  def __eq__(self, other):
+    return isinstance(other, Temp) and other.name == self.name
+
+  def __hash__(self):
+    return hash(('temp', self.name))
+
+  def __str__(self):
+    return self.name
+
+  def __repr__(self):
+    return f"Temp({self.name!r})"
+
+class Const:
+  '''An integer constant operand'''
+  def __init__(self, value : int):
+    self.value = value
+
+  def __eq__(self, other):
+    return isinstance(other, Const) and other.value == self.value
+
+  def __hash__(self):
+    return hash(('const', self.value))
+
+  def __str__(self):
+    return str(self.value)
+
+  def __repr__(self):
+    return f"Const({self.value})"
+
+#### Instructions ####
+class Instr:
+  '''Three-address instruction: an optional destination and a list of operands'''
+  def __init__(self, dest : Temp = None, args : list = None):
+    self.dest = dest
+    self.args = list(args or [])
+
+  def uses(self) -> list:
+    '''Temporaries read by the instruction'''
+    return [arg for arg in self.args if isinstance(arg, Temp)]
+
+  def defs(self) -> list:
+    return [self.dest] if self.dest is not None else []
+
+  def replace_uses(self, mapping : dict):
+    self.args = [mapping.get(arg, arg) if isinstance(arg, Temp) else arg for arg in self.args]
+
+  def targets(self) -> list:
+    '''Labels of the blocks control may go to next, for terminators'''
+    return []
+
+  def has_side_effects(self) -> bool:
+    return False
+
+class Copy(Instr):
+  def __init__(self, dest : Temp, src):
+    super().__init__(dest, [src])
+
+  @property
+  def src(self):
+    return self.args[0]
+
+  def __str__(self):
+    return f"{self.dest} = {self.src}"
+
+class BinaryOp(Instr):
+  '''op is the name of the ast operator, like "Add" or "FloorDiv"'''
+  def __init__(self, op : str, dest : Temp, left, right):
+    super().__init__(dest, [left, right])
+    self.op = op
+
+  @property
+  def left(self):
+    return self.args[0]
+
+  @property
+  def right(self):
+    return self.args[1]
+
+  def __str__(self):
+    return f"{self.dest} = {self.op.lower()} {self.left}, {self.right}"
+
+class Compare(Instr):
+  '''op is the name of the ast comparison, like "Lt"; the result is 1 or 0'''
+  def __init__(self, op : str, dest : Temp, left, right):
+    super().__init__(dest, [left, right])
+    self.op = op
+
+  @property
+  def left(self):
+    return self.args[0]
+
+  @property
+  def right(self):
+    return self.args[1]
+
+  def __str__(self):
+    return f"{self.dest} = {self.op.lower()} {self.left}, {self.right}"
+
+class Call(Instr):
+  def __init__(self, dest : Temp, func : str, args : list):
+    super().__init__(dest, args)
+    self.func = func
+
+  def has_side_effects(self) -> bool:
+    return True
+
+  def __str__(self):
+    return f"{self.dest} = call {self.func}({', '.join(str(arg) for arg in self.args)})"
+
+class LoadGlobal(Instr):
+  '''Read the global named name from the data sections'''
+  def __init__(self, dest : Temp, name : str):
+    super().__init__(dest)
+    self.name = name
+
+  def __str__(self):
+    return f"{self.dest} = load @{self.name}"
+
+class StoreGlobal(Instr):
+  def __init__(self, name : str, value):
+    super().__init__(None, [value])
+    self.name = name
+
+  @property
+  def value(self):
+    return self.args[0]
+
+  def has_side_effects(self) -> bool:
+    return True
+
+  def __str__(self):
+    return f"store @{self.name}, {self.value}"
+
+class Jump(Instr):
+  def __init__(self, target : str):
+    super().__init__()
+    self.target = target
+
+  def targets(self) -> list:
+    return [self.target]
+
+  def __str__(self):
+    return f"jump {self.target}"
+
+class Branch(Instr):
+  '''Go to if_true if the condition is nonzero, else to if_false'''
+  def __init__(self, cond, if_true : str, if_false : str):
+    super().__init__(None, [cond])
+    self.if_true = if_true
+    self.if_false = if_false
+
+  @property
+  def cond(self):
+    return self.args[0]
+
+  def targets(self) -> list:
+    return [self.if_true, self.if_false]
+
+  def __str__(self):
+    return f"branch {self.cond}, {self.if_true}, {self.if_false}"
+
+class Return(Instr):
+  def __init__(self, value):
+    super().__init__(None, [value])
+
+  @property
+  def value(self):
+    return self.args[0]
+
+  def __str__(self):
+    return f"return {self.value}"
+
+class Phi(Instr):
+  '''SSA merge: the value of args[i] when control came from the block labels[i]'''
+  def __init__(self, dest : Temp, labels : list, args : list):
+    super().__init__(dest, args)
+    self.labels = list(labels)
+
+  def incoming(self, label : str):
+    return self.args[self.labels.index(label)]
+
+  def set_incoming(self, label : str, value):
+    self.args[self.labels.index(label)] = value
+
+  def remove_incoming(self, label : str):
+    i = self.labels.index(label)
+    del self.labels[i]
+    del self.args[i]
+
+  def __str__(self):
+    incoming = ", ".join(f"[{label}: {arg}]" for label, arg in zip(self.labels, self.args))
+    return f"{self.dest} = phi {incoming}"
+
+TERMINATORS = (Jump, Branch, Return)
+
+#### Blocks and functions ####
+class BasicBlock:
+  '''Straight-line instructions ending in a single terminator'''
+  def __init__(self, label : str):
+    self.label = label
+    self.instrs = []
+
+  def append(self, instr : Instr):
+    self.instrs.append(instr)
+
+  @property
+  def terminator(self) -> Instr:
+    if self.instrs and isinstance(self.instrs[-1], TERMINATORS):
+      return self.instrs[-1]
+    return None
+
+  def successors(self) -> list:
+    return self.terminator.targets() if self.terminator is not None else []
+
+  def phis(self) -> list:
+    '''The phi instructions, which always come first in the block'''
+    phis = []
+    for instr in self.instrs:
+      if not isinstance(instr, Phi):
+        break
+      phis.append(instr)
+    return phis
+
+  def __str__(self):
+    return "\n".join([f"{self.label}:"] + [f"  {instr}" for instr in self.instrs])
+
+class IRFunction:
+  '''Basic blocks of a function, the first one being the entry'''
+  def __init__(self, name : str, params : list):
+    self.name = name
+    self.params = params
+    self.blocks = []
+
+  def block(self, label : str) -> BasicBlock:
+    for block in self.blocks:
+      if block.label == label:
+        return block
+    raise RuntimeError(f'No block "{label}" in function "{self.name}".')
+
+  def successors(self) -> dict:
+    return {block.label : block.successors() for block in self.blocks}
+
+  def predecessors(self) -> dict:
+    preds = {block.label : [] for block in self.blocks}
+    for block in self.blocks:
+      for label in block.successors():
+        if block.label not in preds[label]:
+          preds[label].append(block.label)
+    return preds
+
+  def remove_unreachable(self):
+    '''Drop blocks that can't be reached from the entry'''
+    succs = self.successors()
+    reached = set()
+    stack = [self.blocks[0].label]
+    while stack:
+      label = stack.pop()
+      if label not in reached:
+        reached.add(label)
+        stack.extend(succs[label])
+    self.blocks = [block for block in self.blocks if block.label in reached]
+    for block in self.blocks:
+      for phi in block.phis():
+        for label in [label for label in phi.labels if label not in reached]:
+          phi.remove_incoming(label)
+
+  def labels(self) -> list:
+    return [block.label for block in self.blocks]
+
+  def instructions(self):
+    for block in self.blocks:
+      for instr in block.instrs:
+        yield instr
+
+  def __str__(self):
+    params = ", ".join(str(param) for param in self.params)
+    header = f"function {self.name}({params})" if self.name is not None else "module"
+    return "\n".join([header] + [str(block) for block in self.blocks])
+
+class IRModule:
+  '''Functions, and the module-level code as a function without a name'''
+  def __init__(self):
+    self.functions = []
+    self.code : IRFunction = None
+
+  def __str__(self):
+    parts = [str(function) for function in self.functions]
+    if self.code is not None:
+      parts.append(str(self.code))
+    return "\n\n".join(parts)
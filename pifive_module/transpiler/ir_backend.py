@@ -0,0 +1,262 @@
+import ast
+from .ir import Temp, Const, Copy, BinaryOp, Compare, Call, LoadGlobal, StoreGlobal, Jump, Branch, Return, IRFunction, IRModule
+from .global_data import data_label
+from .instruction_maker import BinOp, BranchOp, ImmOp
+from .linear_scan import LinearScan
+from .registers import Reg, RegType
+
+BINARY_OPS = {
+  'Add' : BinOp.ADD,
+  'Sub' : BinOp.SUB,
+  'Mult' : BinOp.MUL,
+  'Div' : BinOp.DIV,
+  'LShift' : BinOp.SLL,
+  'RShift' : BinOp.SRA,
+  'BitAnd' : BinOp.AND,
+  'BitOr' : BinOp.OR,
+  'BitXor' : BinOp.XOR
+}
+
+IMMEDIATE_OPS = {
+  'Add' : ImmOp.ADDI,
+  'LShift' : ImmOp.SLLI,
+  'RShift' : ImmOp.SRAI,
+  'BitAnd' : ImmOp.ANDI,
+  'BitOr' : ImmOp.ORI,
+  'BitXor' : ImmOp.XORI
+}
+
+COMMUTATIVE = ['Add', 'Mult', 'BitAnd', 'BitOr', 'BitXor']
+
+BRANCH_OPS = {
+  'Eq' : BranchOp.BEQ,
+  'NotEq' : BranchOp.BNE,
+  'Lt' : BranchOp.BLT,
+  'LtE' : BranchOp.BLE,
+  'Gt' : BranchOp.BGT,
+  'GtE' : BranchOp.BGE
+}
+
+class IRBackend:
+  '''Emits RISC-V from the IR over virtual registers, then allocates them with linear scan'''
+  def __init__(self, transpiler):
+    self.rv = transpiler
+    self.instr = transpiler.instr
+    self.regs = {}
+    self.prefix = None
+    self.fused = {}
+
+  def emit(self, module : IRModule):
+    '''Emit every function, then the module-level code, which has no frame'''
+    for function in module.functions:
+      self.rv.call_uses[function.name] = [reg.name for reg in RegType.arg_regs.value[:len(function.params)]]
+    for function in module.functions:
+      body = self.emit_body(function)
+      allocator = LinearScan(body, self.rv.call_uses)
+      body = allocator.run()
+      self.rv.emit_frame(function.name, body, allocator.spill_count, allocator.saved_regs)
+
+    allocator = LinearScan(self.emit_body(module.code), self.rv.call_uses)
+    body = allocator.run()
+    if allocator.spill_count or allocator.saved_regs:
+      raise RuntimeError("Module-level code needs more registers than available, move it into a function.")
+    self.instr.instr_buffer += body
+
+  #### Helpers ####
+  def reg(self, value) -> Reg:
+    '''Register holding an operand, loading constants into a new one'''
+    if isinstance(value, Const):
+      if value.value == 0:
+        return Reg.zero
+      reg = self.rv.new_vreg()
+      self.instr.load_imm(reg, value.value)
+      return reg
+    if value not in self.regs:
+      self.regs[value] = self.rv.new_vreg()
+    return self.regs[value]
+
+  def move(self, dest : Reg, value):
+    if isinstance(value, Const):
+      self.instr.load_imm(dest, value.value)
+    else:
+      self.instr.mv(dest, self.reg(value))
+
+  def label(self, name : str) -> str:
+    return f"{self.prefix}_{name}"
+
+  def fusable(self, function : IRFunction) -> dict:
+    '''Comparisons only read by the branch right after them, by the id of the branch'''
+    uses = {}
+    for instr in function.instructions():
+      for temp in instr.uses():
+        uses[temp] = uses.get(temp, 0) + 1
+    fused = {}
+    for block in function.blocks:
+      if len(block.instrs) < 2:
+        continue
+      compare, branch = block.instrs[-2], block.instrs[-1]
+      if isinstance(compare, Compare) and isinstance(branch, Branch) and branch.cond == compare.dest:
+        if uses.get(compare.dest) == 1 and compare.dest not in function.params:
+          fused[id(branch)] = compare
+    return fused
+
+  #### Functions ####
+  def emit_body(self, function : IRFunction) -> list:
+    '''Lines of the function body, ending every path in a bare "ret" like the linear scan path'''
+    outer = self.instr.instr_buffer
+    self.instr.instr_buffer = []
+    self.regs = {}
+    self.prefix = function.name or "global"
+    self.fused = self.fusable(function)
+
+    for param, arg_reg in zip(function.params, RegType.arg_regs.value):
+      self.instr.mv(self.reg(param), arg_reg)
+    for i, block in enumerate(function.blocks):
+      if i > 0:
+        self.instr.label(self.label(block.label))
+      following = function.blocks[i + 1].label if i + 1 < len(function.blocks) else None
+      for instr in block.instrs:
+        self.instr.comment(str(instr))
+        self.emit_instr(instr, following)
+
+    body = self.instr.instr_buffer
+    self.instr.instr_buffer = outer
+    return body
+
+  def emit_instr(self, instr, following : str):
+    if isinstance(instr, Copy):
+      self.move(self.reg(instr.dest), instr.src)
+    elif isinstance(instr, BinaryOp):
+      self.emit_binary(instr)
+    elif isinstance(instr, Compare):
+      # A fused comparison is emitted as part of its branch
+      if not any(compare is instr for compare in self.fused.values()):
+        self.emit_compare(instr)
+    elif isinstance(instr, Call):
+      self.emit_call(instr)
+    elif isinstance(instr, LoadGlobal):
+      self.instr.load_global(self.reg(instr.dest), data_label(instr.name))
+    elif isinstance(instr, StoreGlobal):
+      self.instr.store_global(self.reg(instr.value), data_label(instr.name), self.rv.new_vreg())
+    elif isinstance(instr, Jump):
+      if instr.target != following:
+        self.instr.jump_label(self.label(instr.target))
+    elif isinstance(instr, Branch):
+      self.emit_branch(instr, following)
+    elif isinstance(instr, Return):
+      self.move(Reg.a0, instr.value)
+      self.instr.ret()
+    else:
+      raise RuntimeError(f"{instr.__class__.__name__} has no RISC-V lowering.")
+
+  #### Instructions ####
+  def immediate(self, instr : BinaryOp):
+    '''Immediate instruction for the operation as (immop, operand, imm), or None'''
+    if not self.rv.immediates:
+      return None
+    left, right = instr.left, instr.right
+    if isinstance(right, Const) and instr.op == 'Sub':
+      immop, operand, imm = ImmOp.ADDI, left, -right.value
+    elif isinstance(right, Const) and instr.op in IMMEDIATE_OPS:
+      immop, operand, imm = IMMEDIATE_OPS[instr.op], left, right.value
+    elif isinstance(left, Const) and instr.op in IMMEDIATE_OPS and instr.op in COMMUTATIVE:
+      immop, operand, imm = IMMEDIATE_OPS[instr.op], right, left.value
+    else:
+      return None
+    return (immop, operand, imm) if immop.fits(imm) else None
+
+  def emit_binary(self, instr : BinaryOp):
+    dest = self.reg(instr.dest)
+    if instr.op in ('FloorDiv', 'Mod'):
+      self.emit_divmod(instr, dest)
+      return
+    form = self.immediate(instr)
+    if form is not None:
+      immop, operand, imm = form
+      self.instr.immop(immop, dest, self.reg(operand), imm)
+      return
+    self.instr.binop(BINARY_OPS[instr.op], dest, self.reg(instr.left), self.reg(instr.right))
+
+  def emit_divmod(self, instr : BinaryOp, dest : Reg):
+    op = getattr(ast, instr.op)()
+    src = self.reg(instr.left)
+    if isinstance(instr.right, Const) and instr.right.value > 0:
+      self.rv.floor_divmod_const(op, dest, src, instr.right.value, [self.rv.new_vreg(), self.rv.new_vreg()])
+      return
+    right = self.reg(instr.right)
+
+    # The divisor is read after dest is written
+    result = self.rv.new_vreg() if dest == right else dest
+    self.rv.floor_divmod(op, result, src, right, self.rv.new_vreg())
+    if result != dest:
+      self.instr.mv(dest, result)
+
+  def emit_compare(self, instr : Compare):
+    dest = self.reg(instr.dest)
+    branchop : BranchOp = BRANCH_OPS[instr.op]
+    if self.rv.branchless_compares:
+      self.emit_branchless_compare(instr, dest, branchop)
+      return
+    left, right = self.reg(instr.left), self.reg(instr.right)
+
+    # The result is written before the branch reads the operands
+    result = self.rv.new_vreg() if dest in (left, right) else dest
+    label = self.rv.create_label(branchop.name)
+    self.instr.set_true(result)
+    self.instr.branchop(branchop, left, right, label)
+    self.instr.set_false(result)
+    self.instr.label(label)
+    if result != dest:
+      self.instr.mv(dest, result)
+
+  def emit_branchless_compare(self, instr : Compare, dest : Reg, branchop : BranchOp):
+    left, right = instr.left, instr.right
+    if isinstance(left, Const) and instr.op in ('Eq', 'NotEq'):
+      left, right = right, left
+    if (self.rv.immediates and isinstance(right, Const) and right.value != 0
+        and instr.op in ('Eq', 'NotEq') and ImmOp.XORI.fits(right.value)):
+      self.instr.immop(ImmOp.XORI, dest, self.reg(left), right.value)
+      if branchop == BranchOp.BEQ:
+        self.instr.set_zero(dest, dest)
+      else:
+        self.instr.set_not_zero(dest, dest)
+      return
+    self.instr.set_compare(branchop, dest, self.reg(instr.left), self.reg(instr.right))
+
+  def emit_call(self, instr : Call):
+    if instr.func == "print":
+      self.rv.print_label = True
+      self.move(Reg.a1, instr.args[0])
+      self.instr.load_label(Reg.a0, "print_int")
+      self.instr.call("printf")
+    else:
+      if len(instr.args) > len(RegType.arg_regs.value):
+        raise RuntimeError(f'Too many arguments for "{instr.func}".')
+      for arg, arg_reg in zip(instr.args, RegType.arg_regs.value):
+        self.move(arg_reg, arg)
+      self.instr.call(instr.func)
+    self.instr.mv(self.reg(instr.dest), Reg.a0)
+
+  def emit_branch(self, instr : Branch, following : str):
+    if_true, if_false = instr.if_true, instr.if_false
+    if isinstance(instr.cond, Const):
+      target = if_true if instr.cond.value else if_false
+      if target != following:
+        self.instr.jump_label(self.label(target))
+      return
+
+    # Branch away from the block laid out next, so at most one jump is needed
+    invert = if_true == following
+    target = if_false if invert else if_true
+    other = if_true if invert else if_false
+    compare = self.fused.get(id(instr))
+    if compare is not None:
+      branchop : BranchOp = BRANCH_OPS[compare.op]
+      branchop = branchop.invert() if invert else branchop
+      self.instr.branchop(branchop, self.reg(compare.left), self.reg(compare.right), self.label(target))
+    elif invert:
+      self.instr.branch_zero(self.reg(instr.cond), self.label(target))
+    else:
+      self.instr.branch_not_zero(self.reg(instr.cond), self.label(target))
+    if other != following:
+      self.instr.jump_label(self.label(other))
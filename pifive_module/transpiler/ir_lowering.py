@@ -0,0 +1,277 @@
+import ast
+from .ir import (Temp, Const, Copy, BinaryOp, Compare, Call, LoadGlobal, StoreGlobal, Jump, Branch, Return,
+                 BasicBlock, IRFunction, IRModule)
+from .dead_code import loaded_names
+from .global_data import ModuleGlobals
+from .loop_invariant import has_call
+from .purity import local_names
+from .short_circuit import bitwise_form, decider
+
+# Operators the backend has instructions for
+BINARY_OPS = ['Add', 'Sub', 'Mult', 'Div', 'FloorDiv', 'Mod', 'LShift', 'RShift', 'BitAnd', 'BitOr', 'BitXor']
+COMPARE_OPS = ['Eq', 'NotEq', 'Lt', 'LtE', 'Gt', 'GtE']
+
+def not_supported(node):
+  return RuntimeError(f"{node.__class__.__name__} not supported. Node dump: {ast.dump(node)}")
+
+class Lowering:
+  '''Lowers the supported subset of the ast to three-address code in basic blocks'''
+  def __init__(self, globals : ModuleGlobals = None):
+    self.globals = globals
+    # Globals of the body being lowered, which are cached in variables of the same name
+    self.cached = []
+    self.read = []
+    self.function : IRFunction = None
+    self.block : BasicBlock = None
+    self.names = None
+    self.temp_count = 0
+    self.label_count = 0
+
+  def lower(self, node : ast.Module) -> IRModule:
+    module = IRModule()
+    code = []
+    for statement in node.body:
+      if isinstance(statement, ast.FunctionDef):
+        module.functions.append(self.lower_function(statement))
+      elif self.globals is None or statement not in self.globals.initializers:
+        code.append(statement)
+    if self.globals is not None:
+      loaded = set()
+      for statement in code:
+        loaded |= loaded_names(statement)
+      self.cached = list(self.globals.values)
+      self.read = [name for name in self.cached if name in loaded]
+    module.code = self.lower_body(None, [], code, None)
+    return module
+
+  def lower_function(self, node : ast.FunctionDef) -> IRFunction:
+    names = local_names(node)
+    if self.globals is not None:
+      self.cached = self.globals.used(node)
+      self.read = self.globals.read(node)
+      names = names | set(self.cached)
+    return self.lower_body(node.name, [Temp(arg.arg) for arg in node.args.args], node.body, names)
+
+  def lower_body(self, name : str, params : list, body : list, names : set) -> IRFunction:
+    self.function = IRFunction(name, params)
+    self.names = names
+    self.temp_count = 0
+    self.label_count = 0
+    self.block = self.new_block("entry")
+    self.load_globals(self.read)
+    for statement in body:
+      self.lower_statement(statement)
+
+    # Falling off the end returns 0
+    if self.block.terminator is None:
+      self.block.append(Return(Const(0)))
+    self.function.remove_unreachable()
+    return self.function
+
+  #### Helpers ####
+  def new_temp(self) -> Temp:
+    self.temp_count += 1
+    return Temp(f"%{self.temp_count}")
+
+  def new_label(self, kind : str) -> str:
+    self.label_count += 1
+    return f"{kind}{self.label_count}"
+
+  def new_block(self, label : str) -> BasicBlock:
+    block = BasicBlock(label)
+    self.function.blocks.append(block)
+    return block
+
+  def start_block(self, label : str):
+    '''Continue in a new block, falling through from the current one if it is still open'''
+    if self.block.terminator is None:
+      self.block.append(Jump(label))
+    self.block = self.new_block(label)
+
+  def load_globals(self, names : list):
+    for name in names:
+      self.block.append(LoadGlobal(Temp(name), name))
+
+  def hold(self, node, value, rest : list):
+    '''Copy a global read before a call out of its variable, which the call may load again'''
+    if (isinstance(value, Temp) and value.name in self.cached and value.name in self.globals.assigned
+        and any(has_call(other) for other in rest)):
+      copy = self.new_temp()
+      self.block.append(Copy(copy, value))
+      return copy
+    return value
+
+  def variable(self, name : str) -> Temp:
+    if self.names is not None and name not in self.names:
+      raise RuntimeError(f'Variable "{name}" from an enclosing scope is not supported in the IR.')
+    return Temp(name)
+
+  #### Statements ####
+  def lower_statement(self, node):
+    if self.block.terminator is not None:
+      # Code after a return still gets a block, which is dropped as unreachable
+      self.block = self.new_block(self.new_label("dead"))
+    attr = getattr(self, 'lower_' + node.__class__.__name__, None)
+    if attr is None:
+      raise not_supported(node)
+    attr(node)
+
+  def lower_Assign(self, node : ast.Assign):
+    if len(node.targets) != 1 or not isinstance(node.targets[0], ast.Name):
+      raise RuntimeError("Only single assignment allowed.")
+    target = Temp(node.targets[0].id)
+    value = self.lower_expr(node.value)
+
+    # Write the result straight into the variable rather than copying the temporary
+    last = self.block.instrs[-1] if self.block.instrs else None
+    if isinstance(value, Temp) and value.name.startswith('%') and last is not None and last.dest == value:
+      last.dest = target
+    else:
+      self.block.append(Copy(target, value))
+    if target.name in self.cached:
+      self.block.append(StoreGlobal(target.name, target))
+
+  def lower_Global(self, node : ast.Global):
+    # Handled by caching the globals of the function
+    if self.globals is None:
+      raise not_supported(node)
+
+  def lower_Expr(self, node : ast.Expr):
+    self.lower_expr(node.value)
+
+  def lower_Return(self, node : ast.Return):
+    value = self.lower_expr(node.value) if node.value is not None else Const(0)
+    self.block.append(Return(value))
+
+  def lower_If(self, node : ast.If):
+    label_then = self.new_label("then")
+    label_else = self.new_label("else") if node.orelse else None
+    label_end = self.new_label("end")
+    self.lower_condition(node.test, label_then, label_else or label_end)
+
+    self.block = self.new_block(label_then)
+    for statement in node.body:
+      self.lower_statement(statement)
+    if node.orelse:
+      if self.block.terminator is None:
+        self.block.append(Jump(label_end))
+      self.block = self.new_block(label_else)
+      for statement in node.orelse:
+        self.lower_statement(statement)
+    self.start_block(label_end)
+
+  def lower_While(self, node : ast.While):
+    label_test = self.new_label("while")
+    label_body = self.new_label("body")
+    label_break = self.new_label("break")
+    self.start_block(label_test)
+    self.lower_condition(node.test, label_body, label_break)
+
+    self.block = self.new_block(label_body)
+    for statement in node.body:
+      self.lower_statement(statement)
+    if self.block.terminator is None:
+      self.block.append(Jump(label_test))
+    self.block = self.new_block(label_break)
+
+  def lower_condition(self, node, if_true : str, if_false : str):
+    '''Branch on a test, evaluating the operands of "and"/"or" only until one decides'''
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+      self.lower_condition(node.operand, if_false, if_true)
+    elif isinstance(node, ast.BoolOp):
+      for value in node.values[:-1]:
+        label_next = self.new_label("next")
+        if decider(node):
+          self.lower_condition(value, if_true, label_next)
+        else:
+          self.lower_condition(value, label_next, if_false)
+        self.block = self.new_block(label_next)
+      self.lower_condition(node.values[-1], if_true, if_false)
+    else:
+      # Lowering the test may start new blocks, so branch from the block it ends in
+      value = self.lower_expr(node)
+      self.block.append(Branch(value, if_true, if_false))
+
+  #### Expressions ####
+  def lower_expr(self, node):
+    attr = getattr(self, 'expr_' + node.__class__.__name__, None)
+    if attr is None:
+      raise not_supported(node)
+    return attr(node)
+
+  def expr_Constant(self, node : ast.Constant):
+    if not isinstance(node.value, int):
+      raise not_supported(node)
+    return Const(int(node.value))
+
+  def expr_Name(self, node : ast.Name):
+    return self.variable(node.id)
+
+  def expr_BinOp(self, node : ast.BinOp):
+    op = node.op.__class__.__name__
+    if op not in BINARY_OPS:
+      raise not_supported(node)
+    left = self.hold(node.left, self.lower_expr(node.left), [node.right])
+    right = self.lower_expr(node.right)
+    dest = self.new_temp()
+    self.block.append(BinaryOp(op, dest, left, right))
+    return dest
+
+  def expr_BoolOp(self, node : ast.BoolOp):
+    form = bitwise_form(node)
+    if form is not None:
+      return self.lower_expr(form)
+
+    # A variable rather than a temporary, since every operand that is reached assigns it
+    result = Temp("_" + self.new_label("bool"))
+    label_end = self.new_label("decided")
+    for value in node.values[:-1]:
+      operand = self.lower_expr(value)
+      self.block.append(Copy(result, operand))
+      label_next = self.new_label("next")
+      if decider(node):
+        self.block.append(Branch(result, label_end, label_next))
+      else:
+        self.block.append(Branch(result, label_next, label_end))
+      self.block = self.new_block(label_next)
+    operand = self.lower_expr(node.values[-1])
+    self.block.append(Copy(result, operand))
+    self.start_block(label_end)
+    return result
+
+  def expr_UnaryOp(self, node : ast.UnaryOp):
+    operand = self.lower_expr(node.operand)
+    if isinstance(node.op, ast.UAdd):
+      return operand
+    dest = self.new_temp()
+    if isinstance(node.op, ast.USub):
+      self.block.append(BinaryOp('Sub', dest, Const(0), operand))
+    elif isinstance(node.op, ast.Invert):
+      self.block.append(BinaryOp('BitXor', dest, operand, Const(-1)))
+    else:
+      self.block.append(Compare('Eq', dest, operand, Const(0)))
+    return dest
+
+  def expr_Compare(self, node : ast.Compare):
+    if len(node.comparators) != 1:
+      raise RuntimeError("Only single comparison allowed.")
+    op = node.ops[0].__class__.__name__
+    if op not in COMPARE_OPS:
+      raise not_supported(node)
+    left = self.hold(node.left, self.lower_expr(node.left), node.comparators)
+    right = self.lower_expr(node.comparators[0])
+    dest = self.new_temp()
+    self.block.append(Compare(op, dest, left, right))
+    return dest
+
+  def expr_Call(self, node : ast.Call):
+    if not isinstance(node.func, ast.Name):
+      raise not_supported(node)
+    if node.func.id == "print" and len(node.args) != 1:
+      raise RuntimeError(f'Incorrect number of arguments for print function!')
+    args = [self.hold(arg, self.lower_expr(arg), node.args[i + 1:]) for i, arg in enumerate(node.args)]
+    dest = self.new_temp()
+    self.block.append(Call(dest, node.func.id, args))
+    if self.globals is not None and node.func.id in self.globals.writers:
+      self.load_globals([name for name in self.read if name in self.globals.assigned])
+    return dest
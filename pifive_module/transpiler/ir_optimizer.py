@@ -0,0 +1,281 @@
+import ast
+from .ir import Temp, Const, Copy, BinaryOp, Compare, Jump, Branch, Phi, IRFunction, IRModule
+from .constant_folder import fold_binop, fold_cmpop
+from .ssa import dominators, dominates, dominator_tree, to_ssa, from_ssa
+
+# Lattice value of a temporary that may hold more than one value
+BOTTOM = 'bottom'
+
+COMMUTATIVE = ['Add', 'Mult', 'BitAnd', 'BitOr', 'BitXor', 'Eq', 'NotEq']
+SWAPPED = {'Gt' : 'Lt', 'GtE' : 'LtE'}
+
+def replace_everywhere(function : IRFunction, mapping : dict):
+  '''Replace uses of temporaries, following chains of replacements to their end'''
+  def resolve(value):
+    while isinstance(value, Temp) and value in mapping:
+      value = mapping[value]
+    return value
+  for instr in function.instructions():
+    instr.args = [resolve(arg) for arg in instr.args]
+
+def simplify_phis(function : IRFunction):
+  '''Replace phis that merge a single value, other than themselves, by that value'''
+  changed = True
+  while changed:
+    changed = False
+    for block in function.blocks:
+      for phi in block.phis():
+        values = set(arg for arg in phi.args if arg != phi.dest)
+        if len(values) == 1:
+          value = values.pop()
+          block.instrs.remove(phi)
+          replace_everywhere(function, {phi.dest : value})
+          changed = True
+
+def remove_dead(function : IRFunction):
+  '''Remove instructions whose results are never needed, including cycles of phis'''
+  defs = {}
+  for instr in function.instructions():
+    for temp in instr.defs():
+      defs[temp] = instr
+  needed = set()
+  work = [instr for instr in function.instructions() if instr.dest is None or instr.has_side_effects()]
+  while work:
+    instr = work.pop()
+    if id(instr) in needed:
+      continue
+    needed.add(id(instr))
+    work += [defs[temp] for temp in instr.uses() if temp in defs]
+  for block in function.blocks:
+    block.instrs = [instr for instr in block.instrs if id(instr) in needed]
+
+#### Sparse conditional constant propagation ####
+class ConstantPropagation:
+  '''Finds temporaries with one constant value and branches that always go the same way (Wegman and Zadeck)'''
+  def run(self, function : IRFunction):
+    self.function = function
+    self.values = {}
+    self.edges = set()
+    self.reached = set()
+    self.users = {}
+    for block in function.blocks:
+      for instr in block.instrs:
+        for temp in instr.uses():
+          self.users.setdefault(temp, []).append((block.label, instr))
+
+    # Values that enter the function could be anything
+    defined = set(temp for instr in function.instructions() for temp in instr.defs())
+    for temp in self.users:
+      if temp not in defined:
+        self.values[temp] = BOTTOM
+
+    self.flow = [(None, function.blocks[0].label)]
+    self.uses = []
+    while self.flow or self.uses:
+      if self.flow:
+        self.visit_edge(*self.flow.pop())
+      else:
+        label, instr = self.uses.pop()
+        if label in self.reached:
+          self.evaluate(label, instr)
+    self.rewrite()
+
+  def value(self, operand):
+    '''Constant value, BOTTOM, or None while nothing is known yet'''
+    if isinstance(operand, Const):
+      return operand.value
+    return self.values.get(operand)
+
+  def visit_edge(self, pred : str, label : str):
+    if (pred, label) in self.edges:
+      return
+    self.edges.add((pred, label))
+    block = self.function.block(label)
+    instrs = block.phis() if label in self.reached else block.instrs
+    self.reached.add(label)
+    for instr in instrs:
+      self.evaluate(label, instr)
+
+  def evaluate(self, label : str, instr):
+    if isinstance(instr, Jump):
+      self.flow.append((label, instr.target))
+    elif isinstance(instr, Branch):
+      cond = self.value(instr.cond)
+      if cond == BOTTOM:
+        self.flow += [(label, instr.if_true), (label, instr.if_false)]
+      elif cond is not None:
+        self.flow.append((label, instr.if_true if cond else instr.if_false))
+    elif isinstance(instr, Phi):
+      value = None
+      for pred, arg in zip(instr.labels, instr.args):
+        if (pred, label) in self.edges:
+          value = self.meet(value, self.value(arg))
+      self.update(instr.dest, value)
+    elif instr.dest is not None:
+      self.update(instr.dest, self.fold(instr))
+
+  def meet(self, a, b):
+    if a is None:
+      return b
+    if b is None or a == b:
+      return a
+    return BOTTOM
+
+  def fold(self, instr):
+    if instr.has_side_effects():
+      return BOTTOM
+    if isinstance(instr, Copy):
+      return self.value(instr.src)
+    values = [self.value(arg) for arg in instr.args]
+    if BOTTOM in values:
+      return BOTTOM
+    if None in values:
+      return None
+    if isinstance(instr, BinaryOp):
+      value = fold_binop(getattr(ast, instr.op)(), *values)
+    elif isinstance(instr, Compare):
+      value = fold_cmpop(getattr(ast, instr.op)(), *values)
+    else:
+      value = None
+    return BOTTOM if value is None else value
+
+  def update(self, temp : Temp, value):
+    old = self.values.get(temp)
+    if value is None or old == BOTTOM or old == value:
+      return
+    self.values[temp] = self.meet(old, value)
+    self.uses += self.users.get(temp, [])
+
+  def rewrite(self):
+    '''Replace constant temporaries, fix the branches and drop the blocks that are never reached'''
+    constants = {temp : Const(value) for temp, value in self.values.items() if value != BOTTOM}
+    for block in self.function.blocks:
+      if block.label not in self.reached:
+        continue
+      block.instrs = [instr for instr in block.instrs if instr.dest not in constants or instr.has_side_effects()]
+      for instr in block.instrs:
+        instr.replace_uses(constants)
+      branch = block.terminator
+      if isinstance(branch, Branch):
+        taken = [target for target in branch.targets() if (block.label, target) in self.edges]
+        if len(taken) == 1:
+          block.instrs[-1] = Jump(taken[0])
+      for phi in block.phis():
+        for pred in [pred for pred in phi.labels if (pred, block.label) not in self.edges]:
+          phi.remove_incoming(pred)
+    self.function.remove_unreachable()
+
+#### Global value numbering ####
+class ValueNumbering:
+  '''Removes computations of a value already available in a dominating block, and hoists the ones
+  made on both sides of a branch above it'''
+  def run(self, function : IRFunction):
+    self.function = function
+    self.mapping = {}
+    self.idom = dominators(function)
+    self.hoist()
+    self.available = {}
+    self.number(function.blocks[0].label, dominator_tree(self.idom))
+    replace_everywhere(function, self.mapping)
+
+  def operand(self, value):
+    while isinstance(value, Temp) and value in self.mapping:
+      value = self.mapping[value]
+    return value
+
+  def key(self, instr, label : str):
+    '''Hashable description of the value the instruction computes, or None if it has effects'''
+    args = [self.operand(arg) for arg in instr.args]
+    if isinstance(instr, Phi):
+      return ('phi', label, tuple(zip(instr.labels, args)))
+    if not isinstance(instr, (BinaryOp, Compare)):
+      return None
+    op = instr.op
+    if op in SWAPPED:
+      op, args = SWAPPED[op], list(reversed(args))
+    if op in COMMUTATIVE:
+      args = sorted(args, key=repr)
+    return (instr.__class__.__name__, op, tuple(args))
+
+  def number(self, label : str, tree : dict):
+    # Walk the dominator tree, making the values of a block available to the blocks it dominates
+    work = [(label, None)]
+    while work:
+      label, added = work.pop()
+      if added is not None:
+        for key in added:
+          del self.available[key]
+        continue
+      block = self.function.block(label)
+      added = []
+      kept = []
+      for instr in block.instrs:
+        if isinstance(instr, Copy):
+          self.mapping[instr.dest] = self.operand(instr.src)
+          continue
+        key = self.key(instr, label)
+        if key is not None and key in self.available:
+          self.mapping[instr.dest] = self.available[key]
+          continue
+        if key is not None:
+          self.available[key] = instr.dest
+          added.append(key)
+        kept.append(instr)
+      block.instrs = kept
+      work.append((label, added))
+      work += [(child, None) for child in reversed(tree[label])]
+
+  def hoist(self):
+    '''Move a computation done at the start of both successors of a branch into the branching block'''
+    preds = self.function.predecessors()
+    for block in self.function.blocks:
+      branch = block.terminator
+      if not isinstance(branch, Branch) or branch.if_true == branch.if_false:
+        continue
+      if preds[branch.if_true] != [block.label] or preds[branch.if_false] != [block.label]:
+        continue
+      # A loop test runs once more than the body, so nothing is moved into it
+      if any(dominates(self.idom, block.label, pred) for pred in preds[block.label]):
+        continue
+      left, right = self.function.block(branch.if_true), self.function.block(branch.if_false)
+      while True:
+        pair = self.hoistable(left, right)
+        if pair is None:
+          break
+        first, second = pair
+        left.instrs.remove(first)
+        right.instrs[right.instrs.index(second)] = Copy(second.dest, first.dest)
+        # Stay ahead of a comparison that is fused with the branch
+        at = len(block.instrs) - 1
+        if at > 0 and block.instrs[at - 1].dest == branch.cond and branch.cond not in first.uses():
+          at -= 1
+        block.instrs.insert(at, first)
+
+  def hoistable(self, left, right):
+    '''A pair of instructions computing the same value from operands defined before both blocks'''
+    def inputs_ready(instr, block):
+      defined = set(temp for other in block.instrs for temp in other.defs())
+      return not any(temp in defined for temp in instr.uses())
+    for first in left.instrs:
+      key = self.key(first, left.label)
+      if key is None or isinstance(first, Phi) or not inputs_ready(first, left):
+        continue
+      for second in right.instrs:
+        if not isinstance(second, Phi) and self.key(second, right.label) == key and inputs_ready(second, right):
+          return first, second
+    return None
+
+class IROptimizer:
+  '''Runs passes over every function of the IR in SSA form'''
+  def __init__(self, passes : list = None):
+    self.passes = passes if passes is not None else [ConstantPropagation(), ValueNumbering()]
+
+  def run(self, module : IRModule):
+    for function in module.functions + [module.code]:
+      to_ssa(function)
+      for opt in self.passes:
+        opt.run(function)
+        simplify_phis(function)
+        remove_dead(function)
+      from_ssa(function)
+    return module
@@ -0,0 +1,201 @@
+from bisect import bisect_left
+from .assembly import AsmLine, CALLS, CALL_USES, is_virtual, parse, split_blocks, falls_through, split_memory
+from .instruction_maker import InstructionMaker
+from .registers import Reg, RegType
+
+# Spilled virtual registers are staged through these, so they are never allocated
+SCRATCH_REGS = [Reg.t5, Reg.t6]
+
+# Registers with a fixed role that the allocator does not track
+UNTRACKED = ['zero', 'ra', 'sp', 'gp', 'tp', 'fp', 's0']
+
+def rename(operand : str, mapping : dict) -> str:
+  '''Replace a register operand, or the base register of a memory operand like "0(v3)"'''
+  if operand.endswith(')'):
+    offset, base = split_memory(operand)
+    return f"{offset}({mapping.get(base, base)})"
+  return mapping.get(operand, operand)
+
+def default_pool() -> list:
+  '''Allocation order: temporaries, then argument registers, then callee-saved registers'''
+  temps = [reg for reg in RegType.temp_regs.value if reg not in SCRATCH_REGS]
+  return temps + RegType.arg_regs.value + RegType.saved_regs.value
+
+class Interval:
+  '''Range of line positions over which a virtual register is live'''
+  def __init__(self, name : str, start : int):
+    self.name = name
+    self.start = start
+    self.end = start
+    self.reg : Reg = None
+    self.slot = None
+
+class LinearScan:
+  '''Linear-scan allocation of the virtual registers in one function body'''
+  def __init__(self, lines : list, call_uses : dict = None, pool : list = None):
+    self.lines = parse(lines)
+    self.call_uses = call_uses or {}
+    self.pool = pool if pool is not None else default_pool()
+    self.intervals = {}
+    self.spill_count = 0
+    self.saved_regs = []
+
+  def run(self) -> list:
+    '''Allocate registers and return the rewritten lines'''
+    self.liveness()
+    self.build_intervals()
+    self.allocate()
+    self.saved_regs = [reg for reg in RegType.saved_regs.value
+                       if any(interval.reg == reg for interval in self.intervals.values())]
+    return self.rewrite()
+
+  #### Liveness ####
+  def uses(self, line : AsmLine) -> set:
+    if line.op in CALLS:
+      regs = self.call_uses.get(line.operands[0], CALL_USES)
+    else:
+      regs = line.uses()
+    return set(reg for reg in regs if reg not in UNTRACKED)
+
+  def defs(self, line : AsmLine) -> set:
+    return set(reg for reg in line.defs() if reg not in UNTRACKED)
+
+  def liveness(self):
+    '''Compute the registers live into and out of every line'''
+    self.line_uses = [self.uses(line) for line in self.lines]
+    self.line_defs = [self.defs(line) for line in self.lines]
+    blocks = split_blocks(self.lines)
+    block_of_label = {}
+    for b, (start, end) in enumerate(blocks):
+      for line in self.lines[start:end]:
+        if line.label is not None:
+          block_of_label[line.label] = b
+
+    # Successors of every block
+    successors = []
+    for b, (start, end) in enumerate(blocks):
+      succ = []
+      code = [line for line in self.lines[start:end] if line.is_instruction()]
+      last = code[-1] if code else None
+      if last is not None and last.target() in block_of_label:
+        succ.append(block_of_label[last.target()])
+      if (last is None or falls_through(last)) and b + 1 < len(blocks):
+        succ.append(b + 1)
+      successors.append(succ)
+
+    # Iterate the block-level dataflow to a fixed point
+    live_in = [set() for _ in blocks]
+    changed = True
+    while changed:
+      changed = False
+      for b in reversed(range(len(blocks))):
+        live = set()
+        for s in successors[b]:
+          live |= live_in[s]
+        start, end = blocks[b]
+        for i in reversed(range(start, end)):
+          live = (live - self.line_defs[i]) | self.line_uses[i]
+        if live != live_in[b]:
+          live_in[b] = live
+          changed = True
+
+    # Then spread it over the lines of each block
+    self.live_in = [set() for _ in self.lines]
+    self.live_out = [set() for _ in self.lines]
+    for b, (start, end) in enumerate(blocks):
+      live = set()
+      for s in successors[b]:
+        live |= live_in[s]
+      for i in reversed(range(start, end)):
+        self.live_out[i] = live
+        live = (live - self.line_defs[i]) | self.line_uses[i]
+        self.live_in[i] = live
+
+    # Positions where each physical register is written or holds a value needed later
+    self.occupied = {}
+    for i in range(len(self.lines)):
+      for name in self.live_out[i] | self.line_defs[i]:
+        if not is_virtual(name):
+          self.occupied.setdefault(name, []).append(i)
+
+  def build_intervals(self):
+    for i in range(len(self.lines)):
+      for name in self.live_in[i] | self.line_defs[i]:
+        if not is_virtual(name):
+          continue
+        if name not in self.intervals:
+          self.intervals[name] = Interval(name, i)
+        self.intervals[name].end = i
+
+  def conflicts(self, interval : Interval, reg : Reg) -> bool:
+    '''Checks if a physical register is written or still needed while the interval is live'''
+    positions = self.occupied.get(reg.name, [])
+    first = bisect_left(positions, interval.start)
+    return first < len(positions) and positions[first] < max(interval.end, interval.start + 1)
+
+  #### Allocation ####
+  def allocate(self):
+    active = []
+    for current in sorted(self.intervals.values(), key=lambda interval: interval.start):
+      # Intervals ending where this one starts can hand over their register
+      active = [interval for interval in active if interval.end > current.start]
+      taken = [interval.reg for interval in active]
+      for reg in self.pool:
+        if reg not in taken and not self.conflicts(current, reg):
+          current.reg = reg
+          active.append(current)
+          break
+      else:
+        # Out of registers: spill whichever interval ends furthest away
+        candidates = [interval for interval in active if not self.conflicts(current, interval.reg)]
+        victim = max(candidates, key=lambda interval: interval.end, default=None)
+        if victim is not None and victim.end > current.end:
+          current.reg = victim.reg
+          self.spill(victim)
+          active.remove(victim)
+          active.append(current)
+        else:
+          self.spill(current)
+
+  def spill(self, interval : Interval):
+    interval.reg = None
+    interval.slot = self.spill_count
+    self.spill_count += 1
+
+  #### Rewriting ####
+  def rewrite(self) -> list:
+    out = []
+    for line in self.lines:
+      if not line.is_instruction() or not any(is_virtual(reg) for reg in line.uses() + line.defs()):
+        out.append(line.text)
+        continue
+
+      staging = InstructionMaker()
+      mapping = {}
+      scratch = list(SCRATCH_REGS)
+
+      # Load spilled sources into scratch registers
+      for name in line.uses():
+        interval = self.intervals.get(name)
+        if interval is not None and interval.slot is not None and name not in mapping:
+          reg = scratch.pop(0)
+          staging.load_reg(reg, interval.slot)
+          mapping[name] = reg.name
+      loads = staging.instr_buffer
+      staging.reset()
+
+      # Store a spilled destination after the instruction
+      for name in line.defs():
+        interval = self.intervals.get(name)
+        if interval is not None and interval.slot is not None:
+          mapping.setdefault(name, SCRATCH_REGS[0].name)
+          staging.store_reg(Reg[mapping[name]], interval.slot)
+      stores = staging.instr_buffer
+
+      for name in line.uses() + line.defs():
+        interval = self.intervals.get(name)
+        if interval is not None and interval.reg is not None:
+          mapping[name] = interval.reg.name
+      operands = [rename(operand, mapping) for operand in line.operands]
+      out += loads + [f"\t{line.op} {', '.join(operands)}"] + stores
+    return out
@@ -1,9 +1,12 @@
 import ast
 from .scope import Scope
+from .arrays import array_size
 
 class LocalsCounter(ast.NodeVisitor):
   def __init__(self, func : ast.FunctionDef, scope : Scope):
     self._names = []
+    self._globals = []
+    self._arrays = {}
     self._scope = scope
 
     # Count the arguments
@@ -22,13 +25,27 @@ class LocalsCounter(ast.NodeVisitor):
     # Visit the target
     self.visit(node.targets[0])
 
+    # Arrays take a slot per element, ahead of the other variables
+    target = node.targets[0]
+    size = array_size(node.value)
+    if size is not None and isinstance(target, ast.Name) and target.id in self._names:
+      self._names.remove(target.id)
+      self._arrays[target.id] = size
+
+  def visit_Global(self, node : ast.Global):
+    # Declared globals live in the data sections
+    self._globals += node.names
+
   def visit_Name(self, node : ast.Name):
     if isinstance(node.ctx, ast.Store):
       # Count up the new variables introduced
-      accounted_for = node.id in self._names
+      accounted_for = node.id in self._names or node.id in self._globals or node.id in self._arrays
       in_scope = self._scope.in_scope(node.id)
       if not accounted_for and not in_scope:
         self._names.append(node.id)
 
   def count(self):
-    return len(self._names)
\ No newline at end of file
+    return len(self._names) + self.array_slots()
+
+  def array_slots(self):
+    return sum(self._arrays.values())
\ No newline at end of file
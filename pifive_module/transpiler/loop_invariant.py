@@ -0,0 +1,109 @@
+import ast
+import copy
+from .purity import declared_globals, pure_functions
+
+def stored_names(node) -> set:
+  return set(child.id for child in ast.walk(node) if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store))
+
+def has_call(node) -> bool:
+  return any(isinstance(child, ast.Call) for child in ast.walk(node))
+
+class LoopInvariantMotion(ast.NodeTransformer):
+  '''Hoists invariant expressions out of while loops into a preheader'''
+  def __init__(self):
+    self.pure = set()
+    self.globals = set()
+    self.assigned = set()
+    self.temps = set()
+    self.count = 0
+
+  def visit_Module(self, node : ast.Module):
+    self.pure = pure_functions(node)
+    self.globals = declared_globals(node)
+    self.generic_visit(node)
+    return node
+
+  def is_invariant(self, node) -> bool:
+    if isinstance(node, ast.Constant):
+      return True
+    elif isinstance(node, ast.Name):
+      return node.id not in self.assigned
+    elif isinstance(node, ast.BinOp):
+      return self.is_invariant(node.left) and self.is_invariant(node.right)
+    elif isinstance(node, ast.UnaryOp):
+      return self.is_invariant(node.operand)
+    elif isinstance(node, ast.Compare):
+      return self.is_invariant(node.left) and all(self.is_invariant(child) for child in node.comparators)
+    elif isinstance(node, ast.Call):
+      return (isinstance(node.func, ast.Name) and node.func.id in self.pure
+              and all(self.is_invariant(arg) for arg in node.args))
+    return False
+
+  def hoist(self, node, preheader : list):
+    '''Replace the largest invariant subexpressions with temporaries computed in the preheader'''
+    if self.is_invariant(node) and not isinstance(node, (ast.Name, ast.Constant)):
+      self.count += 1
+      name = f"_licm{self.count}"
+      self.temps.add(name)
+      preheader.append(ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=node))
+      return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+
+    # Only look inside operators which always evaluate all their operands
+    if isinstance(node, ast.BinOp):
+      node.left = self.hoist(node.left, preheader)
+      node.right = self.hoist(node.right, preheader)
+    elif isinstance(node, ast.UnaryOp):
+      node.operand = self.hoist(node.operand, preheader)
+    elif isinstance(node, ast.Compare):
+      node.left = self.hoist(node.left, preheader)
+      node.comparators = [self.hoist(child, preheader) for child in node.comparators]
+    elif isinstance(node, ast.Call):
+      node.args = [self.hoist(arg, preheader) for arg in node.args]
+    return node
+
+  def calls_only_pure(self, node) -> bool:
+    calls = [child for child in ast.walk(node) if isinstance(child, ast.Call)]
+    return all(isinstance(call.func, ast.Name) and call.func.id in self.pure for call in calls)
+
+  def is_hoisted_temp(self, statement) -> bool:
+    return (isinstance(statement, ast.Assign) and isinstance(statement.targets[0], ast.Name)
+            and statement.targets[0].id in self.temps
+            and self.is_invariant(statement.value))
+
+  def visit_While(self, node : ast.While):
+    # Inner loops first, so their preheaders become part of this loop's body
+    self.generic_visit(node)
+    self.assigned = stored_names(node)
+    if not self.calls_only_pure(node):
+      # The functions it calls may assign the globals they declare
+      self.assigned |= self.globals
+    original = copy.deepcopy(node)
+    test = copy.deepcopy(node.test)
+    preheader = []
+    node.test = self.hoist(node.test, preheader)
+
+    # Only statements that run on every iteration, so nothing is computed that the loop would skip
+    body = list(node.body)
+    for statement in body:
+      if any(isinstance(child, ast.Return) for child in ast.walk(statement)):
+        break
+      if self.is_hoisted_temp(statement):
+        # The preheader of an inner loop that is invariant here too moves out whole
+        node.body.remove(statement)
+        preheader.append(statement)
+        self.assigned.discard(statement.targets[0].id)
+      elif isinstance(statement, (ast.Assign, ast.Expr)):
+        statement.value = self.hoist(statement.value, preheader)
+      elif isinstance(statement, (ast.If, ast.While)):
+        statement.test = self.hoist(statement.test, preheader)
+
+    if not preheader:
+      return node
+    preheader = [ast.copy_location(statement, node) for statement in preheader]
+    if not any(has_call(statement) for statement in preheader):
+      return preheader + [node]
+
+    # A hoisted call must not run unless the loop does, and the guard repeats the test
+    if not self.calls_only_pure(test):
+      return original
+    return ast.copy_location(ast.If(test=test, body=preheader + [node], orelse=[]), node)
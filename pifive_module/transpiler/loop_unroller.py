@@ -0,0 +1,168 @@
+import ast
+import copy
+from .constant_folder import fold_binop, fold_cmpop, int_value
+from .inliner import size
+from .loop_invariant import stored_names
+
+# Give up on loops which run longer than this, they are not worth unrolling fully
+MAX_TRIP_COUNT = 1 << 16
+
+class Substituter(ast.NodeTransformer):
+  '''Replaces reads of a variable with a constant'''
+  def __init__(self, name : str, value : int):
+    self.name = name
+    self.value = value
+
+  def visit_Name(self, node : ast.Name):
+    if node.id == self.name and isinstance(node.ctx, ast.Load):
+      return ast.copy_location(ast.Constant(value=self.value), node)
+    return node
+
+  def visit_Call(self, node : ast.Call):
+    node.args = [self.visit(arg) for arg in node.args]
+    return node
+
+class Induction:
+  '''A while loop counting a variable from a constant start by a constant step'''
+  def __init__(self, name : str, start : int, step : int, trip_count : int):
+    self.name = name
+    self.start = start
+    self.step = step
+    self.trip_count = trip_count
+
+  def value(self, iteration : int) -> int:
+    return self.start + iteration * self.step
+
+class LoopUnroller:
+  '''Unrolls while loops with a trip count known at compile time'''
+  def __init__(self, factor : int = 4, full_limit : int = 8, max_size : int = 200):
+    self.factor = factor
+    self.full_limit = full_limit
+    self.max_size = max_size
+
+  def visit(self, node : ast.Module) -> ast.Module:
+    self.unroll_node(node)
+    return ast.fix_missing_locations(node)
+
+  def unroll_node(self, node):
+    for field in ('body', 'orelse'):
+      statements = getattr(node, field, None)
+      if isinstance(statements, list):
+        setattr(node, field, self.unroll_statements(statements))
+
+  def unroll_statements(self, statements : list) -> list:
+    result = []
+    for statement in statements:
+      # Inner loops first, so the size check sees what they became
+      self.unroll_node(statement)
+      induction = self.induction(result, statement)
+      if induction is None:
+        result.append(statement)
+      else:
+        result += self.unroll(statement, induction)
+    return result
+
+  #### Recognizing loops ####
+  def step(self, statement, name : str):
+    '''Step of a "name = name + step" or "name = name - step" statement, or None'''
+    if not isinstance(statement, ast.Assign) or len(statement.targets) != 1:
+      return None
+    target, value = statement.targets[0], statement.value
+    if not isinstance(target, ast.Name) or target.id != name or not isinstance(value, ast.BinOp):
+      return None
+    if not isinstance(value.left, ast.Name) or value.left.id != name:
+      return None
+    step = int_value(value.right)
+    if step is None or step == 0:
+      return None
+    if isinstance(value.op, ast.Add):
+      return step
+    elif isinstance(value.op, ast.Sub):
+      return -step
+    return None
+
+  def start(self, previous : list, name : str):
+    '''Constant the variable holds after the previous statements, or None'''
+    for statement in reversed(previous):
+      if isinstance(statement, ast.FunctionDef) or name not in stored_names(statement):
+        continue
+      if isinstance(statement, ast.Assign) and len(statement.targets) == 1:
+        return int_value(statement.value)
+      return None
+    return None
+
+  def induction(self, previous : list, node) -> Induction:
+    '''Matches "i = start" followed later by "while i < bound: ...; i = i + step"'''
+    if not isinstance(node, ast.While) or not node.body:
+      return None
+    test = node.test
+    if not isinstance(test, ast.Compare) or len(test.ops) != 1 or not isinstance(test.left, ast.Name):
+      return None
+    name = test.left.id
+    bound = int_value(test.comparators[0])
+    if bound is None:
+      return None
+
+    # The start value comes from the last assignment before the loop
+    start = self.start(previous, name)
+    if start is None:
+      return None
+
+    # Only the increment at the end of the body may change the variable
+    step = self.step(node.body[-1], name)
+    if step is None or any(name in stored_names(statement) for statement in node.body[:-1]):
+      return None
+    if any(isinstance(child, ast.FunctionDef) for child in ast.walk(node)):
+      return None
+
+    trip_count = 0
+    value = start
+    while fold_cmpop(test.ops[0], value, bound):
+      trip_count += 1
+      if trip_count > MAX_TRIP_COUNT:
+        return None
+      value = fold_binop(ast.Add(), value, step)
+    return Induction(name, start, step, trip_count)
+
+  #### Unrolling ####
+  def substituted(self, body : list, induction : Induction, iteration : int) -> list:
+    '''Copy of the body for one iteration with the variable replaced by its value'''
+    substituter = Substituter(induction.name, induction.value(iteration))
+    return [substituter.visit(copy.deepcopy(statement)) for statement in body[:-1]]
+
+  def assign(self, name : str, value : int, node) -> ast.Assign:
+    target = ast.Name(id=name, ctx=ast.Store())
+    return ast.copy_location(ast.Assign(targets=[target], value=ast.Constant(value=value)), node)
+
+  def unroll(self, node : ast.While, induction : Induction) -> list:
+    trip_count = induction.trip_count
+    body_size = sum(size(statement) for statement in node.body)
+
+    # Tiny loops become straight-line code
+    if trip_count <= self.full_limit and trip_count * body_size <= self.max_size:
+      statements = []
+      for iteration in range(trip_count):
+        statements += self.substituted(node.body, induction, iteration)
+      statements.append(self.assign(induction.name, induction.value(trip_count), node))
+      return statements
+    if self.factor < 2 or trip_count < self.factor or self.factor * body_size > self.max_size:
+      return [node]
+
+    # The main loop runs whole groups of iterations and stops exactly where the remainder starts
+    groups = trip_count // self.factor
+    end = induction.value(groups * self.factor)
+    op = ast.Lt() if induction.step > 0 else ast.Gt()
+    test = ast.Compare(left=ast.Name(id=induction.name, ctx=ast.Load()), ops=[op],
+                       comparators=[ast.Constant(value=end)])
+    body = []
+    for _ in range(self.factor):
+      body += copy.deepcopy(node.body)
+    loop = ast.copy_location(ast.While(test=test, body=body, orelse=[]), node)
+
+    # The few remaining iterations are straight-line code
+    statements = [loop]
+    for iteration in range(groups * self.factor, trip_count):
+      statements += self.substituted(node.body, induction, iteration)
+    if trip_count % self.factor:
+      statements.append(self.assign(induction.name, induction.value(trip_count), node))
+    return statements
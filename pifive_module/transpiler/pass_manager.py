@@ -0,0 +1,139 @@
+import time
+from .peephole import Peephole
+from .strength_reducer import StrengthReducer
+from .inliner import Inliner
+from .loop_unroller import LoopUnroller
+from .ir_optimizer import IROptimizer
+from .call_evaluator import CallEvaluator
+from .scheduler import Scheduler
+from .cost_model import CostModel
+
+# Passes over the ast, in the order they run
+AST_PASSES = ['inline', 'fold', 'evaluate', 'unroll', 'dce', 'licm', 'strength']
+
+# Code generation choices, all but "registers" need register mode and turn it on. The analyses
+# "globals" and "bounds" come before "ir" and "ssa", which is the order their steps run in
+CODEGEN_PASSES = ['registers', 'linear-scan', 'globals', 'bounds', 'ir', 'ssa', 'callee-saved', 'leaf', 'tail', 'fuse',
+                  'immediates', 'branchless', 'rotate', 'align']
+
+# Passes over the finished assembly
+ASM_PASSES = ['peephole', 'schedule']
+
+PASSES = AST_PASSES + CODEGEN_PASSES + ASM_PASSES
+
+# Passes leaving work for an earlier one, which runs again right after them when it's selected
+FOLLOW_UPS = {
+  'evaluate' : 'fold',
+  'unroll' : 'fold'
+}
+
+# The keyword argument of RISCV_Transpiler that turns on each pass, with how to make its value for a core,
+# or None for a plain flag. "registers" has none of its own, stack mode is off whenever any code generation pass is on
+OPTIONS = {
+  'inline' : ('inliner', lambda core: Inliner()),
+  'fold' : ('fold_constants', None),
+  'evaluate' : ('call_evaluator', lambda core: CallEvaluator()),
+  'unroll' : ('unroller', lambda core: LoopUnroller()),
+  'dce' : ('eliminate_dead_code', None),
+  'licm' : ('hoist_invariants', None),
+  'strength' : ('strength_reducer', lambda core: StrengthReducer()),
+  'linear-scan' : ('linear_scan', None),
+  'globals' : ('global_data', None),
+  'bounds' : ('elide_bounds_checks', None),
+  'ir' : ('ir', None),
+  'ssa' : ('ir_optimizer', lambda core: IROptimizer()),
+  'callee-saved' : ('callee_saved', None),
+  'leaf' : ('leaf_functions', None),
+  'tail' : ('tail_calls', None),
+  'fuse' : ('fuse_branches', None),
+  'immediates' : ('immediates', None),
+  'branchless' : ('branchless_compares', None),
+  'rotate' : ('rotate_loops', None),
+  'align' : ('align_loops', lambda core: 3),
+  'peephole' : ('peephole', lambda core: Peephole()),
+  'schedule' : ('scheduler', lambda core: Scheduler(CostModel(core)))
+}
+
+LEVEL_1 = ['registers', 'fold', 'dce', 'callee-saved', 'leaf', 'fuse', 'immediates', 'branchless', 'globals', 'bounds',
+           'peephole']
+
+LEVELS = {
+  '0' : [],
+  '1' : LEVEL_1,
+  '2' : LEVEL_1 + ['inline', 'evaluate', 'unroll', 'licm', 'strength', 'tail', 'rotate', 'schedule'],
+  # Only passes that don't grow the code
+  's' : LEVEL_1 + ['evaluate', 'licm', 'tail', 'schedule']
+}
+
+def select_passes(level : str = '0', passes : str = None) -> list:
+  '''Names of the passes of an optimization level, changed by a list like "-unroll,+linear-scan"'''
+  if level not in LEVELS:
+    raise RuntimeError(f'Unknown optimization level "{level}", expected one of {", ".join(LEVELS)}.')
+  selected = list(LEVELS[level])
+  for item in (passes or "").split(','):
+    item = item.strip()
+    if not item:
+      continue
+    name = item.lstrip('+-')
+    if name not in PASSES:
+      raise RuntimeError(f'Unknown pass "{name}", expected one of {", ".join(PASSES)}.')
+    if item.startswith('-'):
+      selected = [selected_name for selected_name in selected if selected_name != name]
+    elif name not in selected:
+      selected.append(name)
+  return [name for name in PASSES if name in selected]
+
+def transpiler_options(passes : list, core : str = 'u74') -> dict:
+  '''Keyword arguments of RISCV_Transpiler that turn on the named passes, scheduling for the given core'''
+  passes = set(passes)
+  if 'ssa' in passes:
+    passes.add('ir')
+  # Both allocators place variables that live across calls by themselves
+  if 'linear-scan' in passes or 'ir' in passes:
+    passes.discard('callee-saved')
+  if 'ir' in passes:
+    passes.discard('linear-scan')
+
+  options = {'stack_mode' : not (passes & set(CODEGEN_PASSES))}
+  for name, (option, make) in OPTIONS.items():
+    if make is None:
+      options[option] = name in passes
+    else:
+      options[option] = make(core) if name in passes else None
+  return options
+
+class PassManager:
+  '''Runs the steps of a transpilation, keeping the time spent in each'''
+  def __init__(self):
+    self.timings = {}
+    self.steps = {}
+
+  def register(self, name : str, step):
+    '''Set the step run for a pass, which takes the program and returns it changed'''
+    if name not in PASSES:
+      raise RuntimeError(f'Unknown pass "{name}", expected one of {", ".join(PASSES)}.')
+    self.steps[name] = step
+
+  def run_passes(self, passes, program):
+    '''Run the registered steps of the passes in the order of PASSES, each on the result of the one before'''
+    for name in PASSES:
+      if name not in passes or name not in self.steps:
+        continue
+      program = self.run(name, self.steps[name], program)
+      follow_up = FOLLOW_UPS.get(name)
+      if follow_up in passes and follow_up in self.steps:
+        program = self.run(follow_up, self.steps[follow_up], program)
+    return program
+
+  def run(self, name : str, step, *args):
+    start = time.perf_counter()
+    result = step(*args)
+    self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+    return result
+
+  def report(self) -> list:
+    '''One line per step with its time in milliseconds, then the total'''
+    width = max([len(name) for name in self.timings] + [len("total")])
+    lines = [f"{name:<{width}} {seconds * 1000:8.3f} ms" for name, seconds in self.timings.items()]
+    lines.append(f"{'total':<{width}} {sum(self.timings.values()) * 1000:8.3f} ms")
+    return lines
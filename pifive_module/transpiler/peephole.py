@@ -0,0 +1,150 @@
+from .assembly import AsmLine, parse
+from .instruction_maker import InstructionMaker
+
+class Peephole:
+  '''Rewrites short windows of the instruction buffer into cheaper equivalents'''
+  RULES = ['push_pop', 'merge_sp', 'self_move', 'jump_next']
+
+  def __init__(self, rules : list = None):
+    self.rules = list(Peephole.RULES) if rules is None else list(rules)
+    for rule in self.rules:
+      if rule not in Peephole.RULES:
+        raise RuntimeError(f'Unknown peephole rule "{rule}".')
+
+  def run(self, instr : InstructionMaker):
+    instr.instr_buffer = self.optimize(instr.instr_buffer)
+
+  def optimize(self, buffer : list) -> list:
+    '''Apply the enabled rules in passes over the whole buffer until none of them changes it'''
+    lines = parse(buffer)
+    changed = True
+    while changed:
+      changed = False
+      # Every rule rewrites all the windows it matches in one sweep, a rewrite can expose more for the next pass
+      for rule in self.rules:
+        rewritten = getattr(self, 'rule_' + rule)(lines)
+        if rewritten is not None:
+          lines = rewritten
+          changed = True
+    return [line.text for line in lines]
+
+  #### Helpers ####
+  def code_indices(self, lines : list) -> list:
+    '''Indices of all lines that are not comments or blank'''
+    return [i for i, line in enumerate(lines) if line.is_code()]
+
+  def is_sp_adjust(self, line : AsmLine) -> bool:
+    return line.op == 'addi' and line.operands[:2] == ['sp', 'sp']
+
+  def rebuild(self, lines : list, dropped : set, replacement : dict = None) -> list:
+    '''Copy of lines without the dropped indices and with replaced lines swapped in, or None if nothing changes'''
+    replacement = replacement or {}
+    if not dropped and not replacement:
+      return None
+    rebuilt = []
+    for i, line in enumerate(lines):
+      if i in dropped:
+        continue
+      rebuilt.append(replacement.get(i, line))
+    return rebuilt
+
+  def is_transparent(self, line : AsmLine) -> bool:
+    '''Instruction which neither touches the stack nor leaves the block'''
+    return (line.is_instruction() and not line.is_memory() and not line.is_control()
+            and not line.touches('sp'))
+
+  #### Rules ####
+  def rule_push_pop(self, lines : list):
+    '''addi sp,-8; sd X; ...; ld Y; addi sp,8 -> mv Y, X'''
+    code = self.code_indices(lines)
+    dropped, replacement = set(), {}
+    for k in range(len(code) - 1):
+      pop, release = lines[code[k]], lines[code[k + 1]]
+      if pop.op != 'ld' or pop.operands[1] != '0(sp)':
+        continue
+      if not self.is_sp_adjust(release) or release.operands[2] != '8':
+        continue
+
+      # Walk back over instructions that leave the stack alone to find the push
+      j = k - 1
+      while j >= 0 and self.is_transparent(lines[code[j]]):
+        j -= 1
+      if j < 0:
+        continue
+      push = lines[code[j]]
+      if push.op != 'sd' or push.operands[1] != '0(sp)':
+        continue
+      src, dst = push.operands[0], pop.operands[0]
+
+      # Copy at the pop if the pushed register is left alone until then,
+      # otherwise copy at the push if the popped register is left alone instead
+      between = [lines[code[m]] for m in range(j + 1, k)]
+      if not any(src in line.defs() for line in between):
+        copy_at = code[k]
+      elif not any(line.touches(dst) for line in between):
+        copy_at = code[j]
+      else:
+        continue
+
+      i = j - 1
+      while i >= 0 and self.is_transparent(lines[code[i]]):
+        i -= 1
+      if i < 0:
+        continue
+      reserve = lines[code[i]]
+      if not self.is_sp_adjust(reserve) or reserve.operands[2] != '-8':
+        continue
+
+      window = [code[i], code[j], code[k], code[k + 1]]
+      if any(index in dropped or index in replacement for index in window):
+        continue
+      dropped.update(window)
+      if src != dst:
+        dropped.remove(copy_at)
+        replacement[copy_at] = AsmLine(f"\tmv {dst}, {src}")
+    return self.rebuild(lines, dropped, replacement)
+
+  def rule_merge_sp(self, lines : list):
+    '''addi sp,sp,a; addi sp,sp,b -> addi sp,sp,a+b'''
+    dropped, replacement = set(), {}
+    # Index and amount of the adjustment the ones right after it are merged into
+    run = None
+    for i in self.code_indices(lines):
+      if not self.is_sp_adjust(lines[i]):
+        run = None
+        continue
+      amount = int(lines[i].operands[2])
+      if run is None or not -2048 <= run[1] + amount <= 2047:
+        run = (i, amount)
+        continue
+      first, total = run[0], run[1] + amount
+      dropped.add(i)
+      if total == 0:
+        dropped.add(first)
+        replacement.pop(first, None)
+        run = None
+      else:
+        replacement[first] = AsmLine(f"\taddi sp, sp, {total}")
+        run = (first, total)
+    return self.rebuild(lines, dropped, replacement)
+
+  def rule_self_move(self, lines : list):
+    '''mv x, x -> nothing'''
+    return self.rebuild(lines, set(i for i, line in enumerate(lines)
+                                   if line.op == 'mv' and line.operands[0] == line.operands[1]))
+
+  def rule_jump_next(self, lines : list):
+    '''j L; L: -> L:'''
+    code = self.code_indices(lines)
+    dropped = set()
+    for k, i in enumerate(code):
+      if lines[i].op != 'j':
+        continue
+      target = lines[i].operands[0]
+      m = k + 1
+      while m < len(code) and lines[code[m]].label is not None:
+        if lines[code[m]].label == target:
+          dropped.add(i)
+          break
+        m += 1
+    return self.rebuild(lines, dropped)
@@ -0,0 +1,42 @@
+import ast
+
+def declared_globals(node) -> set:
+  '''Names of "global" declarations anywhere in the node'''
+  return set(name for child in ast.walk(node) if isinstance(child, ast.Global) for name in child.names)
+
+def local_names(node : ast.FunctionDef) -> set:
+  '''Parameters and every name the function assigns, except the ones it declares global'''
+  names = set(arg.arg for arg in node.args.args)
+  for child in ast.walk(node):
+    if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+      names.add(child.id)
+  return names - declared_globals(node)
+
+def is_pure(node : ast.FunctionDef, pure : set) -> bool:
+  '''Checks if the function only reads its own names and only calls functions in pure'''
+  if declared_globals(node):
+    return False
+  names = local_names(node)
+  callees = []
+  for child in ast.walk(node):
+    if isinstance(child, ast.Call):
+      if not isinstance(child.func, ast.Name) or child.func.id not in pure:
+        return False
+      callees.append(child.func)
+  return all(child.id in names for child in ast.walk(node)
+             if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load) and child not in callees)
+
+def pure_functions(module : ast.Module) -> set:
+  '''Names of module-level functions whose result depends on nothing but their arguments'''
+  functions = {node.name : node for node in module.body if isinstance(node, ast.FunctionDef)}
+
+  # Start from everything and drop functions until only provably pure ones are left
+  pure = set(functions)
+  changed = True
+  while changed:
+    changed = False
+    for name in sorted(pure):
+      if not is_pure(functions[name], pure):
+        pure.remove(name)
+        changed = True
+  return pure
@@ -67,6 +67,12 @@ class RegType(Enum):
     Reg.a7
   ]
 
+class VirtualReg:
+  '''Placeholder register which the allocator later maps to a physical one'''
+  def __init__(self, number : int):
+    self.number = number
+    self.name = f"v{number}"
+
 def print_reg_type_info(reg_type : RegType):
   print(f"\"{reg_type.name}\" info:")
   for reg in reg_type.value:
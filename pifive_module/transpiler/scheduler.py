@@ -0,0 +1,117 @@
+from .assembly import AsmLine, LineKind, LOADS, STORES, parse, split_memory
+from .cost_model import CostModel
+from .instruction_maker import InstructionMaker
+
+class Node:
+  '''An instruction of a region with the comments written just before it'''
+  def __init__(self, index : int, lines : list, line : AsmLine):
+    self.index = index
+    self.lines = lines
+    self.line = line
+    self.preds = {}
+    self.succs = {}
+    self.priority = 0
+
+class Scheduler:
+  '''List scheduling of straight-line code for an in-order core, using the latencies of a cost model'''
+  def __init__(self, cost_model : CostModel = None):
+    self.cost_model = cost_model or CostModel()
+
+  def run(self, instr : InstructionMaker):
+    instr.instr_buffer = self.schedule(instr.instr_buffer)
+
+  def schedule(self, lines : list) -> list:
+    '''Reorder the instructions between labels, directives, calls and control transfers'''
+    out = []
+    region = []
+    comments = []
+    for line in parse(lines):
+      if line.kind in (LineKind.comment, LineKind.blank):
+        comments.append(line.text)
+      elif line.is_instruction() and not line.is_control():
+        region.append(Node(len(region), comments + [line.text], line))
+        comments = []
+      else:
+        # Anything else stays in place and ends the region before it
+        out += self.schedule_region(region) + comments + [line.text]
+        region, comments = [], []
+    return out + self.schedule_region(region) + comments
+
+  #### Dependencies ####
+  def memory_access(self, line : AsmLine, base_writes : dict):
+    '''Base register, version of its value and offset of a load or store'''
+    offset, base = split_memory(line.operands[1])
+    return base, base_writes.get(base, 0), offset
+
+  def independent(self, first, second) -> bool:
+    '''Checks if two memory accesses can't overlap: same base value, doublewords at different offsets'''
+    return first[0] == second[0] and first[1] == second[1] and abs(first[2] - second[2]) >= 8
+
+  def build(self, region : list):
+    def depend(pred : Node, succ : Node, latency : int):
+      if pred.succs.get(succ.index, -1) < latency:
+        pred.succs[succ.index] = latency
+        succ.preds[pred.index] = latency
+
+    last_def = {}
+    uses_since = {}
+    base_writes = {}
+    accesses = []
+    for node in region:
+      line = node.line
+      uses, defs = line.uses(), line.defs()
+      # Read after write waits for the result, write after write and write after read only keep their order
+      for reg in uses:
+        if reg in last_def:
+          depend(last_def[reg], node, self.cost_model.cost(last_def[reg].line.op))
+      for reg in defs:
+        if reg in last_def:
+          depend(last_def[reg], node, 1)
+        for reader in uses_since.get(reg, []):
+          if reader is not node:
+            depend(reader, node, 0)
+
+      if line.op in LOADS or line.op in STORES:
+        access = self.memory_access(line, base_writes)
+        for other, other_access in accesses:
+          if (line.op in STORES or other.line.op in STORES) and not self.independent(access, other_access):
+            depend(other, node, self.cost_model.cost(other.line.op) if other.line.op in STORES else 0)
+        accesses.append((node, access))
+
+      for reg in uses:
+        uses_since.setdefault(reg, []).append(node)
+      for reg in defs:
+        last_def[reg] = node
+        uses_since[reg] = []
+        base_writes[reg] = base_writes.get(reg, 0) + 1
+
+  def prioritize(self, region : list):
+    '''Longest latency path from each instruction to the end of the region'''
+    for node in reversed(region):
+      node.priority = max([latency + region[succ].priority for succ, latency in node.succs.items()]
+                          + [self.cost_model.cost(node.line.op)])
+
+  #### Scheduling ####
+  def schedule_region(self, region : list) -> list:
+    if len(region) < 2:
+      return [text for node in region for text in node.lines]
+    self.build(region)
+    self.prioritize(region)
+
+    waiting = {node.index : len(node.preds) for node in region}
+    earliest = {node.index : 0 for node in region}
+    ready = [node for node in region if not node.preds]
+    cycle = 0
+    out = []
+    while ready:
+      # Prefer what can issue now, then the longest path to the end, then the original order
+      node = min(ready, key=lambda node: (max(earliest[node.index] - cycle, 0), -node.priority, node.index))
+      ready.remove(node)
+      cycle = max(cycle, earliest[node.index]) + 1
+      out += node.lines
+      for succ, latency in node.succs.items():
+        earliest[succ] = max(earliest[succ], cycle - 1 + latency)
+        waiting[succ] -= 1
+        if waiting[succ] == 0:
+          ready.append(region[succ])
+    return out
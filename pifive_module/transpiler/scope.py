@@ -14,9 +14,14 @@ class Scope:
     self.scope_num = 0
     self.locals_count = locals_count
 
+    # Nested scopes of a function hand out stack offsets after their parent's
+    self.offset_base = 0
+
     if parent:
       self.scope_num = self.parent.num_children + 1
       self.parent.num_children += 1
+      if self.name == self.parent.name:
+        self.offset_base = self.parent.offset_base + self.parent.slot_count()
 
   def get_next_label_number(self):
     self._label_counter += 1
@@ -27,13 +32,21 @@ class Scope:
     try:
       self.lookup_var(var.name)
     except:
-      var.offset = len(self._variables)
+      var.offset = self.offset_base + self.slot_count()
       self._variables[var.name] = var
 
   def add_vars(self, vars : list):
     for var in vars:
       self.add_var(var)
 
+  def add_global(self, var : Variable):
+    '''Adds a variable living at a data label, hiding any variable of that name in the enclosing scopes'''
+    self._variables[var.name] = var
+
+  def slot_count(self) -> int:
+    '''Stack slots of the variables in this scope, globals and arrays are placed elsewhere'''
+    return len([var for var in self._variables.values() if var.label is None and var.size is None])
+
   def lookup_var(self, var_name : str) -> Variable:
     if var_name in self._variables:
       return self._variables[var_name]
@@ -50,11 +63,27 @@ class Scope:
     else:
       return False
 
+  def in_local_scope(self, var_name : str) -> bool:
+    '''Checks only the scopes belonging to the current function'''
+    if var_name in self._variables:
+      return True
+    elif self.parent is not None and self.name == self.parent.name:
+      return self.parent.in_local_scope(var_name)
+    else:
+      return False
+
+  def function_vars(self) -> list:
+    '''Variables of this scope and the enclosing scopes of the same function'''
+    vars = list(self._variables.values())
+    if self.parent is not None and self.name == self.parent.name:
+      vars += self.parent.function_vars()
+    return vars
+
   def deactivate_regs(self, reg_pool : RegPool):
     '''Deacvtivates the registers of all variables in the current scope, and return those registers.'''
     regs = []
     for var in self._variables.values():
-      if var.reg is not None:
+      if var.reg is not None and var.reg_active:
         regs.append(var.reg)
         var.reg_active = False
         reg_pool.free_reg(var.reg)
@@ -74,17 +103,18 @@ class Scope:
 
     return active_vars
 
-  def get_next_var(self, reg_type : RegType):
-    '''Returns the next available variable in the current scope'''
+  def get_next_var(self, reg_type : RegType, exclude : list = None):
+    '''Returns the next available variable in the current scope whose register is not excluded'''
+    exclude = exclude or []
     # First check the immediate scope
     for var in self._variables.values():
       if var.reg_active:
-        if var.reg in reg_type.value:
+        if var.reg in reg_type.value and var.reg not in exclude:
           return var
  
     # Then check the parent scope
-    if self.name == self.parent.name:
-      return self.parent.get_next_var()
+    if self.parent is not None and self.name == self.parent.name:
+      return self.parent.get_next_var(reg_type, exclude)
 
     # If all else fails throw an exception
     raise RuntimeError('No available variables in current scope!')
@@ -95,6 +125,14 @@ class Scope:
     else:
       raise RuntimeError(f'Function "{name}" already exists in the current scope!')
 
+  def in_scope_func(self, name : str) -> bool:
+    if name in self._functions:
+      return True
+    elif self.parent is not None:
+      return self.parent.in_scope_func(name)
+    else:
+      return False
+
   def lookup_func(self, name : str) -> Function:
     if name in self._functions:
       return self._functions[name]
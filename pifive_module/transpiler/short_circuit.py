@@ -0,0 +1,68 @@
+import ast
+import copy
+from .constant_folder import int_value
+from .loop_invariant import has_call
+
+def is_boolean(node) -> bool:
+  '''Checks if an expression can only be 0 or 1'''
+  if isinstance(node, ast.Compare):
+    return True
+  elif isinstance(node, ast.UnaryOp):
+    return isinstance(node.op, ast.Not)
+  elif isinstance(node, ast.BoolOp):
+    return all(is_boolean(value) for value in node.values)
+  elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+    return is_boolean(node.left) or is_boolean(node.right)
+  elif isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitOr, ast.BitXor)):
+    return is_boolean(node.left) and is_boolean(node.right)
+  return int_value(node) in (0, 1)
+
+def decider(node : ast.BoolOp) -> bool:
+  '''Truth value of the operand that decides the result: false for "and", true for "or"'''
+  return isinstance(node.op, ast.Or)
+
+def negation(node : ast.UnaryOp) -> ast.Compare:
+  '''"not x" as the comparison "x == 0"'''
+  return ast.copy_location(ast.Compare(left=node.operand, ops=[ast.Eq()], comparators=[ast.Constant(value=0)]), node)
+
+def binop(left, op, right) -> ast.BinOp:
+  return ast.BinOp(left=left, op=op, right=right)
+
+def compare_zero(node, op) -> ast.Compare:
+  return ast.Compare(left=node, ops=[op], comparators=[ast.Constant(value=0)])
+
+def and_form(left, right):
+  '''left & right, with left widened to a mask of all ones when true'''
+  if is_boolean(left) and is_boolean(right):
+    return binop(left, ast.BitAnd(), right)
+  elif is_boolean(right):
+    return binop(compare_zero(left, ast.NotEq()), ast.BitAnd(), right)
+  elif is_boolean(left):
+    return binop(binop(ast.Constant(value=0), ast.Sub(), left), ast.BitAnd(), right)
+  mask = binop(ast.Constant(value=0), ast.Sub(), compare_zero(left, ast.NotEq()))
+  return binop(mask, ast.BitAnd(), right)
+
+def or_form(left, right):
+  '''left | right, with right masked out when left is true, or None if left would be computed twice'''
+  if is_boolean(left) and is_boolean(right):
+    return binop(left, ast.BitOr(), right)
+  if not isinstance(left, (ast.Name, ast.Constant)):
+    return None
+  mask = binop(ast.Constant(value=0), ast.Sub(), compare_zero(copy.copy(left), ast.Eq()))
+  return binop(left, ast.BitOr(), binop(mask, ast.BitAnd(), right))
+
+def has_subscript(node) -> bool:
+  return any(isinstance(child, ast.Subscript) for child in ast.walk(node))
+
+def bitwise_form(node : ast.BoolOp):
+  '''The value of "and"/"or" computed without branches, or None if an operand that may be skipped
+  has calls or subscripts, which must not run then, a subscript's bounds check may abort'''
+  if any(has_call(value) or has_subscript(value) for value in node.values[1:]):
+    return None
+  form = and_form if isinstance(node.op, ast.And) else or_form
+  result = node.values[0]
+  for value in node.values[1:]:
+    result = form(result, value)
+    if result is None:
+      return None
+  return ast.fix_missing_locations(ast.copy_location(result, node))
@@ -0,0 +1,333 @@
+from .ir import Temp, Copy, Jump, Branch, Phi, BasicBlock, IRFunction
+
+def is_variable(temp : Temp) -> bool:
+  '''Program variables, as opposed to the single-assignment temporaries of expressions'''
+  return not temp.name.startswith('%')
+
+def new_temp(function : IRFunction) -> Temp:
+  '''A temporary not yet used in the function'''
+  numbers = [int(temp.name[1:]) for instr in function.instructions() for temp in instr.uses() + instr.defs()
+             if temp.name[1:].isdigit() and temp.name.startswith('%')]
+  return Temp(f"%{max(numbers, default=0) + 1}")
+
+def rename(function : IRFunction, mapping : dict):
+  '''Replace temporaries everywhere in the function, definitions included'''
+  function.params = [mapping.get(param, param) for param in function.params]
+  for instr in function.instructions():
+    instr.replace_uses(mapping)
+    if instr.dest is not None:
+      instr.dest = mapping.get(instr.dest, instr.dest)
+
+#### Dominance ####
+def reverse_postorder(function : IRFunction) -> list:
+  succs = function.successors()
+  order = []
+  visited = set()
+  stack = [(function.blocks[0].label, iter(succs[function.blocks[0].label]))]
+  visited.add(function.blocks[0].label)
+  while stack:
+    label, children = stack[-1]
+    child = next(children, None)
+    if child is None:
+      order.append(label)
+      stack.pop()
+    elif child not in visited:
+      visited.add(child)
+      stack.append((child, iter(succs[child])))
+  return list(reversed(order))
+
+def dominators(function : IRFunction) -> dict:
+  '''Immediate dominator of every block, None for the entry (Cooper, Harvey and Kennedy)'''
+  order = reverse_postorder(function)
+  index = {label : i for i, label in enumerate(order)}
+  preds = function.predecessors()
+  entry = order[0]
+  idom = {entry : entry}
+
+  def intersect(a, b):
+    while a != b:
+      while index[a] > index[b]:
+        a = idom[a]
+      while index[b] > index[a]:
+        b = idom[b]
+    return a
+
+  changed = True
+  while changed:
+    changed = False
+    for label in order[1:]:
+      done = [pred for pred in preds[label] if pred in idom]
+      new = done[0]
+      for pred in done[1:]:
+        new = intersect(pred, new)
+      if idom.get(label) != new:
+        idom[label] = new
+        changed = True
+  idom[entry] = None
+  return idom
+
+def dominates(idom : dict, a : str, b : str) -> bool:
+  while b is not None and b != a:
+    b = idom[b]
+  return b == a
+
+def dominator_tree(idom : dict) -> dict:
+  children = {label : [] for label in idom}
+  for label, parent in idom.items():
+    if parent is not None:
+      children[parent].append(label)
+  return children
+
+def dominance_frontiers(function : IRFunction, idom : dict) -> dict:
+  frontiers = {label : set() for label in idom}
+  for label, preds in function.predecessors().items():
+    if len(preds) < 2:
+      continue
+    for pred in preds:
+      runner = pred
+      while runner != idom[label]:
+        frontiers[runner].add(label)
+        runner = idom[runner]
+  return frontiers
+
+#### Liveness ####
+def liveness(function : IRFunction):
+  '''Temporaries live into and out of every block, with phi arguments live out of their predecessor'''
+  succs = function.successors()
+  gen, kill = {}, {}
+  for block in function.blocks:
+    used, defined = set(), set()
+    for instr in block.instrs:
+      if not isinstance(instr, Phi):
+        used |= set(instr.uses()) - defined
+      defined |= set(instr.defs())
+    gen[block.label], kill[block.label] = used, defined
+
+  live_in = {block.label : set() for block in function.blocks}
+  live_out = {block.label : set() for block in function.blocks}
+  changed = True
+  while changed:
+    changed = False
+    for block in reversed(function.blocks):
+      out = set()
+      for succ in succs[block.label]:
+        phis = function.block(succ).phis()
+        out |= live_in[succ] - set(phi.dest for phi in phis)
+        out |= set(arg for phi in phis for arg in [phi.incoming(block.label)] if isinstance(arg, Temp))
+      live = gen[block.label] | (out - kill[block.label])
+      if out != live_out[block.label] or live != live_in[block.label]:
+        live_out[block.label], live_in[block.label] = out, live
+        changed = True
+  return live_in, live_out
+
+def interference(function : IRFunction) -> dict:
+  '''Pairs of temporaries that hold a value at the same time, as a set of neighbours for each'''
+  graph = {}
+  def interfere(defined, live):
+    for temp in defined:
+      for other in live:
+        if other != temp:
+          graph.setdefault(temp, set()).add(other)
+          graph.setdefault(other, set()).add(temp)
+
+  live_in, live_out = liveness(function)
+  for block in function.blocks:
+    live = set(live_out[block.label])
+    phis = block.phis()
+    for instr in reversed(block.instrs[len(phis):]):
+      interfere(instr.defs(), live)
+      live = (live - set(instr.defs())) | set(instr.uses())
+    # Phis and the values entering the function are all defined at the top at once
+    defined = [phi.dest for phi in phis]
+    if block is function.blocks[0]:
+      defined += list(live_in[block.label]) + function.params
+    interfere(defined, live | set(defined))
+  return graph
+
+#### Construction ####
+class SSABuilder:
+  '''Converts a function to pruned SSA form, giving each variable a new version at every assignment'''
+  def __init__(self, function : IRFunction):
+    self.function = function
+    self.idom = dominators(function)
+    self.stacks = {}
+    self.versions = {}
+
+  def build(self):
+    self.insert_phis()
+    self.rename(self.function.blocks[0].label, dominator_tree(self.idom))
+
+  def insert_phis(self):
+    '''Place phis at the iterated dominance frontier of the assignments where the variable is live'''
+    frontiers = dominance_frontiers(self.function, self.idom)
+    live_in, _ = liveness(self.function)
+    preds = self.function.predecessors()
+    def_blocks = {}
+    for block in self.function.blocks:
+      for temp in [temp for instr in block.instrs for temp in instr.defs() if is_variable(temp)]:
+        def_blocks.setdefault(temp, set()).add(block.label)
+
+    for var, blocks in def_blocks.items():
+      placed = set()
+      work = list(blocks)
+      while work:
+        for label in frontiers[work.pop()]:
+          if label in placed or var not in live_in[label]:
+            continue
+          placed.add(label)
+          block = self.function.block(label)
+          block.instrs.insert(0, Phi(var, preds[label], [var] * len(preds[label])))
+          if label not in blocks:
+            work.append(label)
+
+  def current(self, var : Temp) -> Temp:
+    '''Latest version of a variable, or the variable itself for its value on entry'''
+    stack = self.stacks.get(var)
+    return stack[-1] if stack else var
+
+  def new_version(self, var : Temp) -> Temp:
+    self.versions[var] = self.versions.get(var, 0) + 1
+    version = Temp(f"{var.name}.{self.versions[var]}")
+    self.stacks.setdefault(var, []).append(version)
+    return version
+
+  def rename(self, label : str, tree : dict):
+    # Walk the dominator tree with an explicit stack, popping versions on the way back up
+    work = [(label, None)]
+    while work:
+      label, pushed = work.pop()
+      if pushed is not None:
+        for var in pushed:
+          self.stacks[var].pop()
+        continue
+      block = self.function.block(label)
+      pushed = []
+      for instr in block.instrs:
+        if not isinstance(instr, Phi):
+          instr.replace_uses({temp : self.current(temp) for temp in instr.uses() if is_variable(temp)})
+        if instr.dest is not None and is_variable(instr.dest):
+          pushed.append(instr.dest)
+          instr.dest = self.new_version(instr.dest)
+      for succ in block.successors():
+        for phi in self.function.block(succ).phis():
+          var = phi.incoming(label)
+          if isinstance(var, Temp) and is_variable(var):
+            phi.set_incoming(label, self.current(var))
+      work.append((label, pushed))
+      work += [(child, None) for child in reversed(tree[label])]
+
+def to_ssa(function : IRFunction):
+  SSABuilder(function).build()
+
+#### Destruction ####
+def sequentialize(copies : list, scratch : Temp) -> list:
+  '''Order parallel copies given as (dest, src) so no source is overwritten before it is read'''
+  pending = [(dest, src) for dest, src in copies if dest != src]
+  out = []
+  while pending:
+    sources = [src for _, src in pending]
+    ready = [copy for copy in pending if copy[0] not in sources]
+    if ready:
+      dest, src = ready[0]
+      pending.remove(ready[0])
+      out.append(Copy(dest, src))
+    else:
+      # Every destination is still read, so there is a cycle: save one of them first
+      dest = pending[0][0]
+      out.append(Copy(scratch, dest))
+      pending = [(d, scratch if s == dest else s) for d, s in pending]
+  return out
+
+class SSADestructor:
+  '''Leaves SSA form, merging the versions of phis that never hold different values at the same time'''
+  def __init__(self, function : IRFunction):
+    self.function = function
+    self.parent = {}
+
+  def find(self, temp : Temp) -> Temp:
+    while self.parent.get(temp, temp) != temp:
+      temp = self.parent[temp]
+    return temp
+
+  def destruct(self):
+    self.coalesce()
+    self.insert_copies()
+
+  def coalesce(self):
+    graph = interference(self.function)
+    temps = []
+    for temp in self.function.params + [temp for instr in self.function.instructions() for temp in instr.defs() + instr.uses()]:
+      if temp not in temps:
+        temps.append(temp)
+    members = {temp : {temp} for temp in temps}
+
+    def union(a, b):
+      a, b = self.find(a), self.find(b)
+      if a == b or any(graph.get(temp, set()) & members[b] for temp in members[a]):
+        return
+      self.parent[b] = a
+      members[a] |= members.pop(b)
+
+    for phi in [phi for block in self.function.blocks for phi in block.phis()]:
+      for arg in phi.args:
+        if isinstance(arg, Temp):
+          union(phi.dest, arg)
+
+    # Then the other versions of each variable, so the allocator sees fewer live ranges
+    versions = {}
+    for temp in temps:
+      if is_variable(temp):
+        versions.setdefault(temp.name.split('.')[0], []).append(temp)
+    for group in versions.values():
+      for temp in group[1:]:
+        union(group[0], temp)
+
+    # Name every group after its variable where no other group uses that name
+    mapping = {}
+    taken = set()
+    for root, group in members.items():
+      base = Temp(root.name.split('.')[0])
+      name = base if (base in group or base not in temps) and base not in taken else root
+      taken.add(name)
+      for temp in group:
+        mapping[temp] = name
+    rename(self.function, mapping)
+
+  def insert_copies(self):
+    '''Replace the phis left by copies at the end of each predecessor, splitting critical edges'''
+    succs = self.function.successors()
+    scratch = None
+    for block in list(self.function.blocks):
+      phis = block.phis()
+      if not phis:
+        continue
+      del block.instrs[:len(phis)]
+      for pred in list(set(label for phi in phis for label in phi.labels)):
+        copies = [(phi.dest, phi.incoming(pred)) for phi in phis if phi.dest != phi.incoming(pred)]
+        if not copies:
+          continue
+        if scratch is None:
+          scratch = new_temp(self.function)
+        target = self.function.block(pred)
+        if len(succs[pred]) > 1:
+          target = self.split_edge(target, block.label)
+        target.instrs[-1:-1] = sequentialize(copies, scratch)
+
+  def split_edge(self, pred : BasicBlock, label : str) -> BasicBlock:
+    '''A new block on the edge from pred to the block named label, laid out right after pred'''
+    labels = self.function.labels()
+    count = 1
+    while f"split{count}" in labels:
+      count += 1
+    block = BasicBlock(f"split{count}")
+    block.append(Jump(label))
+    branch : Branch = pred.terminator
+    if branch.if_true == label:
+      branch.if_true = block.label
+    if branch.if_false == label:
+      branch.if_false = block.label
+    self.function.blocks.insert(self.function.blocks.index(pred) + 1, block)
+    return block
+
+def from_ssa(function : IRFunction):
+  SSADestructor(function).destruct()
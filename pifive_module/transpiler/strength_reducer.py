@@ -0,0 +1,70 @@
+import ast
+from .cost_model import CostModel
+from .constant_folder import int_value
+
+def signed_digits(value : int) -> list:
+  '''Canonical signed-digit form of a positive integer as (sign, shift) terms, highest first'''
+  terms = []
+  shift = 0
+  while value:
+    if value & 1:
+      # Runs of ones turn into a single add and subtract
+      digit = 2 - (value & 3)
+      terms.append((digit, shift))
+      value -= digit
+    value >>= 1
+    shift += 1
+  return terms[::-1]
+
+def chain_ops(terms : list, negate : bool) -> list:
+  '''Instructions needed to sum the shifted terms'''
+  ops = ['slli' for _, shift in terms if shift > 0]
+  ops += ['add' if sign > 0 else 'sub' for sign, _ in terms[1:]]
+  if negate:
+    ops.append('sub')
+  return ops
+
+class StrengthReducer(ast.NodeTransformer):
+  '''Rewrites multiplication of a variable by a constant into shifts and adds when cheaper'''
+  def __init__(self, cost_model : CostModel = None):
+    self.cost_model = cost_model or CostModel()
+
+  def shifted(self, name : ast.Name, shift : int, node):
+    operand = ast.copy_location(ast.Name(id=name.id, ctx=ast.Load()), node)
+    if shift == 0:
+      return operand
+    return ast.copy_location(ast.BinOp(left=operand, op=ast.LShift(), right=ast.Constant(value=shift)), node)
+
+  def visit_BinOp(self, node : ast.BinOp):
+    self.generic_visit(node)
+    if not isinstance(node.op, ast.Mult):
+      return node
+
+    # Only a variable can be repeated in the chain without evaluating anything twice
+    if isinstance(node.left, ast.Name) and int_value(node.right) is not None:
+      name, constant = node.left, int_value(node.right)
+    elif isinstance(node.right, ast.Name) and int_value(node.left) is not None:
+      name, constant = node.right, int_value(node.left)
+    else:
+      return node
+
+    if constant == 0:
+      return ast.copy_location(ast.Constant(value=0), node)
+    elif constant == 1:
+      return name
+    elif abs(constant) >= 1 << 63:
+      return node
+
+    # Use the chain only if it beats loading the constant and multiplying
+    terms = signed_digits(abs(constant))
+    chain = chain_ops(terms, constant < 0)
+    if self.cost_model.sequence_cost(chain) >= self.cost_model.sequence_cost(['li', 'mul']):
+      return node
+
+    result = self.shifted(name, terms[0][1], node)
+    for sign, shift in terms[1:]:
+      op = ast.Add() if sign > 0 else ast.Sub()
+      result = ast.copy_location(ast.BinOp(left=result, op=op, right=self.shifted(name, shift, node)), node)
+    if constant < 0:
+      result = ast.copy_location(ast.BinOp(left=ast.Constant(value=0), op=ast.Sub(), right=result), node)
+    return result
@@ -11,15 +11,19 @@ class Symbol:
     self.kind = kind
 
 class Variable(Symbol):
-  def __init__(self, name, type=None, reg=None, offset=None):
+  def __init__(self, name, type=None, reg=None, offset=None, label=None, size=None):
     super().__init__(name, kind=SymbolKind.variable)
     self.type = type
     self.reg : Reg = reg
     self.offset = offset
+    self.label = label # data label of a global, which lives there instead of on the stack
+    self.size = size # number of elements of an array, which is never in a register
     self.reg_active = False
+    self.value = None # known constant value, if any
 
 class Function(Symbol):
-  def __init__(self, name, args, ret_reg=None):
+  def __init__(self, name, args, ret_reg=None, node=None):
     super().__init__(name, kind=SymbolKind.function)
     self.ret : Reg = ret_reg
-    self.args : list[Variable] = args
\ No newline at end of file
+    self.args : list[Variable] = args
+    self.node = node # definition, if known
\ No newline at end of file
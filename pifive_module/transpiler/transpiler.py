@@ -1,34 +1,283 @@
 import ast
 from .scope import Scope, Variable
-from .instruction_maker import InstructionMaker, BinOp, BranchOp
+from .instruction_maker import InstructionMaker, BinOp, BranchOp, ImmOp
 from .register_pool import RegPool
-from .registers import Reg, RegType
+from .registers import Reg, RegType, VirtualReg
 from .symbols import Function
 from .locals_counter import LocalsCounter
+from .peephole import Peephole
+from .constant_folder import ConstantFolder, int_value, wrap
+from .division import is_power_of_two, magic_unsigned
+from .linear_scan import LinearScan
+from .assembly import needs_frame
+from .strength_reducer import StrengthReducer
+from .inliner import Inliner
+from .loop_invariant import LoopInvariantMotion
+from .loop_unroller import LoopUnroller
+from .dead_code import DeadCodeEliminator, always_returns, loaded_names
+from .call_crossing import CallCrossing
+from .ir_lowering import Lowering
+from .ir_backend import IRBackend
+from .ir_optimizer import IROptimizer
+from .call_evaluator import CallEvaluator
+from .scheduler import Scheduler
+from .short_circuit import bitwise_form, decider, negation
+from .global_data import ModuleGlobals, data_label
+from .arrays import MAX_UNROLLED_FILL, ArrayLengths, BoundsChecks, array_size, is_array, offset_form, uses_arrays
+from .pass_manager import PassManager, ASM_PASSES, OPTIONS
+
+BINOPS = {
+  ast.Add : BinOp.ADD,
+  ast.Sub : BinOp.SUB,
+  ast.BitAnd : BinOp.AND,
+  ast.BitOr : BinOp.OR,
+  ast.BitXor : BinOp.XOR,
+  ast.Mult : BinOp.MUL,
+  ast.Div : BinOp.DIV,
+  ast.LShift : BinOp.SLL,
+  ast.RShift : BinOp.SRA
+}
+
+IMMOPS = {
+  BinOp.ADD : ImmOp.ADDI,
+  BinOp.AND : ImmOp.ANDI,
+  BinOp.OR : ImmOp.ORI,
+  BinOp.XOR : ImmOp.XORI,
+  BinOp.SLL : ImmOp.SLLI,
+  BinOp.SRA : ImmOp.SRAI
+}
+
+COMMUTATIVE = [BinOp.ADD, BinOp.AND, BinOp.OR, BinOp.XOR, BinOp.MUL]
+
+def immediate_form(node : ast.BinOp):
+  '''Immediate instruction for a binop with a constant operand as (immop, other operand, imm), or None'''
+  binop : BinOp = BINOPS.get(type(node.op))
+  left, right = int_value(node.left), int_value(node.right)
+  if right is not None and binop == BinOp.SUB:
+    immop, operand, imm = ImmOp.ADDI, node.left, -right
+  elif right is not None and binop in IMMOPS:
+    immop, operand, imm = IMMOPS[binop], node.left, right
+  elif left is not None and binop in IMMOPS and binop in COMMUTATIVE:
+    immop, operand, imm = IMMOPS[binop], node.right, left
+  else:
+    return None
+  return (immop, operand, imm) if immop.fits(imm) else None
+
+def fold(node : ast.Module) -> ast.Module:
+  return ast.fix_missing_locations(ConstantFolder().visit(node))
+
+def is_self_tail_call(node, name : str) -> bool:
+  '''Checks if a statement returns the result of calling the function named name'''
+  return (isinstance(node, ast.Return) and isinstance(node.value, ast.Call)
+          and isinstance(node.value.func, ast.Name) and node.value.func.id == name)
+
+def tail_label(name : str) -> str:
+  return f"{name}_tail"
+
+def slti_form(node : ast.Compare):
+  '''Operand and immediate for a comparison that is a single slti, or None'''
+  op = node.ops[0]
+  left, right = int_value(node.left), int_value(node.comparators[0])
+  if right is not None and isinstance(op, (ast.Lt, ast.LtE)):
+    operand, imm = node.left, right if isinstance(op, ast.Lt) else right + 1
+  elif left is not None and isinstance(op, (ast.Gt, ast.GtE)):
+    operand, imm = node.comparators[0], left if isinstance(op, ast.Gt) else left + 1
+  else:
+    return None
+  return (operand, imm) if ImmOp.SLTI.fits(imm) else None
+
+def equality_form(node : ast.Compare):
+  '''Operand and immediate for an equality test against a constant that fits an xori, or None'''
+  if not isinstance(node.ops[0], (ast.Eq, ast.NotEq)):
+    return None
+  left, right = int_value(node.left), int_value(node.comparators[0])
+  if right is not None:
+    operand, imm = node.left, right
+  elif left is not None:
+    operand, imm = node.comparators[0], left
+  else:
+    return None
+  return (operand, imm) if ImmOp.XORI.fits(imm) else None
+
+BRANCHOPS = {
+  ast.Lt : BranchOp.BLT,
+  ast.LtE : BranchOp.BLE,
+  ast.Gt : BranchOp.BGT,
+  ast.GtE : BranchOp.BGE,
+  ast.Eq : BranchOp.BEQ,
+  ast.NotEq : BranchOp.BNE
+}
 
 class RISCV_Transpiler:
-  def __init__(self, comments_on=False):
+  def __init__(self, comments_on=False, peephole : Peephole = None, stack_mode=True, fold_constants=False,
+               linear_scan=False, fuse_branches=False, immediates=False,
+               strength_reducer : StrengthReducer = None, tail_calls=False, leaf_functions=False,
+               inliner : Inliner = None, hoist_invariants=False, rotate_loops=False,
+               align_loops : int = None, unroller : LoopUnroller = None, eliminate_dead_code=False,
+               callee_saved=False, ir=False, ir_optimizer : IROptimizer = None,
+               call_evaluator : CallEvaluator = None, branchless_compares=False,
+               scheduler : Scheduler = None, global_data=False, elide_bounds_checks=False):
+    if linear_scan and stack_mode:
+      raise RuntimeError("Linear scan allocation requires stack_mode off.")
+    if ir and stack_mode:
+      raise RuntimeError("The IR backend requires stack_mode off.")
+    if ir_optimizer and not ir:
+      raise RuntimeError("The IR optimizer requires the IR backend.")
+    if callee_saved and (stack_mode or linear_scan):
+      raise RuntimeError("Callee-saved variables require stack_mode off, linear scan places them by itself.")
+    if global_data and stack_mode:
+      raise RuntimeError("Globals in data sections require stack_mode off.")
     self.scope = Scope()
     self.instr = InstructionMaker(comments_on)
     self.reg_pool = RegPool()
+    self.peephole = peephole
+    self.stack_mode = stack_mode
+    self.fold_constants = fold_constants
+    self.linear_scan = linear_scan
+    self.fuse_branches = fuse_branches
+    self.immediates = immediates
+    self.strength_reducer = strength_reducer
+    self.tail_calls = tail_calls
+    self.leaf_functions = leaf_functions
+    self.inliner = inliner
+    self.hoist_invariants = hoist_invariants
+    self.rotate_loops = rotate_loops
+    self.align_loops = align_loops
+    self.unroller = unroller
+    self.eliminate_dead_code = eliminate_dead_code
+    self.callee_saved = callee_saved
+    self.ir = ir
+    self.ir_optimizer = ir_optimizer
+    self.call_evaluator = call_evaluator
+    self.branchless_compares = branchless_compares
+    self.scheduler = scheduler
+    self.global_data = global_data
+    self.elide_bounds_checks = elide_bounds_checks
+    self.pass_manager = PassManager()
+    self.register_passes()
     self.aliased = {"print" : self.print_routine}
     self.print_label = False
 
+    # Register mode bookkeeping: temporaries owned by an expression, registers holding
+    # operands that must survive evaluating a sibling, the pending operands which may be
+    # spilled to the stack when the temporaries run out, and the ones that were
+    self.anon_regs = []
+    self.pinned = []
+    self.spillable = []
+    self.spilled = []
+    self.label_count = 0
+
+    # Callee-saved bookkeeping: variables of the current function whose values
+    # survive a call, and the saved registers the function has used so far
+    self.crossing = set()
+    self.used_saved = []
+
+    # Linear scan bookkeeping: virtual registers, argument registers read by each call,
+    # and module-level code which is allocated as one unit
+    self.vreg_count = 0
+    self.call_uses = {"printf" : [Reg.a0.name, Reg.a1.name]}
+    self.module_buffer = []
+
+    # Global data bookkeeping: the module variables, and the scope of the module-level code which
+    # holds them, so functions only reach them through the variables they declare for them
+    self.globals : ModuleGlobals = None
+    self.module_code : Scope = None
+
+    # Array bookkeeping: the arrays of the current function by name, which share their stack slots
+    # between scopes, subscripts needing no bounds check, and whether any check was emitted
+    self.arrays = {}
+    self.in_bounds = set()
+    self.index_error = False
+    self.lowered = False
+
   ### Helper Functions ###
   def reset(self):
     self.scope = Scope()
     self.reg_pool.reset()
     self.instr.reset()
+    self.print_label = False
+    self.anon_regs = []
+    self.pinned = []
+    self.spillable = []
+    self.spilled = []
+    self.label_count = 0
+    self.crossing = set()
+    self.used_saved = []
+    self.vreg_count = 0
+    self.call_uses = {"printf" : [Reg.a0.name, Reg.a1.name]}
+    self.module_buffer = []
+    self.globals = None
+    self.module_code = None
+    self.arrays = {}
+    self.in_bounds = set()
+    self.index_error = False
+
+  def register_passes(self):
+    '''Steps of the passes which change the program, the rest only change how code is generated'''
+    register = self.pass_manager.register
+    register("inline", lambda node: self.inliner.visit(node))
+    register("fold", fold)
+    register("evaluate", lambda node: self.call_evaluator.visit(node))
+    register("unroll", lambda node: self.unroller.visit(node))
+    register("dce", lambda node: DeadCodeEliminator().visit(node))
+    register("licm", lambda node: ast.fix_missing_locations(LoopInvariantMotion().visit(node)))
+    register("strength", lambda node: ast.fix_missing_locations(self.strength_reducer.visit(node)))
+    register("globals", self.find_globals)
+    register("bounds", self.find_in_bounds)
+    register("ir", lambda node: Lowering(self.globals).lower(node))
+    register("ssa", lambda module: self.ir_optimizer.run(module))
+    register("peephole", lambda buffer: self.peephole.optimize(buffer))
+    register("schedule", lambda buffer: self.scheduler.schedule(buffer))
+
+  def selected_passes(self) -> set:
+    '''Names of the passes the options turned on'''
+    passes = set(name for name, (option, _) in OPTIONS.items() if getattr(self, option))
+    if not self.stack_mode:
+      passes.add("registers")
+    return passes
+
+  def find_globals(self, node):
+    self.globals = ModuleGlobals(node)
+    return node
+
+  def find_in_bounds(self, node):
+    self.in_bounds = BoundsChecks().run(node)
+    return node
 
   def transpile(self, node):
+    passes = self.selected_passes()
+    # Sizes of arrays are known at compile time, so every pass sees len() as a constant
+    node = ArrayLengths().visit(node)
+    # The IR has no arrays, so a program using them is compiled straight from the ast
+    if uses_arrays(node):
+      passes -= {"ir", "ssa"}
+    self.lowered = "ir" in passes
+    # Everything before code generation, the ast passes then the analyses and lowering
+    program = self.pass_manager.run_passes(passes - set(ASM_PASSES), node)
     self.instr.newline()
-    self.visit(node)
+    if self.lowered:
+      self.pass_manager.run("codegen", IRBackend(self).emit, program)
+    else:
+      self.pass_manager.run("codegen", self.visit, program)
     if self.print_label:
       self.instr.print_int_label()
+    if self.index_error:
+      self.instr.index_error_routine()
+    if self.globals is not None:
+      self.emit_data()
+    self.instr.instr_buffer = self.pass_manager.run_passes(passes & set(ASM_PASSES), self.instr.instr_buffer)
 
   def assign_reg_if_inactive(self, var : Variable, reg_type : RegType):
     '''Check if variable has active register, and if not then get one'''
-    if not var.reg_active:
+    if not var.reg_active and self.linear_scan:
+      var.reg = self.new_vreg()
+      var.reg_active = True
+    elif not var.reg_active and self.wants_saved_reg(var, reg_type):
+      var.reg = self.reg_pool.get_next_reg(RegType.saved_regs)
+      var.reg_active = True
+      if var.reg not in self.used_saved:
+        self.used_saved.append(var.reg)
+    elif not var.reg_active:
       if not self.reg_pool.is_reg_type_available(reg_type):
         self.restore_reg_type(reg_type)
       if not self.reg_pool.is_reg_type_available(reg_type):
@@ -36,18 +285,36 @@ class RISCV_Transpiler:
       var.reg = self.reg_pool.get_next_reg(reg_type)
       var.reg_active = True
 
+  def wants_saved_reg(self, var : Variable, reg_type : RegType) -> bool:
+    '''Variables live across a call go to a callee-saved register while there are any left'''
+    return (self.callee_saved and reg_type == RegType.temp_regs and var.name in self.crossing and var.label is None
+            and self.reg_pool.is_reg_type_available(RegType.saved_regs))
+
+  def move_to_saved_reg(self, var : Variable):
+    '''Move an active variable out of its register into a callee-saved one'''
+    old : Reg = var.reg
+    var.reg_active = False
+    self.assign_reg_if_inactive(var, RegType.temp_regs)
+    self.instr.mv(var.reg, old)
+    self.reg_pool.free_reg(old)
+
   def assign_regs_if_inactive(self, regs : list, reg_type : RegType):
     for reg in regs:
       self.assign_reg_if_inactive(reg, reg_type)
 
   def restore_reg_type(self, reg_type : RegType):
-    var : Variable = self.scope.get_next_var(reg_type)
+    var : Variable = self.scope.get_next_var(reg_type, self.pinned)
     self.save_var_to_stack(var)
 
   def save_var_to_stack(self, var : Variable):
     if var.reg is None:
       raise RuntimeError(f'Register is none for variable "{var.name}"')
     var.reg_active = False
+    if var.label is not None:
+      # Globals are stored as they are assigned, so memory already has the value
+      self.reg_pool.free_reg(var.reg)
+      self.instr.comment_reg_free(var.reg)
+      return
     self.instr.comment(f'Saving reg "{var.reg.name}" to stack')
     self.instr.store_reg(var.reg, var.offset)
     self.reg_pool.free_reg(var.reg)
@@ -62,6 +329,10 @@ class RISCV_Transpiler:
     if var.reg is None:
       raise RuntimeError(f'Register is none for variable "{var.name}"')
     var.reg_active = True
+    if var.label is not None:
+      self.instr.load_global(var.reg, var.label)
+      self.reg_pool.take_reg(var.reg)
+      return
     self.instr.comment(f'Loading reg "{var.reg.name}" from stack')
     self.instr.load_reg(var.reg, var.offset)
     self.reg_pool.take_reg(var.reg)
@@ -71,14 +342,49 @@ class RISCV_Transpiler:
     for var in vars:
       self.load_var_from_stack(var)
 
+  def new_vreg(self) -> VirtualReg:
+    self.vreg_count += 1
+    return VirtualReg(self.vreg_count)
+
   def get_new_temp(self) -> Reg:
     '''Get a new temporary register'''
+    if self.linear_scan:
+      return self.new_vreg()
     if not self.reg_pool.is_reg_type_available(RegType.temp_regs):
-      self.restore_reg_type(RegType.temp_regs)
+      evictable = [var for var in self.scope.get_active_vars(RegType.temp_regs) if var.reg not in self.pinned]
+      if not evictable and self.spillable_operand() is not None:
+        self.spill_operand()
+      else:
+        self.restore_reg_type(RegType.temp_regs)
     if not self.reg_pool.is_reg_type_available(RegType.temp_regs):
       raise RuntimeError(f'Failed to restore reg of type "{RegType.temp_regs.name}"')
     return self.reg_pool.get_next_reg(RegType.temp_regs)
 
+  def free_temps(self) -> int:
+    '''Temporaries which are free or held by a variable that may be evicted'''
+    free = [reg for reg in RegType.temp_regs.value if self.reg_pool.is_reg_available(reg)]
+    evictable = [var for var in self.scope.get_active_vars(RegType.temp_regs) if var.reg not in self.pinned]
+    return len(free) + len(evictable)
+
+  def spillable_operand(self) -> Reg:
+    '''The outermost pending operand held in a temporary of its own, if any'''
+    for reg in self.spillable:
+      if reg is not None and reg in self.anon_regs:
+        return reg
+    return None
+
+  def spill_operand(self):
+    '''Push a pending operand to the stack, outermost first so they come back off it in order'''
+    reg : Reg = self.spillable_operand()
+    self.instr.comment(f'Spill pending "{reg.name}" to the stack')
+    self.instr.push_reg(reg)
+    self.spillable[self.spillable.index(reg)] = None
+    self.pinned.remove(reg)
+    self.anon_regs.remove(reg)
+    self.reg_pool.free_reg(reg)
+    self.instr.comment_reg_free(reg)
+    self.spilled.append(reg)
+
   def anonymous_push(self, value : str):
     '''push value to the stack with reg that has no associated variable'''
     temp : Reg = self.get_new_temp()
@@ -89,16 +395,21 @@ class RISCV_Transpiler:
     self.instr.newline()
 
   def create_label(self, name : str):
+    if not self.stack_mode:
+      # Sibling and nested scopes share scope numbers, so number labels per transpiler
+      self.label_count += 1
+      return f"{name}_{self.scope.name}_{self.label_count}"
     return f"{name}_{self.scope.name}_sc_{self.scope.scope_num}_lab_{self.scope.get_next_label_number()}"
 
   def free_scope(self):
     '''Free registers in current scope and set scope to parent'''
-    for reg in self.scope.deactivate_regs(self.reg_pool):
-      self.instr.comment_reg_free(reg)
+    if not self.linear_scan:
+      for reg in self.scope.deactivate_regs(self.reg_pool):
+        self.instr.comment_reg_free(reg)
     self.instr.newline()
     self.scope = self.scope.parent
 
-  def print_routine(self, node : ast.Call):
+  def print_routine(self, node : ast.Call, dest : Reg = None):
     # Set the print label
     self.print_label = True
 
@@ -106,6 +417,9 @@ class RISCV_Transpiler:
     if len(node.args) != 1:
       raise RuntimeError(f'Incorrect number of arguments for print function!')
 
+    if not self.stack_mode:
+      return self.emit_call("printf", node.args, dest, format_label="print_int")
+
     # Visit the argument
     self.visit(node.args[0])
 
@@ -150,10 +464,66 @@ class RISCV_Transpiler:
       raise RuntimeError(f"{name} not supported. Node dump: {ast.dump(node)}")
 
   def visit_Module(self, node : ast.Module):
+    if self.globals is not None:
+      # Module-level code reaches the globals through a scope of its own, functions through theirs
+      self.module_code = Scope(name=self.scope.name, parent=self.scope)
+      for name in self.globals.values:
+        self.module_code.add_global(Variable(name, label=data_label(name), size=self.globals.sizes.get(name)))
+    if self.linear_scan:
+      self.module_linear_scan(node)
+      return
     for statement in node.body:
+      self.visit_module_statement(statement)
+
+  def visit_module_statement(self, statement):
+    if self.globals is None:
       self.visit(statement)
+    elif statement in self.globals.initializers:
+      # The data section holds the initial value
+      return
+    elif isinstance(statement, ast.FunctionDef):
+      if not self.linear_scan:
+        for reg in self.module_code.deactivate_regs(self.reg_pool):
+          self.instr.comment_reg_free(reg)
+      self.visit(statement)
+    else:
+      self.scope = self.module_code
+      self.visit(statement)
+      self.scope = self.module_code.parent
+
+  def module_linear_scan(self, node : ast.Module):
+    '''Emit functions as they come and all module-level code after them'''
+    functions = self.instr.instr_buffer
+    if self.globals is not None:
+      self.instr.instr_buffer = self.module_buffer
+      self.scope = self.module_code
+      loaded = set()
+      for statement in node.body:
+        if not isinstance(statement, ast.FunctionDef):
+          loaded |= loaded_names(statement)
+      self.load_globals([name for name in self.globals.values if name in loaded and name not in self.globals.sizes])
+      self.scope = self.module_code.parent
+      self.instr.instr_buffer = functions
+    for statement in node.body:
+      if isinstance(statement, ast.FunctionDef):
+        self.visit_module_statement(statement)
+        continue
+      self.instr.instr_buffer = self.module_buffer
+      self.visit_module_statement(statement)
+      self.instr.instr_buffer = functions
+
+    # There is no frame at module level, so everything has to fit in registers
+    allocator = LinearScan(self.module_buffer, self.call_uses)
+    self.module_buffer = allocator.run()
+    if allocator.spill_count or allocator.saved_regs:
+      raise RuntimeError("Module-level code needs more registers than available, move it into a function.")
+    functions += self.module_buffer
 
   def visit_FunctionDef(self, node : ast.FunctionDef):
+    if self.linear_scan:
+      self.function_linear_scan(node)
+      return
+
     # Used to figure out how much stack space to allocate
     locals = LocalsCounter(node, self.scope)
 
@@ -164,50 +534,241 @@ class RISCV_Transpiler:
 
     # Create a new scope
     self.scope = Scope(name=node.name, parent=self.scope, locals_count=locals.count())
+    self.arrays = {}
     self.scope.add_vars(func_args)
-    self.instr.label(node.name)
-    self.instr.comment_prologue(node.name)
-    self.instr.prologue(self.scope.locals_count)
-    self.instr.newline()
+    self.declare_globals(node)
+    if self.callee_saved:
+      self.crossing = CallCrossing(node).names
+      self.used_saved = []
+    if self.defer_epilogue():
+      # Whether a frame is needed at all is only known once the body is there
+      outer = self.instr.instr_buffer
+      self.instr.instr_buffer = []
+    else:
+      self.instr.label(node.name)
+      self.instr.comment_prologue(node.name)
+      self.instr.prologue(self.scope.locals_count)
+      self.instr.newline()
+    self.tail_call_label(node)
+    for var in func_args:
+      if self.wants_saved_reg(var, RegType.temp_regs):
+        self.move_to_saved_reg(var)
 
     # Visit statements in function body
     for statement in node.body:
       self.visit(statement)
 
     # Force a void-return if no return exists
-    if not isinstance(node.body[-1], ast.Return):
+    if self.needs_void_return(node):
       self.instr.comment("Automatic void-return")
       self.instr.load_imm(Reg.a0, 0)
       self.instr.newline()
-      self.instr.comment_epilogue(node.name)
-      self.instr.epilogue(self.scope.locals_count)
+      if self.defer_epilogue():
+        self.instr.ret()
+      else:
+        self.instr.comment_epilogue(node.name)
+        self.instr.epilogue(self.scope.locals_count)
       self.instr.newline()
 
+    locals_count = self.scope.locals_count
     self.free_scope()
+    if self.defer_epilogue():
+      body = self.instr.instr_buffer
+      self.instr.instr_buffer = outer
+      saved_regs = [reg for reg in RegType.saved_regs.value if reg in self.used_saved]
+      self.emit_frame(node.name, body, locals_count - self.array_slots(), saved_regs, self.array_slots())
+    self.crossing = set()
+
+  def function_linear_scan(self, node : ast.FunctionDef):
+    '''Emit the body over virtual registers, then allocate them and wrap the frame around'''
+    arg_regs = RegType.arg_regs.value[:len(node.args.args)]
+    self.scope.add_func(node.name, [Variable(arg.arg, reg=reg) for arg, reg in zip(node.args.args, arg_regs)])
+    self.call_uses[node.name] = [reg.name for reg in arg_regs]
+
+    # The body goes to its own buffer until the frame size is known
+    outer = self.instr.instr_buffer
+    self.instr.instr_buffer = []
+    self.scope = Scope(name=node.name, parent=self.scope)
+    self.arrays = {}
+    self.tail_call_label(node)
+    for arg, reg in zip(node.args.args, arg_regs):
+      var = Variable(arg.arg)
+      self.scope.add_var(var)
+      self.assign_reg_if_inactive(var, RegType.temp_regs)
+      self.instr.mv(var.reg, reg)
+    if self.globals is not None:
+      # A global first read on one path only would have no value on the others
+      self.declare_globals(node)
+      self.load_globals(self.globals.read(node))
 
-  def visit_Return(self, node : ast.Return):
-    # Visit the return value
-    self.visit(node.value)
+    for statement in node.body:
+      self.visit(statement)
 
-    # Pop return value
-    self.instr.comment("Pop return value")
-    self.instr.pop(Reg.a0)
+    if self.needs_void_return(node):
+      self.instr.comment("Automatic void-return")
+      self.instr.load_imm(Reg.a0, 0)
+      self.instr.ret()
+    self.free_scope()
+    body = self.instr.instr_buffer
+    self.instr.instr_buffer = outer
+
+    allocator = LinearScan(body, self.call_uses)
+    body = allocator.run()
+    self.emit_frame(node.name, body, allocator.spill_count, allocator.saved_regs, self.array_slots())
+
+  def declare_globals(self, node : ast.FunctionDef):
+    '''Give the function its own variables for the globals it uses, so it caches them in registers'''
+    if self.globals is None:
+      return
+    for name in self.globals.used(node):
+      self.scope.add_global(Variable(name, label=data_label(name), size=self.globals.sizes.get(name)))
+
+  def load_globals(self, names : list):
+    for name in names:
+      var : Variable = self.scope.lookup_var(name)
+      self.assign_reg_if_inactive(var, RegType.temp_regs)
+      self.instr.load_global(var.reg, var.label)
+
+  def reload_globals(self):
+    '''Under linear scan globals stay in their registers, so load them again after a call that may assign them'''
+    for var in self.scope.function_vars():
+      if var.label is not None and var.reg_active and var.name in self.globals.assigned:
+        self.instr.load_global(var.reg, var.label)
+
+  def emit_data(self):
+    '''Globals with an initial value go to .data, the others to .bss, which the loader zeroes'''
+    values = {}
+    for name, value in self.globals.values.items():
+      values[name] = value if isinstance(value, list) else [value or 0] * self.globals.sizes.get(name, 1)
+    initialized = [name for name in values if any(values[name])]
+    zeroed = [name for name in values if not any(values[name])]
+    if initialized:
+      self.instr.section(".data")
+      self.instr.align(3)
+      for name in initialized:
+        self.instr.dwords(data_label(name), values[name])
+    if zeroed:
+      self.instr.section(".bss")
+      self.instr.align(3)
+      for name in zeroed:
+        self.instr.zero_dwords(data_label(name), len(values[name]))
+
+  def needs_void_return(self, node : ast.FunctionDef) -> bool:
+    '''Checks if the end of the function body can be reached'''
+    if self.eliminate_dead_code:
+      return not always_returns(node.body)
+    return not isinstance(node.body[-1], ast.Return)
+
+  def tail_call_label(self, node : ast.FunctionDef):
+    '''Self tail calls jump back here with the new arguments in place'''
+    if self.tail_calls and any(is_self_tail_call(child, node.name) for child in ast.walk(node)):
+      self.instr.label(tail_label(node.name))
+
+  def tail_call(self, node : ast.Call):
+    '''Replace the arguments of the current function and start over without a new frame'''
+    func : Function = self.lookup_func_checked(node)
+    self.instr.comment(f'Tail call to "{node.func.id}"')
+    if self.stack_mode:
+      for arg in reversed(node.args):
+        self.visit(arg)
+      for var_arg in func.args:
+        self.instr.comment_pop(var_arg.reg)
+        self.instr.pop(var_arg.reg)
+    else:
+      # Every argument is evaluated before any parameter register is overwritten
+      values = self.eval_call_args(node.args)
+      for value, arg_reg in zip(values, RegType.arg_regs.value):
+        self.instr.mv(arg_reg, value)
+        self.release(value)
+    self.instr.jump_label(tail_label(node.func.id))
     self.instr.newline()
 
+  def defer_epilogue(self) -> bool:
+    '''Checks if returns emit a bare "ret" which emit_frame expands later'''
+    return self.linear_scan or self.leaf_functions or self.callee_saved or self.lowered
+
+  def emit_frame(self, name : str, body : list, spill_count : int, saved_regs : list, array_slots : int = 0):
+    '''Emit a function whose "ret" lines still need their epilogue, with the arrays at the bottom of the frame'''
+    self.instr.label(name)
+    if self.leaf_functions and not saved_regs and not array_slots and not needs_frame(body):
+      # Leaf function with everything in registers: no prologue or epilogue at all
+      self.instr.comment(f'Leaf function "{name}" needs no frame')
+      self.instr.instr_buffer += body
+      return
+
+    slots = spill_count + len(saved_regs) + array_slots
+    self.instr.comment_prologue(name)
+    self.instr.prologue(slots)
+    for i, reg in enumerate(saved_regs):
+      self.instr.store_reg(reg, spill_count + i)
+    self.instr.newline()
+
+    for line in body:
+      if line != "\tret":
+        self.instr.instr_buffer.append(line)
+        continue
+      self.instr.comment_epilogue(name)
+      for i, reg in enumerate(saved_regs):
+        self.instr.load_reg(reg, spill_count + i)
+      self.instr.epilogue(slots)
+
+  def visit_Return(self, node : ast.Return):
+    if self.tail_calls and is_self_tail_call(node, self.scope.name):
+      self.tail_call(node.value)
+      return
+
+    if self.stack_mode:
+      # Visit the return value
+      self.visit(node.value)
+
+      # Pop return value
+      self.instr.comment("Pop return value")
+      self.instr.pop(Reg.a0)
+      self.instr.newline()
+    else:
+      self.instr.comment("Evaluate return value into a0")
+      self.visit_expr(node.value, Reg.a0)
+      self.instr.newline()
+
+    if self.defer_epilogue():
+      # The epilogue is filled in once the frame is known
+      self.instr.ret()
+      return
+
     # Add epilogue to return
     self.instr.comment_epilogue(self.scope.name)
     self.instr.epilogue(self.scope.locals_count) # epilogue includes "ret" instruction
     self.instr.newline()
 
   def visit_BinOp(self, node : ast.BinOp):
+    form = immediate_form(node) if self.immediates else None
+    if form is not None:
+      self.immediate_binop(*form)
+      return
+    if isinstance(node.op, (ast.FloorDiv, ast.Mod)):
+      self.stack_divmod(node)
+      return
     self.visit(node.left)
     self.visit(node.right)
     self.visit(node.op)
 
+  def immediate_binop(self, immop : ImmOp, operand, imm : int):
+    '''Apply an immediate instruction to the operand on top of the stack'''
+    self.visit(operand)
+    reg : Reg = self.pop_temp()
+    self.instr.comment_immop(immop, reg, imm)
+    self.instr.immop(immop, reg, reg, imm)
+    self.instr.push_reg(reg)
+    self.reg_pool.free_reg(reg)
+    self.instr.comment_reg_free(reg)
+    self.instr.newline()
+
   def visit_Constant(self, node : ast.Constant):
     self.anonymous_push(str(node.value))
 
   def visit_Name(self, node : ast.Name):
+    self.check_local(node.id)
+
     # Check the node's context: Load, Store, or Del
     if isinstance(node.ctx, ast.Load):
       var : Variable = self.scope.lookup_var(node.id)
@@ -227,13 +788,27 @@ class RISCV_Transpiler:
     if len(node.targets) != 1:
       raise RuntimeError("Only single assignment allowed.")
 
+    # Arrays and their elements live in memory rather than in registers
+    target = node.targets[0]
+    if isinstance(target, ast.Subscript) or is_array(node.value):
+      if self.stack_mode:
+        raise RuntimeError("Arrays require stack_mode off.")
+      if isinstance(target, ast.Subscript):
+        self.assign_element(target, node.value)
+        return
+      if isinstance(target, ast.Name):
+        self.declare_array(target.id, node.value)
+        return
+
     # Check if target is assignable
-    target : ast.Name = node.targets[0]
     if not isinstance(target, ast.Name):
       raise RuntimeError(f'Assignment of target "{target}" not accepted.')
 
     # visit target and value
     self.visit(target)
+    if not self.stack_mode:
+      self.assign_expr(target.id, node.value)
+      return
     self.visit(node.value)
 
     # Assign variable by popping the stack
@@ -273,15 +848,40 @@ class RISCV_Transpiler:
   def visit_Sub(self, node : ast.Sub):
     self.generic_binop(BinOp.SUB)
 
-  def visit_And(self, node : ast.And):
-    self.generic_binop(BinOp.AND)
+  def visit_BoolOp(self, node : ast.BoolOp):
+    form = bitwise_form(node)
+    if form is not None:
+      self.visit(form)
+      return
+
+    # Pairwise from the left, the value decided so far is pushed back instead of evaluating the next operand
+    self.visit(node.values[0])
+    for value in node.values[1:]:
+      label_decided = self.create_label("decided")
+      label_end = self.create_label("end")
+      result : Reg = self.pop_temp()
+      self.instr.comment("Skip the next operand if this one decides")
+      if decider(node):
+        self.instr.branch_not_zero(result, label_decided)
+      else:
+        self.instr.branch_zero(result, label_decided)
+      self.reg_pool.free_reg(result)
+      self.instr.comment_reg_free(result)
+      self.instr.newline()
+      self.visit(value)
+      self.instr.jump_label(label_end)
+      self.instr.label(label_decided)
+      self.instr.push_reg(result)
+      self.instr.label(label_end)
+
+  def visit_UnaryOp(self, node : ast.UnaryOp):
+    if not isinstance(node.op, ast.Not):
+      raise RuntimeError(f"{node.__class__.__name__} not supported. Node dump: {ast.dump(node)}")
+    self.visit(negation(node))
 
   def visit_BitAnd(self, node : ast.BitAnd):
     self.generic_binop(BinOp.AND)
 
-  def visit_Or(self, node : ast.Or):
-    self.generic_binop(BinOp.OR)
-
   def visit_BitOr(self, node : ast.BitOr):
     self.generic_binop(BinOp.OR)
   
@@ -294,6 +894,91 @@ class RISCV_Transpiler:
   def visit_Div(self, node : ast.Div):
     self.generic_binop(BinOp.DIV)
 
+  def stack_divmod(self, node : ast.BinOp):
+    '''Floor division or modulo of the operands, leaving the result on the stack'''
+    divisor = int_value(node.right)
+    self.visit(node.left)
+    if divisor is not None and divisor > 0:
+      result : Reg = self.pop_temp()
+      temps = [self.get_new_temp(), self.get_new_temp()]
+      self.floor_divmod_const(node.op, result, result, divisor, temps)
+    else:
+      self.visit(node.right)
+      right : Reg = self.pop_temp()
+      result : Reg = self.pop_temp()
+      temps = [right, self.get_new_temp()]
+      self.floor_divmod(node.op, result, result, right, temps[1])
+    for reg in temps:
+      self.reg_pool.free_reg(reg)
+      self.instr.comment_reg_free(reg)
+    self.instr.push_reg(result)
+    self.reg_pool.free_reg(result)
+    self.instr.comment_reg_free(result)
+    self.instr.newline()
+
+  def floor_divmod(self, op, dest : Reg, left : Reg, right : Reg, temp : Reg):
+    '''Python floor division or modulo of two registers, dest may be left but not right'''
+    # div and rem truncate, so step down when the remainder and divisor have opposite signs
+    label = self.create_label("floor")
+    self.instr.comment("Floor division" if isinstance(op, ast.FloorDiv) else "Modulo")
+    if isinstance(op, ast.FloorDiv):
+      self.instr.binop(BinOp.REM, temp, left, right)
+      self.instr.binop(BinOp.DIV, dest, left, right)
+      self.instr.branch_zero(temp, label)
+      self.instr.binop(BinOp.XOR, temp, temp, right)
+      self.instr.branch_not_negative(temp, label)
+      self.instr.immop(ImmOp.ADDI, dest, dest, -1)
+    else:
+      self.instr.binop(BinOp.REM, dest, left, right)
+      self.instr.branch_zero(dest, label)
+      self.instr.binop(BinOp.XOR, temp, dest, right)
+      self.instr.branch_not_negative(temp, label)
+      self.instr.binop(BinOp.ADD, dest, dest, right)
+    self.instr.label(label)
+
+  def floor_divmod_const(self, op, dest : Reg, src : Reg, divisor : int, temps : list):
+    '''Python floor division or modulo by a positive constant, without a div instruction'''
+    sign, value = temps
+    floor_div = isinstance(op, ast.FloorDiv)
+    self.instr.comment(f"{'Floor division' if floor_div else 'Modulo'} by {divisor}")
+    if divisor == 1:
+      if floor_div:
+        self.instr.mv(dest, src)
+      else:
+        self.instr.load_imm(dest, 0)
+    elif is_power_of_two(divisor):
+      # Arithmetic shifts already round toward negative infinity
+      shift = divisor.bit_length() - 1
+      if floor_div:
+        self.instr.immop(ImmOp.SRAI, dest, src, shift)
+      elif ImmOp.ANDI.fits(divisor - 1):
+        self.instr.immop(ImmOp.ANDI, dest, src, divisor - 1)
+      else:
+        self.instr.load_imm(value, divisor - 1)
+        self.instr.binop(BinOp.AND, dest, src, value)
+    else:
+      # floor(n / d) == ~(~n // d) for negative n, and ~n is never negative
+      multiplier, shift = magic_unsigned(divisor)
+      self.instr.immop(ImmOp.SRAI, sign, src, 63)
+      self.instr.binop(BinOp.XOR, value, src, sign)
+      self.instr.load_imm(sign, wrap(multiplier))
+      self.instr.binop(BinOp.MULHU, value, value, sign)
+      self.instr.immop(ImmOp.SRLI, value, value, shift)
+      self.instr.immop(ImmOp.SRAI, sign, src, 63)
+      if floor_div:
+        self.instr.binop(BinOp.XOR, dest, value, sign)
+      else:
+        self.instr.binop(BinOp.XOR, value, value, sign)
+        self.instr.load_imm(sign, divisor)
+        self.instr.binop(BinOp.MUL, value, value, sign)
+        self.instr.binop(BinOp.SUB, dest, src, value)
+
+  def visit_LShift(self, node : ast.LShift):
+    self.generic_binop(BinOp.SLL)
+
+  def visit_RShift(self, node : ast.RShift):
+    self.generic_binop(BinOp.SRA)
+
   def visit_Compare(self, node : ast.Compare):
     self.visit(node.left)
 
@@ -316,6 +1001,19 @@ class RISCV_Transpiler:
     self.instr.pop(left)
     self.instr.newline()
 
+    if self.branchless_compares:
+      # The result replaces the left operand
+      self.instr.comment_branchop(branchop, left, right)
+      self.instr.set_compare(branchop, left, left, right)
+      self.reg_pool.free_reg(right)
+      self.instr.comment_reg_free(right)
+      self.instr.comment_branchop_push(branchop, left)
+      self.instr.push_reg(left)
+      self.reg_pool.free_reg(left)
+      self.instr.comment_reg_free(left)
+      self.instr.newline()
+      return
+
     # Create a result register to push the result of the comparison
     result : Reg = self.get_new_temp()
     self.instr.comment_branchop_result(branchop, True)
@@ -371,49 +1069,41 @@ class RISCV_Transpiler:
     label_while = self.create_label("while")
     label_break = self.create_label("break")
 
-    # Create a label and visit the test
-    self.instr.label(label_while)
-    self.visit(node.test)
-    result : Reg = self.get_new_temp()
-    self.instr.comment_pop(result)
-    self.instr.pop(result)
-    self.instr.newline()
-
-    # Get the result of the test and branch to the break label if false
-    self.instr.comment("Break if false")
-    self.instr.branch_zero(result, label_break)
-    self.reg_pool.free_reg(result)
-    self.instr.comment_reg_free(result)
-    self.instr.newline()
-
-    # Visit the body
-    for statement in node.body:
-      self.visit(statement)
-    self.instr.jump_label(label_while)
+    self.preload_globals(node)
+    head = self.snapshot()
+    if self.rotate_loops:
+      # Test once on entry, then at the bottom so each iteration takes a single branch
+      self.branch_if_false(node.test, label_break, "Skip the loop if false")
+      exit = self.snapshot()
+      self.loop_header(label_while)
+      for statement in node.body:
+        self.visit(statement)
+      self.reconcile(head)
+      self.branch_if_true(node.test, label_while, "Loop again if true")
+    else:
+      # Create a label, then visit the test and branch to the break label if false
+      self.loop_header(label_while)
+      self.branch_if_false(node.test, label_break, "Break if false")
+      exit = self.snapshot()
+
+      # Visit the body
+      for statement in node.body:
+        self.visit(statement)
+      self.reconcile(head)
+      self.instr.jump_label(label_while)
     self.instr.label(label_break)
+    self.restore(exit)
 
     self.free_scope()
 
   def visit_If(self, node : ast.If):
-    # Visit the test condition
-    self.visit(node.test)
-
-    # Grab the result of the test
-    result : Reg = self.get_new_temp()
-    self.instr.comment_pop(result)
-    self.instr.pop(result)
-    self.instr.newline()
-
     # Create 1st scope
     self.scope = Scope(name=self.scope.name, parent=self.scope, locals_count=self.scope.locals_count)
     label_else = self.create_label("else")
 
-    # If the result is false, jump to the else block
-    self.instr.comment("If condition is false, jump to else")
-    self.instr.branch_zero(result, label_else)
-    self.reg_pool.free_reg(result)
-    self.instr.comment_reg_free(result)
-    self.instr.newline()
+    # If the test condition is false, jump to the else block
+    self.branch_if_false(node.test, label_else, "If condition is false, jump to else", self.scope.parent)
+    branch = self.snapshot()
 
     # Visit the body of the if
     for statement in node.body:
@@ -421,23 +1111,31 @@ class RISCV_Transpiler:
 
     # Free the 1st scope
     self.free_scope()
+    # Nothing follows a body that returns, so the else path alone reaches the end
+    returns = self.eliminate_dead_code and always_returns(node.body)
+    if not node.orelse and not returns:
+      self.reconcile(branch)
+    taken = self.snapshot()
 
     # Create 2nd scope
     self.scope = Scope(name=self.scope.name, parent=self.scope, locals_count=self.scope.locals_count)
 
     # Label end
     label_end = self.create_label("end")
-    if node.orelse:
+    if node.orelse and not returns:
       self.instr.comment("If else wasn't taken, jump to end")
       self.instr.jump_label(label_end)
       self.instr.newline()
 
     # Create scope for else again
     self.instr.label(label_else)
+    self.restore(branch)
 
     # Visit the orelse statements
     for statement in node.orelse:
       self.visit(statement)
+    if not returns:
+      self.reconcile(taken)
 
     # Label the end if necessary
     if node.orelse:
@@ -446,6 +1144,11 @@ class RISCV_Transpiler:
     # Free the 2nd scope
     self.free_scope()
 
+  def visit_Global(self, node : ast.Global):
+    # The function scope already has variables for the globals it uses
+    if self.globals is None:
+      raise RuntimeError('"global" requires module globals in data sections.')
+
   def visit_Expr(self, node : ast.Expr):
     # Check if we are calling main--special case
     if isinstance(node.value, ast.Call):
@@ -453,6 +1156,11 @@ class RISCV_Transpiler:
       if call.func.id == "main":
         return
 
+    if not self.stack_mode:
+      self.release(self.visit_expr(node.value))
+      self.instr.newline()
+      return
+
     # Visit the expression
     self.visit(node.value)
 
@@ -469,9 +1177,7 @@ class RISCV_Transpiler:
       return
 
     # First check if the number of arguments is correct
-    func : Function = self.scope.lookup_func(node.func.id)
-    if len(func.args) != len(node.args):
-      raise RuntimeError(f'Incorrect number of arguments for function "{func.name}"!')
+    func : Function = self.lookup_func_checked(node)
 
     # Visit the arguments
     self.instr.comment(f'Computing functional arguments for "{node.func.id}"')
@@ -499,4 +1205,781 @@ class RISCV_Transpiler:
     # Push the result of the function call
     self.instr.comment(f'Push result of "{node.func.id}" stored in "{Reg.a0.name}"')
     self.instr.push_reg(Reg.a0)
-    self.instr.newline()
\ No newline at end of file
+    self.instr.newline()
+
+  def lookup_func_checked(self, node : ast.Call) -> Function:
+    '''Look up the called function and make sure it gets the right number of arguments'''
+    func : Function = self.scope.lookup_func(node.func.id)
+    if len(func.args) != len(node.args):
+      raise RuntimeError(f'Incorrect number of arguments for function "{func.name}"!')
+    return func
+
+  def tracks_registers(self) -> bool:
+    '''Checks if variables move between registers and the stack while the code is emitted'''
+    return not self.stack_mode and not self.linear_scan
+
+  def snapshot(self) -> list:
+    '''Where each variable of the current function lives at this point'''
+    if not self.tracks_registers():
+      return []
+    return [(var, var.reg, var.reg_active) for var in self.scope.function_vars()]
+
+  def restore(self, snapshot : list):
+    '''Continue from a point with the given variable locations, emitting nothing'''
+    if not self.tracks_registers():
+      return
+    for var in self.scope.function_vars():
+      if var.reg_active:
+        var.reg_active = False
+        self.reg_pool.free_reg(var.reg)
+    for var, reg, active in snapshot:
+      var.reg, var.reg_active = reg, active
+      if active:
+        self.reg_pool.take_reg(reg)
+
+  def reconcile(self, snapshot : list):
+    '''Move variables back to where the snapshot has them, so two paths can meet at one label'''
+    if not self.tracks_registers():
+      return
+    expected = {var : (reg, active) for var, reg, active in snapshot}
+    for var in self.scope.function_vars():
+      if var.reg_active and expected.get(var) != (var.reg, True):
+        if var in expected:
+          self.save_var_to_stack(var)
+        else:
+          # Not born yet at the snapshot, so nothing there reads it
+          var.reg_active = False
+          self.reg_pool.free_reg(var.reg)
+    for var, reg, active in snapshot:
+      if active and not var.reg_active:
+        var.reg = reg
+        self.load_var_from_stack(var)
+
+  def preload_globals(self, node : ast.While):
+    '''Load the globals the loop reads before it, so they stay in registers rather than being loaded each iteration'''
+    if self.globals is None or not self.tracks_registers():
+      return
+    for name in sorted(loaded_names(node)):
+      var : Variable = self.scope.lookup_var(name) if self.scope.in_scope(name) else None
+      if var is None or var.label is None or var.size is not None or var.reg_active:
+        continue
+      if not self.reg_pool.is_reg_type_available(RegType.temp_regs):
+        return
+      self.load_globals([name])
+
+  def loop_header(self, label : str):
+    if self.align_loops is not None:
+      self.instr.align(self.align_loops)
+    self.instr.label(label)
+
+  def branch_if_false(self, node, label : str, comment : str, scope : Scope = None):
+    '''Evaluate a test condition and jump to label if it is false'''
+    self.branch_on_test(node, label, comment, scope, False)
+
+  def branch_if_true(self, node, label : str, comment : str):
+    '''Evaluate a test condition and jump to label if it is true'''
+    self.branch_on_test(node, label, comment, None, True)
+
+  def branch_on_test(self, node, label : str, comment : str, scope : Scope, when : bool):
+    # The test of an if belongs to the enclosing scope
+    body_scope = self.scope
+    self.scope = scope or self.scope
+    self.branch_on_condition(node, label, comment, when)
+    self.instr.newline()
+    self.scope = body_scope
+
+  def branch_on_condition(self, node, label : str, comment : str, when : bool, state : list = None) -> list:
+    '''Jump to label if the condition is when, evaluating the operands of "and"/"or" only until one decides.
+    Returns where the variables are on both ways out, which is state if given'''
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+      return self.branch_on_condition(node.operand, label, comment, not when, state)
+    if not isinstance(node, ast.BoolOp):
+      return self.branch_on_operand(node, label, comment, when, state)
+    if when == decider(node):
+      for value in node.values:
+        state = self.branch_on_condition(value, label, comment, when, state)
+      return state
+
+    # All operands but the last have to agree before the last one decides
+    label_decided = self.create_label("decided")
+    for value in node.values[:-1]:
+      state = self.branch_on_condition(value, label_decided, comment, decider(node), state)
+    state = self.branch_on_condition(node.values[-1], label, comment, when, state)
+    self.instr.label(label_decided)
+    return state
+
+  def branch_on_operand(self, node, label : str, comment : str, when : bool, state : list = None) -> list:
+    fused = self.fuse_branches and isinstance(node, ast.Compare) and len(node.ops) == 1
+    if fused:
+      branchop, left, right = self.fused_operands(node)
+      operands = [right, left] if left != right else [right]
+    else:
+      result : Reg = self.load_test(node)
+      operands = [result]
+
+    def branch(target : str, on : bool):
+      if fused:
+        # Branch on the comparison instead of materializing its result
+        op : BranchOp = branchop if on else branchop.invert()
+        self.instr.comment_branchop(op, left, right)
+        self.instr.branchop(op, left, right, target)
+      else:
+        self.instr.comment(comment)
+        if on:
+          self.instr.branch_not_zero(result, target)
+        else:
+          self.instr.branch_zero(result, target)
+
+    if state is None or self.snapshot() == state:
+      branch(label, when)
+      for reg in operands:
+        self.free_test(reg)
+      return self.snapshot() if state is None else state
+
+    # Variables moved while this operand was evaluated, both ways out move them back
+    label_stay = self.create_label("stay")
+    branch(label_stay, not when)
+    for reg in operands:
+      self.free_test(reg)
+    moved = self.snapshot()
+    self.reconcile(state)
+    self.instr.jump_label(label)
+    self.instr.label(label_stay)
+    self.restore(moved)
+    self.reconcile(state)
+    return state
+
+  def fused_operands(self, node : ast.Compare):
+    '''Branch operation and operand registers of a comparison to branch on'''
+    branchop : BranchOp = BRANCHOPS[type(node.ops[0])]
+    if self.stack_mode:
+      self.visit(node.left)
+      self.visit(node.comparators[0])
+      right : Reg = self.pop_temp()
+      left : Reg = self.pop_temp()
+    else:
+      left, right = self.eval_operands(node.left, node.comparators[0])
+    return branchop, left, right
+
+  def load_test(self, node) -> Reg:
+    '''Evaluate a test condition into a register'''
+    if not self.stack_mode:
+      return self.visit_expr(node)
+    self.visit(node)
+    return self.pop_temp()
+
+  def pop_temp(self) -> Reg:
+    '''Pop the top of the stack into a new temporary'''
+    result : Reg = self.get_new_temp()
+    self.instr.comment_pop(result)
+    self.instr.pop(result)
+    self.instr.newline()
+    return result
+
+  def free_test(self, reg : Reg):
+    if not self.stack_mode:
+      self.release(reg)
+      return
+    self.reg_pool.free_reg(reg)
+    self.instr.comment_reg_free(reg)
+
+  #### Register-targeted expressions (stack_mode off) ####
+  def visit_expr(self, node, dest : Reg = None) -> Reg:
+    '''Evaluate an expression and return the register holding its result (dest if given)'''
+    name = node.__class__.__name__
+    attr = getattr(self, 'expr_' + name, None)
+    if attr:
+      return attr(node, dest)
+    raise RuntimeError(f"{name} not supported. Node dump: {ast.dump(node)}")
+
+  def new_anon_temp(self) -> Reg:
+    '''Temporary owned by the expression being evaluated'''
+    reg : Reg = self.get_new_temp()
+    self.anon_regs.append(reg)
+    return reg
+
+  def release(self, reg : Reg):
+    '''Free a register returned by visit_expr unless it belongs to a variable'''
+    if reg in self.anon_regs:
+      self.anon_regs.remove(reg)
+      if not self.linear_scan:
+        self.reg_pool.free_reg(reg)
+        self.instr.comment_reg_free(reg)
+
+  def check_local(self, name : str):
+    '''Functions and module code are allocated separately under linear scan'''
+    if self.linear_scan and self.scope.in_scope(name) and not self.scope.in_local_scope(name):
+      raise RuntimeError(f'Variable "{name}" from an enclosing scope is not supported with linear scan.')
+
+  def has_call(self, node) -> bool:
+    return any(isinstance(child, ast.Call) for child in ast.walk(node))
+
+  def need(self, node) -> int:
+    '''Sethi-Ullman number: registers needed to evaluate the expression'''
+    if isinstance(node, ast.BinOp) and self.immediates and immediate_form(node) is not None:
+      return self.need(immediate_form(node)[1])
+    if isinstance(node, ast.BinOp) or isinstance(node, ast.Compare):
+      left = self.need(node.left)
+      right = self.need(node.right if isinstance(node, ast.BinOp) else node.comparators[0])
+      return left + 1 if left == right else max(left, right)
+    if isinstance(node, ast.Call):
+      # Calls clobber every temporary, so evaluate them while few are pending
+      return len(RegType.temp_regs.value)
+    return 1
+
+  def eval_operands(self, left_node, right_node):
+    '''Evaluate two operands, the one needing more registers first'''
+    # Python evaluates left to right, so only hoist the right operand over a left one without calls
+    # nor over one reading a global, which a call on the right may assign
+    if (self.need(right_node) > self.need(left_node) and not self.has_call(left_node)
+        and not (self.has_call(right_node) and self.reads_global(left_node))):
+      right, left = self.eval_pending(self.visit_expr(right_node), left_node)
+    else:
+      left, right = self.eval_pending(self.hold(left_node, self.visit_expr(left_node), [right_node]), right_node)
+    return left, right
+
+  def eval_pending(self, first : Reg, node):
+    '''Evaluate node while first waits in its register, or on the stack if the temporaries ran out'''
+    self.pinned.append(first)
+    self.spillable.append(first)
+    second : Reg = self.visit_expr(node)
+    if self.spillable.pop() is not None:
+      self.pinned.remove(first)
+      return first, second
+
+    # Operands spilled while evaluating node are back already, so first is on top of the stack
+    self.spilled.pop()
+    first = self.new_pinned_temp([second])
+    self.instr.comment(f'Reload spilled operand into "{first.name}"')
+    self.instr.pop(first)
+    return first, second
+
+  def reads_global(self, node) -> bool:
+    '''Checks if an expression reads a global a call may assign, or an element of a global array'''
+    if any(self.is_assigned_global(name) for name in loaded_names(node)):
+      return True
+    arrays = [child.value.id for child in ast.walk(node)
+              if isinstance(child, ast.Subscript) and isinstance(child.value, ast.Name)]
+    return any(self.scope.in_scope(name) and self.scope.lookup_var(name).label is not None for name in arrays)
+
+  def is_assigned_global(self, name : str) -> bool:
+    '''Checks if a name is a global which some function assigns, so a call may change it'''
+    return (self.globals is not None and name in self.globals.assigned and self.scope.in_scope(name)
+            and self.scope.lookup_var(name).label is not None)
+
+  def hold(self, node, reg : Reg, rest : list) -> Reg:
+    '''Copy a global read before a call out of its register, which gets the value again after the call'''
+    if not isinstance(node, ast.Name) or not self.is_assigned_global(node.id):
+      return reg
+    if not any(self.has_call(other) for other in rest):
+      return reg
+    copy : Reg = self.new_pinned_temp([reg])
+    self.instr.mv(copy, reg)
+    return copy
+
+  def result_reg(self, dest : Reg, operands : list) -> Reg:
+    '''Pick dest, else reuse an operand temporary, else a fresh temporary'''
+    if dest is not None:
+      return dest
+    for reg in operands:
+      if reg in self.anon_regs:
+        return reg
+    return self.new_pinned_temp(operands)
+
+  def new_pinned_temp(self, operands : list) -> Reg:
+    '''Fresh temporary which may not evict the given operands'''
+    self.pinned += operands
+    reg : Reg = self.new_anon_temp()
+    for operand in operands:
+      self.pinned.remove(operand)
+    return reg
+
+  def release_operands(self, result : Reg, operands : list):
+    for reg in operands:
+      if reg != result:
+        self.release(reg)
+
+  def assign_expr(self, name : str, value):
+    '''Evaluate value straight into the register of the variable'''
+    var : Variable = self.scope.lookup_var(name)
+    if var.size is not None:
+      raise RuntimeError(f'Array "{name}" can only be assigned a list of {var.size} elements.')
+    self.instr.comment_assign(var.name)
+    if not var.reg_active and self.wants_saved_reg(var, RegType.temp_regs) and name not in loaded_names(value):
+      # Nothing reads the old value, so the callee-saved register can be the destination
+      self.assign_reg_if_inactive(var, RegType.temp_regs)
+    if var.reg_active:
+      self.pinned.append(var.reg)
+      self.visit_expr(value, var.reg)
+      self.pinned.remove(var.reg)
+    else:
+      reg : Reg = self.visit_expr(value)
+      if reg in self.anon_regs and not self.wants_saved_reg(var, RegType.temp_regs):
+        # Adopt the temporary rather than copying it
+        self.anon_regs.remove(reg)
+        var.reg = reg
+        var.reg_active = True
+      else:
+        self.pinned.append(reg)
+        self.assign_reg_if_inactive(var, RegType.temp_regs)
+        self.pinned.remove(reg)
+        self.instr.mv(var.reg, reg)
+    if var.label is not None:
+      # Write through, so calls and other functions see the value
+      address : Reg = self.new_pinned_temp([var.reg])
+      self.instr.store_global(var.reg, var.label, address)
+      self.release(address)
+    self.instr.newline()
+
+  def expr_Constant(self, node : ast.Constant, dest : Reg = None) -> Reg:
+    if dest is None and node.value == 0 and self.immediates:
+      return Reg.zero
+    reg : Reg = dest if dest is not None else self.new_anon_temp()
+    self.instr.load_imm(reg, node.value)
+    return reg
+
+  def expr_Name(self, node : ast.Name, dest : Reg = None) -> Reg:
+    self.check_local(node.id)
+    var : Variable = self.scope.lookup_var(node.id)
+    if var.size is not None:
+      raise RuntimeError(f'Array "{var.name}" can only be indexed.')
+    if not var.reg_active:
+      if var.reg is None and var.label is None:
+        raise RuntimeError(f'Variable "{var.name}" used before assignment.')
+      self.assign_reg_if_inactive(var, RegType.temp_regs)
+      self.load_var_from_stack(var)
+    if dest is not None and dest != var.reg:
+      self.instr.mv(dest, var.reg)
+      return dest
+    return var.reg
+
+  def expr_BinOp(self, node : ast.BinOp, dest : Reg = None) -> Reg:
+    if isinstance(node.op, (ast.FloorDiv, ast.Mod)):
+      return self.expr_divmod(node, dest)
+    if type(node.op) not in BINOPS:
+      raise RuntimeError(f"{node.op.__class__.__name__} not supported. Node dump: {ast.dump(node)}")
+    binop : BinOp = BINOPS[type(node.op)]
+    form = immediate_form(node) if self.immediates else None
+    if form is not None:
+      immop, operand, imm = form
+      src : Reg = self.visit_expr(operand)
+      result : Reg = self.result_reg(dest, [src])
+      self.instr.comment_immop(immop, result, imm)
+      self.instr.immop(immop, result, src, imm)
+      self.release_operands(result, [src])
+      return result
+    left, right = self.eval_operands(node.left, node.right)
+    result : Reg = self.result_reg(dest, [left, right])
+    self.instr.comment_binop(binop, result)
+    self.instr.binop(binop, result, left, right)
+    self.release_operands(result, [left, right])
+    return result
+
+  def expr_divmod(self, node : ast.BinOp, dest : Reg = None) -> Reg:
+    divisor = int_value(node.right)
+    if divisor is not None and divisor > 0:
+      src : Reg = self.visit_expr(node.left)
+      operands = [src]
+    else:
+      src, right = self.eval_operands(node.left, node.right)
+      operands = [src, right]
+
+    # The divisor has to survive until the end, and no operand may be evicted for the temporaries
+    self.pinned += operands
+    if dest is not None and dest not in operands[1:]:
+      result : Reg = dest
+    elif src in self.anon_regs:
+      result : Reg = src
+    else:
+      result : Reg = self.new_anon_temp()
+    self.pinned.append(result)
+    temps = [self.new_anon_temp() for _ in range(2 if len(operands) == 1 else 1)]
+    for reg in operands + [result]:
+      self.pinned.remove(reg)
+    if len(operands) == 1:
+      self.floor_divmod_const(node.op, result, src, divisor, temps)
+    else:
+      self.floor_divmod(node.op, result, src, right, temps[0])
+    self.release_operands(result, operands + temps)
+
+    if dest is not None and dest != result:
+      self.instr.mv(dest, result)
+      self.release(result)
+      return dest
+    return result
+
+  def expr_Compare(self, node : ast.Compare, dest : Reg = None) -> Reg:
+    if len(node.comparators) != 1:
+      raise RuntimeError("Only single comparison allowed.")
+    if len(node.ops) != 1:
+      raise RuntimeError("Only single comparison operator allowed.")
+    form = slti_form(node) if self.immediates else None
+    if form is not None:
+      operand, imm = form
+      src : Reg = self.visit_expr(operand)
+      result : Reg = self.result_reg(dest, [src])
+      self.instr.comment_immop(ImmOp.SLTI, result, imm)
+      self.instr.immop(ImmOp.SLTI, result, src, imm)
+      self.release_operands(result, [src])
+      return result
+    if self.branchless_compares:
+      return self.branchless_compare(node, dest)
+    branchop : BranchOp = BRANCHOPS[type(node.ops[0])]
+    left, right = self.eval_operands(node.left, node.comparators[0])
+
+    # The result is written before the branch reads the operands
+    if dest is not None and dest not in (left, right):
+      result : Reg = dest
+    else:
+      result : Reg = self.new_pinned_temp([left, right])
+    self.instr.comment_branchop_result(branchop, True)
+    self.instr.set_true(result)
+    self.instr.comment_branchop(branchop, left, right)
+    label = self.create_label(branchop.name)
+    self.instr.branchop(branchop, left, right, label)
+    self.instr.comment_branchop_result(branchop, False)
+    self.instr.set_false(result)
+    self.instr.label(label)
+    self.release_operands(result, [left, right])
+
+    if dest is not None and dest != result:
+      self.instr.mv(dest, result)
+      self.release(result)
+      return dest
+    return result
+
+  def branchless_compare(self, node : ast.Compare, dest : Reg = None) -> Reg:
+    '''Comparison result from set-less-than and set-if-zero instructions instead of a branch'''
+    branchop : BranchOp = BRANCHOPS[type(node.ops[0])]
+    form = equality_form(node) if self.immediates else None
+    if form is not None and form[1] != 0:
+      operand, imm = form
+      src : Reg = self.visit_expr(operand)
+      result : Reg = self.result_reg(dest, [src])
+      self.instr.comment_immop(ImmOp.XORI, result, imm)
+      self.instr.immop(ImmOp.XORI, result, src, imm)
+      if branchop == BranchOp.BEQ:
+        self.instr.set_zero(result, result)
+      else:
+        self.instr.set_not_zero(result, result)
+      self.release_operands(result, [src])
+      return result
+
+    # A constant zero is read from the zero register
+    if int_value(node.comparators[0]) == 0:
+      left, right = self.visit_expr(node.left), Reg.zero
+      operands = [left]
+    elif int_value(node.left) == 0:
+      left, right = Reg.zero, self.visit_expr(node.comparators[0])
+      operands = [right]
+    else:
+      left, right = self.eval_operands(node.left, node.comparators[0])
+      operands = [left, right]
+    result : Reg = self.result_reg(dest, operands)
+    self.instr.comment_branchop(branchop, left, right)
+    self.instr.set_compare(branchop, result, left, right)
+    self.release_operands(result, operands)
+    return result
+
+  def expr_BoolOp(self, node : ast.BoolOp, dest : Reg = None) -> Reg:
+    form = bitwise_form(node)
+    if form is not None:
+      return self.visit_expr(form, dest)
+
+    # The operands go one after the other into the result, until one decides
+    result : Reg = self.new_anon_temp()
+    label_decided = self.create_label("decided")
+    self.visit_expr(node.values[0], result)
+    # The later operands may not run, so make room for them here rather than spill on only one path
+    while self.free_temps() < max(self.need(value) for value in node.values[1:]) and self.spillable_operand() is not None:
+      self.spill_operand()
+    state = self.snapshot()
+    for value in node.values[1:]:
+      self.instr.comment("Skip the next operand if this one decides")
+      if decider(node):
+        self.instr.branch_not_zero(result, label_decided)
+      else:
+        self.instr.branch_zero(result, label_decided)
+      # Operands pending outside stay in their registers on this path
+      pending, self.spillable = self.spillable, []
+      self.visit_expr(value, result)
+      self.spillable = pending
+      self.reconcile(state)
+    self.instr.label(label_decided)
+
+    if dest is not None:
+      self.instr.mv(dest, result)
+      self.release(result)
+      return dest
+    return result
+
+  def expr_UnaryOp(self, node : ast.UnaryOp, dest : Reg = None) -> Reg:
+    if not isinstance(node.op, ast.Not):
+      raise RuntimeError(f"{node.__class__.__name__} not supported. Node dump: {ast.dump(node)}")
+    return self.visit_expr(negation(node), dest)
+
+  def expr_Call(self, node : ast.Call, dest : Reg = None) -> Reg:
+    if node.func.id in self.aliased:
+      return self.aliased[node.func.id](node, dest)
+    self.lookup_func_checked(node)
+    return self.emit_call(node.func.id, node.args, dest)
+
+  def eval_call_args(self, args : list) -> list:
+    '''Evaluate call arguments, keeping them out of the argument registers'''
+    values = []
+    for i, arg in enumerate(args):
+      value : Reg = self.hold(arg, self.visit_expr(arg), args[i + 1:])
+      if value in RegType.arg_regs.value:
+        copy : Reg = self.new_anon_temp()
+        self.instr.mv(copy, value)
+        value = copy
+      values.append(value)
+      self.pinned.append(value)
+    for value in values:
+      self.pinned.remove(value)
+    return values
+
+  def emit_call(self, label : str, args : list, dest : Reg = None, format_label : str = None) -> Reg:
+    '''Call label with args in a1.. (and format_label in a0), returning the result register'''
+    self.instr.comment(f'Computing functional arguments for "{label}"')
+    values = self.eval_call_args(args)
+
+    # Caller-saved registers do not survive the call (the allocator takes care under linear scan)
+    saved, pending = [], []
+    if not self.linear_scan:
+      saved = self.scope.get_active_vars(RegType.temp_regs) + self.scope.get_active_vars(RegType.arg_regs)
+      pending = [reg for reg in self.pinned if reg in self.anon_regs]
+    self.save_vars_to_stack(saved)
+    for reg in pending:
+      self.instr.comment(f'Preserve pending "{reg.name}" across call')
+      self.instr.push_reg(reg)
+
+    # Move the arguments into place
+    for value, arg_reg in zip(values, RegType.arg_regs.value):
+      self.instr.mv(arg_reg, value)
+      self.release(value)
+    if format_label:
+      self.instr.load_label(Reg.a0, format_label)
+
+    self.instr.comment(f'Call funcion "{label}"')
+    self.instr.call(label)
+    self.instr.newline()
+
+    for reg in reversed(pending):
+      self.instr.pop(reg)
+    self.load_vars_from_stack(saved)
+    if self.linear_scan and self.globals is not None and label in self.globals.writers:
+      self.reload_globals()
+
+    # The result register is written only after the variables are back
+    result : Reg = dest if dest is not None else self.new_anon_temp()
+    self.instr.comment(f'Result of "{label}" stored in "{Reg.a0.name}"')
+    self.instr.mv(result, Reg.a0)
+    return result
+
+  #### Arrays (stack_mode off) ####
+  def array_slots(self) -> int:
+    return sum(var.size for var in self.arrays.values())
+
+  def declare_array(self, name : str, node):
+    '''Give an array its storage, stack slots or a data label, and store its elements'''
+    size = array_size(node)
+    if size is None:
+      raise RuntimeError(f'Array "{name}" needs a constant size, a list literal or "[value] * count".')
+    self.check_local(name)
+    if self.scope.in_scope(name):
+      var : Variable = self.scope.lookup_var(name)
+      if var.size is None:
+        raise RuntimeError(f'Variable "{name}" is not an array.')
+    elif self.scope.name == 'global':
+      raise RuntimeError("Module-level arrays require globals in data sections.")
+    else:
+      var = Variable(name, size=size)
+      self.scope.add_var(var)
+      if name not in self.arrays:
+        # Every scope of the function uses the same slots for the array
+        var.offset = self.array_slots()
+        self.arrays[name] = var
+      var.offset = self.arrays[name].offset
+      var.size = self.arrays[name].size
+    if var.size != size:
+      raise RuntimeError(f'Array "{name}" has {var.size} elements, not {size}.')
+
+    self.instr.comment_assign(name)
+    if isinstance(node, ast.List):
+      self.store_elements(var, node.elts)
+    else:
+      self.fill_array(var, node.left.elts[0])
+    self.instr.newline()
+
+  def store_elements(self, var : Variable, elements : list):
+    '''Store each expression in its element, all evaluated first if one may read the array'''
+    reads = any(var.name in loaded_names(element) or (var.label is not None and self.has_call(element))
+                for element in elements)
+    values = []
+    if reads:
+      for i, element in enumerate(elements):
+        values.append(self.hold(element, self.visit_expr(element), elements[i + 1:]))
+        self.pinned.append(values[-1])
+    base, displacement = self.array_base(var)
+    self.pinned.append(base)
+    for i, element in enumerate(elements):
+      if reads:
+        value : Reg = values[i]
+      else:
+        value : Reg = self.visit_expr(element)
+        self.pinned.append(value)
+      self.store_at(value, base, displacement + 8 * i)
+      self.pinned.remove(value)
+      self.release(value)
+    self.pinned.remove(base)
+    self.release(base)
+
+  def fill_array(self, var : Variable, node):
+    '''Store one value in every element, with a loop for arrays too long to unroll'''
+    value : Reg = self.visit_expr(node)
+    self.pinned.append(value)
+    if var.size <= MAX_UNROLLED_FILL:
+      base, displacement = self.array_base(var)
+      for i in range(var.size):
+        self.store_at(value, base, displacement + 8 * i)
+      self.release(base)
+    else:
+      pointer : Reg = self.element_pointer(var)
+      end : Reg = self.new_pinned_temp([pointer])
+      self.add_imm(end, pointer, 8 * var.size)
+      label = self.create_label("fill")
+      self.instr.label(label)
+      self.instr.store_offset(value, pointer, 0)
+      self.instr.immop(ImmOp.ADDI, pointer, pointer, 8)
+      self.instr.branchop(BranchOp.BNE, pointer, end, label)
+      self.release(end)
+      self.release(pointer)
+    self.pinned.remove(value)
+    self.release(value)
+
+  def array_var(self, node) -> Variable:
+    if not isinstance(node, ast.Name):
+      raise RuntimeError(f"Only arrays can be indexed. Node dump: {ast.dump(node)}")
+    self.check_local(node.id)
+    var : Variable = self.scope.lookup_var(node.id)
+    if var.size is None:
+      raise RuntimeError(f'Variable "{node.id}" is not an array.')
+    return var
+
+  def array_base(self, var : Variable):
+    '''Register and displacement addressing the first element of an array'''
+    if var.label is not None:
+      base : Reg = self.new_anon_temp()
+      self.instr.load_label(base, var.label)
+      return base, 0
+    # Arrays are at the bottom of the frame, just above any operands spilled to the stack
+    if self.free_temps() > 2 or self.spillable_operand() is None:
+      return Reg.sp, 8 * (var.offset + len(self.spilled))
+    # Up to two temporaries are taken before the address is used, which could spill and move sp, so fix it now
+    base : Reg = self.new_anon_temp()
+    self.add_imm(base, Reg.sp, 8 * (var.offset + len(self.spilled)))
+    return base, 0
+
+  def element_pointer(self, var : Variable) -> Reg:
+    '''Temporary holding the address of the first element of an array'''
+    base, displacement = self.array_base(var)
+    if base in self.anon_regs:
+      return base
+    pointer : Reg = self.new_anon_temp()
+    self.add_imm(pointer, base, displacement)
+    return pointer
+
+  def add_imm(self, dest : Reg, src : Reg, imm : int):
+    if imm == 0:
+      self.instr.mv(dest, src)
+    elif ImmOp.ADDI.fits(imm):
+      self.instr.immop(ImmOp.ADDI, dest, src, imm)
+    else:
+      self.instr.load_imm(dest, imm)
+      self.instr.binop(BinOp.ADD, dest, dest, src)
+
+  def address(self, base : Reg, displacement : int):
+    '''Register and displacement for a load or store, adding displacements a load can't encode to the base'''
+    if ImmOp.ADDI.fits(displacement):
+      return base, displacement
+    address : Reg = self.new_pinned_temp([base])
+    self.add_imm(address, base, displacement)
+    return address, 0
+
+  def store_at(self, value : Reg, base : Reg, displacement : int):
+    address, displacement = self.address(base, displacement)
+    self.instr.store_offset(value, address, displacement)
+    if address != base:
+      self.release(address)
+
+  def element(self, node : ast.Subscript):
+    '''Register and displacement addressing the element of a subscript, checking the index unless it
+    provably is in range'''
+    var : Variable = self.array_var(node.value)
+    index = int_value(node.slice)
+    if index is not None:
+      # Constant indices are checked here, and count from the end when negative like in Python
+      if not -var.size <= index < var.size:
+        # Reported when it runs like a runtime index, so unrolling a loop doesn't turn it into a compile error
+        self.index_error = True
+        self.instr.comment(f'Index {index} out of range for array "{var.name}" of {var.size} elements')
+        self.instr.jump_label("index_error")
+        index = 0
+      base, displacement = self.array_base(var)
+      return self.rebase(base, displacement + 8 * (index % var.size))
+
+    # A constant added to the index goes into the displacement once the check is gone
+    checked = node not in self.in_bounds
+    index_node, offset = (node.slice, 0) if checked else offset_form(node.slice)
+    index : Reg = self.visit_expr(index_node)
+    if checked:
+      index = self.check_index(index, var.size)
+    address : Reg = self.result_reg(None, [index])
+    self.instr.immop(ImmOp.SLLI, address, index, 3)
+    base, displacement = self.array_base(var)
+    self.instr.binop(BinOp.ADD, address, address, base)
+    self.release(base)
+    return self.rebase(address, displacement + 8 * offset)
+
+  def rebase(self, base : Reg, displacement : int):
+    '''Same as address, releasing the base once it is no longer needed'''
+    address, displacement = self.address(base, displacement)
+    if address != base:
+      self.release(base)
+    return address, displacement
+
+  def check_index(self, index : Reg, size : int) -> Reg:
+    '''Count a negative index from the end like in Python, then branch to the index error routine unless
+    0 <= index < size, one unsigned compare covering both'''
+    self.index_error = True
+    limit : Reg = self.new_pinned_temp([index])
+    self.instr.load_imm(limit, size)
+    # The sign bit spread over the register selects the size to add
+    wrap : Reg = self.new_pinned_temp([index, limit])
+    self.instr.immop(ImmOp.SRAI, wrap, index, 63)
+    self.instr.binop(BinOp.AND, wrap, wrap, limit)
+    wrapped : Reg = index if index in self.anon_regs else self.new_pinned_temp([index, limit, wrap])
+    self.instr.binop(BinOp.ADD, wrapped, index, wrap)
+    self.release(wrap)
+    self.instr.branchop(BranchOp.BGEU, wrapped, limit, "index_error")
+    self.release(limit)
+    return wrapped
+
+  def expr_Subscript(self, node : ast.Subscript, dest : Reg = None) -> Reg:
+    base, displacement = self.element(node)
+    result : Reg = self.result_reg(dest, [base])
+    self.instr.load_offset(result, base, displacement)
+    self.release_operands(result, [base])
+    return result
+
+  def assign_element(self, target : ast.Subscript, value):
+    '''Store into an element of an array, evaluating the value before the index like Python does'''
+    reg : Reg = self.hold(value, self.visit_expr(value), [target.slice])
+    self.pinned.append(reg)
+    address, displacement = self.element(target)
+    self.pinned.remove(reg)
+    self.instr.store_offset(reg, address, displacement)
+    self.release(address)
+    self.release(reg)
+    self.instr.newline()